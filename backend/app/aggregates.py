@@ -0,0 +1,63 @@
+from datetime import date
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Aggregate analytics computed in SQL: each query returns a handful of rows
+# no matter how many transactions the user has. Totals come from the daily
+# rollups; category breakdowns need exact start/end days, so they group the
+# transactions themselves.
+
+
+def _filters(user_id: int, start: Optional[date], end: Optional[date]):
+    txn = models.TransactionDB
+    criteria = [txn.user_id == user_id]
+    if start is not None:
+        criteria.append(txn.date >= start)
+    if end is not None:
+        criteria.append(txn.date <= end)
+    return criteria
+
+
+def spending_by_category(db: Session, user_id: int, start: Optional[date] = None,
+                         end: Optional[date] = None) -> Dict[str, float]:
+    """Total spent (as a positive number) per category."""
+    txn = models.TransactionDB
+    category = func.coalesce(txn.category, "Uncategorized")
+    rows = db.query(category, func.sum(-txn.amount)).filter(
+        *_filters(user_id, start, end), txn.amount < 0
+    ).group_by(category).all()
+    return {cat: float(total) for cat, total in rows}
+
+
+def totals(db: Session, user_id: int, start: Optional[date] = None,
+           end: Optional[date] = None) -> Dict[str, Any]:
+    """Income / expense split, net balance and date range, read from the daily rollups.
+
+    The dict is what MLService.summarize_totals and project_savings_from_totals expect.
+    """
+    daily = models.DailyRollupDB
+    query = db.query(
+        func.sum(daily.count),
+        func.sum(daily.income),
+        func.sum(daily.expense),
+        func.min(daily.day),
+        func.max(daily.day)
+    ).filter(daily.user_id == user_id)
+    if start is not None:
+        query = query.filter(daily.day >= start)
+    if end is not None:
+        query = query.filter(daily.day <= end)
+    count, income, expenses, first_date, last_date = query.one()
+    income, expenses = float(income or 0.0), float(expenses or 0.0)
+    return {
+        'count': count or 0,
+        'total_income': income,
+        'total_expenses': expenses,
+        'net': income - expenses,
+        'first_date': first_date,
+        'last_date': last_date
+    }
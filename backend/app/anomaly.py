@@ -0,0 +1,154 @@
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .ml import ml_service
+
+# Per-user anomaly scoring. Each user keeps running power sums (count, sum,
+# sum of squares) of their amounts per category plus one '*' row for all
+# categories. Inserts, updates and deletes adjust those sums in O(1), and a
+# transaction is scored by its z-score against them, so neither side ever
+# reads the user's transaction history.
+ALL_CATEGORIES = "*"
+UNCATEGORIZED = "Uncategorized"
+
+# Below this many samples a category falls back to the user's overall stats,
+# and below that to the global IsolationForest.
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "10"))
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+
+# (count, total, total_sq) to add to a category's stats
+Delta = Tuple[int, float, float]
+
+
+def _category(category: Optional[str]) -> str:
+    return category or UNCATEGORIZED
+
+
+def _is_outlier(stats: Delta, amount: float) -> Optional[bool]:
+    """z-score test against one set of running stats, None if there are too few samples."""
+    count, total, total_sq = stats
+    if count < ANOMALY_MIN_SAMPLES:
+        return None
+    mean = total / count
+    variance = max(total_sq - count * mean * mean, 0.0) / (count - 1)
+    # Floor the spread so categories with near-constant amounts (rent,
+    # subscriptions) don't flag every small price change
+    std = max(math.sqrt(variance), abs(mean) * 0.05, 1.0)
+    return abs(amount - mean) / std > ANOMALY_Z_THRESHOLD
+
+
+def load_stats(db: Session, user_id: int) -> Dict[str, Delta]:
+    """All of a user's stats rows (one per category they use), keyed by category."""
+    rows = db.query(models.AnomalyStatsDB).filter(models.AnomalyStatsDB.user_id == user_id).all()
+    return {row.category: (row.count, row.total, row.total_sq) for row in rows}
+
+
+def score_batch(db: Session, user_id: int, categories: List[Optional[str]],
+                amounts: List[float], stats: Optional[Dict[str, Delta]] = None) -> List[bool]:
+    """Flag amounts that are unusual for this user, in one stats lookup.
+
+    Rows whose category and user totals are both too small to judge are sent to
+    the global model in a single detect_anomaly_batch call.
+    """
+    if stats is None:
+        stats = load_stats(db, user_id)
+    overall = stats.get(ALL_CATEGORIES)
+    results: List[Optional[bool]] = []
+    for category, amount in zip(categories, amounts):
+        verdict = None
+        category_stats = stats.get(_category(category))
+        if category_stats is not None:
+            verdict = _is_outlier(category_stats, amount)
+        if verdict is None and overall is not None:
+            verdict = _is_outlier(overall, amount)
+        results.append(verdict)
+
+    unscored = [i for i, verdict in enumerate(results) if verdict is None]
+    if unscored:
+        fallback = ml_service.detect_anomaly_batch([amounts[i] for i in unscored])
+        for i, verdict in zip(unscored, fallback):
+            results[i] = verdict
+    return [bool(verdict) for verdict in results]
+
+
+def score(db: Session, user_id: int, category: Optional[str], amount: float) -> bool:
+    stats = {}
+    for key in (_category(category), ALL_CATEGORIES):
+        row = db.get(models.AnomalyStatsDB, (user_id, key))
+        if row is not None:
+            stats[key] = (row.count, row.total, row.total_sq)
+    return score_batch(db, user_id, [category], [amount], stats=stats)[0]
+
+
+def _group(groups: Iterable[Tuple[Optional[str], int, float, float]]) -> Dict[str, Delta]:
+    deltas: Dict[str, List[float]] = {}
+    for category, count, total, total_sq in groups:
+        for key in (_category(category), ALL_CATEGORIES):
+            delta = deltas.setdefault(key, [0, 0.0, 0.0])
+            delta[0] += count
+            delta[1] += total or 0.0
+            delta[2] += total_sq or 0.0
+    return {key: (int(d[0]), d[1], d[2]) for key, d in deltas.items()}
+
+
+def summarize(rows: Iterable[Tuple[Optional[str], float]]) -> Dict[str, Delta]:
+    """Collapse (category, amount) pairs into per-category deltas, '*' included."""
+    return _group((category, 1, amount, amount * amount) for category, amount in rows)
+
+
+def summarize_query(db: Session, *criteria) -> Dict[str, Delta]:
+    """Per-category deltas for the transactions matching `criteria`, aggregated in SQL.
+
+    Used before bulk deletes so that removing a whole statement costs one
+    GROUP BY rather than loading every row.
+    """
+    txn = models.TransactionDB
+    return _group(db.query(
+        txn.category, func.count(txn.id), func.sum(txn.amount), func.sum(txn.amount * txn.amount)
+    ).filter(*criteria).group_by(txn.category).all())
+
+
+def apply(db: Session, user_id: int, added: Optional[Dict[str, Delta]] = None,
+          removed: Optional[Dict[str, Delta]] = None):
+    """Merge deltas into the user's stats rows. Runs in the caller's transaction."""
+    combined: Dict[str, List[float]] = {}
+    for deltas, sign in ((added or {}, 1), (removed or {}, -1)):
+        for key, (count, total, total_sq) in deltas.items():
+            delta = combined.setdefault(key, [0, 0.0, 0.0])
+            delta[0] += sign * count
+            delta[1] += sign * total
+            delta[2] += sign * total_sq
+
+    if not combined:
+        return
+    # Increments happen in SQL, like rollups._upsert, so concurrent writers for
+    # one user (parallel uploads, an upload and a manual edit) can't lose updates
+    stats = models.AnomalyStatsDB.__table__
+    stmt = insert(stats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[stats.c.user_id, stats.c.category],
+        set_={c: stats.c[c] + stmt.excluded[c] for c in ('count', 'total', 'total_sq')}
+    )
+    db.execute(stmt, [
+        {'user_id': user_id, 'category': key, 'count': int(count), 'total': total, 'total_sq': total_sq}
+        for key, (count, total, total_sq) in combined.items()
+    ])
+    # Reset exactly so float drift doesn't outlive the data
+    db.execute(update(stats).where(stats.c.user_id == user_id, stats.c.count <= 0)
+               .values(count=0, total=0.0, total_sq=0.0))
+    # Rows this session already loaded (score()) would otherwise keep their old sums
+    for obj in list(db.identity_map.values()):
+        if isinstance(obj, models.AnomalyStatsDB) and obj.user_id == user_id:
+            db.expire(obj)
+
+
+def rebuild(db: Session, user_id: int):
+    """Recompute a user's stats from their transactions (for data that predates them)."""
+    db.query(models.AnomalyStatsDB).filter(models.AnomalyStatsDB.user_id == user_id).delete()
+    apply(db, user_id, added=summarize_query(db, models.TransactionDB.user_id == user_id))
@@ -0,0 +1,76 @@
+from typing import Any, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import aggregates, database, ledger, queries, rollups
+from .ledger import Ledger
+from .ml import ml_service
+
+# Async counterparts of the data loaders, for `async def` endpoints using
+# database.get_async_db. Simple reads go through select(); small loaders
+# written against the sync Session API (Query) run unchanged via
+# AsyncSession.run_sync, on the event loop thread. Loaders that hydrate a
+# user's whole history or build DataFrames run on the ML threads instead,
+# with a sync session on the same database (_offload_sync).
+
+
+async def _offload_sync(db: AsyncSession, fn, *args):
+    """fn(session, *args) on the ML threads, with a sync session routed like `db`."""
+    shard = database.session_shard(db)
+
+    def run():
+        session = database.shard_session(shard)
+        try:
+            return fn(session, *args)
+        finally:
+            session.close()
+    return await ml_service.offload(run)
+
+
+async def user_rows(db: AsyncSession, model: Any, user_id: int, *criteria, order_by=None) -> List[Any]:
+    """All of `model`'s rows owned by the user, narrowed by extra `criteria`."""
+    stmt = select(model).where(model.user_id == user_id, *criteria)
+    if order_by is not None:
+        stmt = stmt.order_by(order_by)
+    return list((await db.execute(stmt)).scalars().all())
+
+
+async def user_row(db: AsyncSession, model: Any, user_id: int, row_id: int):
+    """The user's row with primary key `row_id`, or None."""
+    stmt = select(model).where(model.id == row_id, model.user_id == user_id)
+    return (await db.execute(stmt)).scalars().first()
+
+
+async def transaction_page(db: AsyncSession, user_id: int, cursor, limit: int, **filters):
+    """queries.keyset_page over queries.transaction_query; raises queries.InvalidCursor."""
+    def load(session):
+        return queries.keyset_page(queries.transaction_query(session, user_id, **filters), cursor, limit)
+    return await db.run_sync(load)
+
+
+async def get_ledger(db: AsyncSession, user_id: int) -> Ledger:
+    """ledger.get_ledger, sharing its cache; a rebuild (fetch and decode) runs on the ML threads."""
+    cached, key, version = await db.run_sync(ledger.cached_ledger, user_id)
+    if cached is not None:
+        return cached
+    built = await _offload_sync(db, lambda session: Ledger.from_rows(ledger.ledger_rows(session, user_id)))
+    ledger.store(key, version, built)
+    return built
+
+
+async def totals(db: AsyncSession, user_id: int, start=None, end=None):
+    return await db.run_sync(aggregates.totals, user_id, start, end)
+
+
+async def spending_by_category(db: AsyncSession, user_id: int, start=None, end=None):
+    return await db.run_sync(aggregates.spending_by_category, user_id, start, end)
+
+
+async def daily_frame(db: AsyncSession, user_id: int):
+    return await _offload_sync(db, rollups.daily_frame, user_id)
+
+
+async def monthly_frame(db: AsyncSession, user_id: int):
+    return await _offload_sync(db, rollups.monthly_frame, user_id)
+
@@ -1,30 +1,45 @@
+import os
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import NamedTuple, Optional, Tuple
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from . import models, database
+from . import models, database, passwords
+from .cache import LRUCache
 
 # Config
 SECRET_KEY = "finance-ai-secret-key-change-in-production-2024"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 
-# Password hashing (using pbkdf2_sha256 - avoids bcrypt 4.x compatibility issues)
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
-
 # OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
+# Authenticated users cached per token subject, so most requests never read the
+# users table. The TTL bounds how long a change made outside this process
+# (e.g. the shard rebalancer) can go unnoticed.
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+
+
+class Principal(NamedTuple):
+    """The authenticated user as endpoints see it: a detached snapshot of UserDB."""
+    id: int
+    username: str
+    email: str
+    full_name: Optional[str]
+    shard: Optional[int]
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
 
+_principals = LRUCache(AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+
+# Synchronous hashing for scripts; endpoints await passwords.hash_pool instead
+verify_password = passwords.verify_password
+get_password_hash = passwords.hash_password
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -34,6 +49,67 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def token_for(user) -> str:
+    """Access token naming the user by username (`sub`) and stable id (`uid`)."""
+    return create_access_token(data={"sub": user.username, "uid": user.id})
+
+
+def _token_claims(token: Optional[str]) -> Tuple[str, Optional[int]]:
+    """(username, user id or None for tokens issued before `uid`), or 401."""
+    if token is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    username: str = payload.get("sub")
+    if username is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    return username, payload.get("uid")
+
+
+def _cache_key(username: str, user_id: Optional[int]):
+    return ('id', user_id) if user_id is not None else ('username', username)
+
+
+def _lookup(username: str, user_id: Optional[int]):
+    user = models.UserDB
+    if user_id is not None:
+        # The username check stops a token outliving its user from matching a reused id
+        return select(user).where(user.id == user_id, user.username == username)
+    return select(user).where(user.username == username)
+
+
+def _remember(username: str, user_id: Optional[int], user) -> Optional[Principal]:
+    if user is None:
+        return None
+    principal = Principal(user.id, user.username, user.email, user.full_name, user.shard)
+    _principals.put(_cache_key(username, user_id), principal)
+    return principal
+
+
+def invalidate_user(user_id: int, username: Optional[str] = None):
+    """Drop a user's cached principal after changing their UserDB row."""
+    _principals.pop(('id', user_id))
+    if username is not None:
+        _principals.pop(('username', username))
+
+
+def cache_stats():
+    return _principals.stats()
+
+
+def _authenticate(db: Session, token: Optional[str]) -> Principal:
+    username, user_id = _token_claims(token)
+    principal = _principals.get(_cache_key(username, user_id))
+    if principal is None:
+        principal = _remember(username, user_id, db.execute(_lookup(username, user_id)).scalars().first())
+        if principal is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    database.route_to_user(db, principal)
+    return principal
+
+
 def get_current_user_optional(
     token: Optional[str] = Depends(oauth2_scheme),
     db: Session = Depends(database.get_db)
@@ -43,13 +119,8 @@ def get_current_user_optional(
     if token is None:
         return None
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        user = db.query(models.UserDB).filter(models.UserDB.username == username).first()
-        return user
-    except JWTError:
+        return _authenticate(db, token)
+    except HTTPException:
         return None
 
 
@@ -58,16 +129,20 @@ def get_current_user_required(
     db: Session = Depends(database.get_db)
 ):
     """Returns the current user or raises 401 if not authenticated."""
-    if token is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        user = db.query(models.UserDB).filter(models.UserDB.username == username).first()
-        if user is None:
+    return _authenticate(db, token)
+
+
+async def get_current_user_required_async(
+    token: Optional[str] = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """get_current_user_required for async endpoints (no threadpool hop)."""
+    username, user_id = _token_claims(token)
+    principal = _principals.get(_cache_key(username, user_id))
+    if principal is None:
+        user = (await db.execute(_lookup(username, user_id))).scalars().first()
+        principal = _remember(username, user_id, user)
+        if principal is None:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-        return user
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    database.route_to_user(db, principal)
+    return principal
@@ -0,0 +1,37 @@
+from typing import Iterable
+
+from sqlalchemy.orm import Session
+
+from . import anomaly, ledger, models, rollups
+
+# Single entry point for keeping derived per-user state in step with
+# TransactionDB writes: anomaly stats, daily / monthly rollups and the ledger
+# version. Everything runs in the caller's transaction, so it commits or rolls
+# back together with the write itself.
+
+
+def apply_rows(db: Session, user_id: int, added: Iterable[rollups.Row] = (),
+               removed: Iterable[rollups.Row] = ()):
+    """Record transactions added and / or removed, as (date, category, amount) rows."""
+    added, removed = list(added), list(removed)
+    anomaly.apply(
+        db, user_id,
+        added=anomaly.summarize((category, amount) for _, category, amount in added),
+        removed=anomaly.summarize((category, amount) for _, category, amount in removed)
+    )
+    rollups.apply(db, user_id, added=rollups.summarize(added), removed=rollups.summarize(removed))
+    ledger.bump(db, user_id)
+
+
+def remove_matching(db: Session, user_id: int, *criteria):
+    """Record the removal of every transaction matching `criteria`. Call before deleting them."""
+    anomaly.apply(db, user_id, removed=anomaly.summarize_query(db, *criteria))
+    rollups.apply(db, user_id, removed=rollups.summarize_query(db, *criteria))
+    ledger.bump(db, user_id)
+
+
+def rebuild(db: Session, user_id: int):
+    anomaly.rebuild(db, user_id)
+    rollups.rebuild(db, user_id)
+    ledger.bump(db, user_id)
+
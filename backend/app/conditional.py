@@ -0,0 +1,125 @@
+import hashlib
+import os
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import database, versions
+from .cache import LRUCache
+
+# Conditional GET for user-scoped reads. A response's ETag is derived from the
+# user's data_version and the request URL, so it changes exactly when some
+# write could have changed the result. Matching If-None-Match requests get a
+# 304 without touching the data, and computed bodies are cached per (user,
+# version, URL) so a repeat request with a stale or missing ETag isn't
+# recomputed either. Row listings (responses with a `model`) aren't cached:
+# they are one indexed query, can run to thousands of rows, and the ETag
+# already spares clients downloading them again. A user's entries are dropped
+# when a write bumping their version commits in this process.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "2048"))
+
+_results = LRUCache(RESULT_CACHE_SIZE)
+_MISSING = object()
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_bumped(session):
+    users = session.info.pop(versions.BUMPED_USERS, None)
+    if users:
+        db_key = database.session_key(session)
+        _results.discard(lambda key: key[0] == db_key and key[1] in users)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_bumped(session):
+    session.info.pop(versions.BUMPED_USERS, None)
+
+
+class Page(NamedTuple):
+    """A compute() result with extra response headers (e.g. a pagination cursor), cached with it."""
+    items: List[Any]
+    headers: Dict[str, str]
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    # Weak comparison: W/"x" and "x" match
+    return '*' in candidates or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in candidates]
+
+
+def _prepare(request: Request, user_id: int, version: int, vary_by_day: bool):
+    url = str(request.url.path) + '?' + str(request.url.query)
+    day = date.today().isoformat() if vary_by_day else ''
+    digest = hashlib.sha1(f"{url}|{day}".encode()).hexdigest()[:16]
+    etag = f'W/"{user_id}-{version}-{digest}"'
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    return etag, headers, (url, day)
+
+
+def _encode(result: Any, model: Any):
+    extra_headers = {}
+    if isinstance(result, Page):
+        result, extra_headers = result.items, result.headers
+    if model is not None:
+        result = [model.model_validate(item) for item in result] if isinstance(result, list) \
+            else model.model_validate(result)
+    return jsonable_encoder(result), extra_headers
+
+
+def respond(request: Request, db: Session, user_id: int, compute: Callable[[], Any],
+            model: Any = None, vary_by_day: bool = False) -> Response:
+    """Serve `compute()` as JSON with an ETag, or 304 if the client's copy is current.
+
+    `model` (a pydantic schema) converts ORM results the way response_model
+    would; such row listings get ETags but their bodies aren't cached.
+    `vary_by_day` is for results that depend on today's date as well as the data.
+    """
+    # Read the version before computing: if a write lands in between, the body
+    # is filed under the older version and simply recomputed on the next request.
+    version = versions.get(db, user_id)['data_version']
+    etag, headers, request_key = _prepare(request, user_id, version, vary_by_day)
+    if _etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+
+    if model is not None:
+        body, extra_headers = _encode(compute(), model)
+        return JSONResponse(body, headers={**headers, **extra_headers})
+    key = (database.session_key(db), user_id, version, *request_key)
+    cached = _results.get(key, _MISSING)
+    if cached is _MISSING:
+        cached = _encode(compute(), model)
+        _results.put(key, cached)
+    body, extra_headers = cached
+    return JSONResponse(body, headers={**headers, **extra_headers})
+
+
+async def respond_async(request: Request, db: AsyncSession, user_id: int, compute: Callable[[], Awaitable[Any]],
+                        model: Any = None, vary_by_day: bool = False) -> Response:
+    """respond() for async endpoints: `compute` is a coroutine function, shares the same cache."""
+    version = (await db.run_sync(versions.get, user_id))['data_version']
+    etag, headers, request_key = _prepare(request, user_id, version, vary_by_day)
+    if _etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+
+    if model is not None:
+        body, extra_headers = _encode(await compute(), model)
+        return JSONResponse(body, headers={**headers, **extra_headers})
+    key = (database.session_key(db), user_id, version, *request_key)
+    cached = _results.get(key, _MISSING)
+    if cached is _MISSING:
+        cached = _encode(await compute(), model)
+        _results.put(key, cached)
+    body, extra_headers = cached
+    return JSONResponse(body, headers={**headers, **extra_headers})
+
+
+def cache_stats():
+    return _results.stats()
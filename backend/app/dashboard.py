@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import async_loaders
+from .ml import ml_service
+
+logger = logging.getLogger(__name__)
+
+# Threads computing dashboard panels, shared by all requests
+DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix="dashboard")
+
+
+def _summary(data, params):
+    summary = ml_service.summarize_totals(data['totals'])
+    summary['investment_suggestions'] = ml_service.get_investment_suggestions(summary)
+    return summary
+
+
+def _spending(data, params):
+    monthly = data['monthly']
+    expenses = monthly[monthly['expense'] > 0]
+    totals = expenses.groupby(expenses['category'].replace('', 'Uncategorized'))['expense'].sum()
+    return {cat: float(total) for cat, total in totals.items()}
+
+
+# Panel name -> (data sources it reads, function(data, params) -> JSON-able result).
+# Results match the corresponding /analytics/* endpoint.
+PANELS: Dict[str, Tuple[Tuple[str, ...], Callable[[Dict[str, Any], Dict[str, Any]], Any]]] = {
+    'summary': (('totals',), _summary),
+    'spending': (('monthly',), _spending),
+    'forecast': (('daily',), lambda data, params: ml_service.forecast_from_daily(data['daily'], params['days'])),
+    'subscriptions': (('ledger',), lambda data, params: ml_service.detect_subscriptions(data['ledger'])),
+    'income_patterns': (('ledger',), lambda data, params: ml_service.detect_income_patterns(data['ledger'])),
+    'savings_projection': (('totals',), lambda data, params: ml_service.project_savings_from_totals(
+        data['totals'], params['months'])),
+    'emergencies': (('ledger', 'monthly', 'totals'), lambda data, params: ml_service.detect_emergencies(
+        data['ledger'], monthly=data['monthly'], totals=data['totals'])),
+    'personality': (('ledger',), lambda data, params: ml_service.analyze_spending_personality(data['ledger'])),
+}
+
+# Source name -> async loader(db, user_id); ledger and rollup frames are built on the ML threads
+_SOURCES = {
+    'ledger': async_loaders.get_ledger,
+    'daily': async_loaders.daily_frame,
+    'monthly': async_loaders.monthly_frame,
+    'totals': async_loaders.totals,
+}
+
+
+def _params(days: int, months: int) -> Dict[str, Any]:
+    return {'days': days, 'months': months}
+
+
+def _run_panels(data: Dict[str, Any], panels: List[str], params: Dict[str, Any]) -> Dict[str, Future]:
+    if 'ledger' in data:
+        data['ledger'].df  # build the shared DataFrame once, before the panels race for it
+    return {name: _executor.submit(PANELS[name][1], data, params) for name in panels}
+
+
+def _collect(futures: Dict[str, Future]) -> Dict[str, Any]:
+    result = {}
+    for name, future in futures.items():
+        try:
+            result[name] = future.result()
+        except Exception as e:
+            logger.error(f"Dashboard panel {name} failed: {str(e)}", exc_info=True)
+            result[name] = {'error': str(e)}
+    return result
+
+
+def needed_sources(panels: List[str]) -> set:
+    return {source for name in panels for source in PANELS[name][0]}
+
+
+async def build_dashboard_async(db: AsyncSession, user_id: int, panels: List[str], days: int = 30,
+                                months: int = 12) -> Dict[str, Any]:
+    """Compute the requested panels from one load of each data source they need.
+
+    Sources load one after another (the session isn't safe for concurrent
+    use); the panels then run concurrently on the shared pool against the
+    loaded data, while the event loop only waits. A failing panel reports
+    {'error': ...} without failing the others.
+    """
+    data = {}
+    for source in needed_sources(panels):
+        data[source] = await _SOURCES[source](db, user_id)
+    futures = await ml_service.offload(_run_panels, data, panels, _params(days, months))
+    if futures:
+        await asyncio.wait([asyncio.wrap_future(future) for future in futures.values()])
+    return _collect(futures)
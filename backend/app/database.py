@@ -1,19 +1,266 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./finance_ai.db")
+
+# SQLite profile for many concurrent readers and one writer at a time. WAL lets
+# readers keep going while an upload is writing; synchronous=NORMAL is durable
+# in WAL mode except for the last transactions before a power loss.
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+# Pooled connections: one per concurrently served request or upload worker
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+# Sharded storage: with SHARD_COUNT > 0, new users are assigned to one of
+# SHARD_COUNT databases (user_id % SHARD_COUNT), each with its own engine,
+# pool and SQLite writer lock. The users table stays in the directory database
+# (DATABASE_URL); users with no shard, including everyone registered before
+# sharding was enabled, keep their data there. backend.app.rebalance moves
+# users between shards.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_URL_TEMPLATE = os.getenv("SHARD_URL_TEMPLATE", "sqlite:///./finance_ai_shard{shard}.db")
+# Tables that live in the directory database only
+DIRECTORY_TABLES = frozenset({"users"})
+
+# Async driver per backend for the asyncio engine (get_async_db)
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql"}
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ALEMBIC_INI = os.path.join(BACKEND_DIR, "alembic.ini")
+# Migration matching the schema that create_all produced before migrations existed
+BASELINE_REVISION = "0001_baseline"
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """Engine with the connection pool and, for SQLite, the pragmas above on every connection."""
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW
+    )
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+    return engine
+
+
+engine = make_engine()
+
+_shard_engines = {}
+
+def shard_engine(shard: int):
+    """Engine (and pool) of shard `shard`, created on first use."""
+    if shard not in _shard_engines:
+        _shard_engines[shard] = make_engine(SHARD_URL_TEMPLATE.format(shard=shard))
+    return _shard_engines[shard]
+
+def bind_for_shard(shard):
+    """Engine holding the data of users on `shard` (None = the directory database)."""
+    return engine if shard is None else shard_engine(shard)
+
+def all_shards():
+    """Every place user data can live: the directory (None) and each configured shard."""
+    return [None, *range(SHARD_COUNT)]
+
+def assign_shard(user_id: int, shard_count: int = None):
+    """Shard for a new (or rebalanced) user, None when sharding is off."""
+    shard_count = SHARD_COUNT if shard_count is None else shard_count
+    return user_id % shard_count if shard_count > 0 else None
+
+
+def _is_directory_table(mapper, clause) -> bool:
+    if mapper is not None:
+        return mapper.persist_selectable.name in DIRECTORY_TABLES
+    table = getattr(clause, "table", None)
+    return getattr(table, "name", None) in DIRECTORY_TABLES
+
+
+class ShardMoved(Exception):
+    """A write was routed to a shard the user has since been moved away from."""
+
+    def __init__(self, user_id: int, shard, current):
+        super().__init__(f"User {user_id} moved from shard {shard} to {current}; retry the request")
+        self.user_id = user_id
+
+
+class RoutingSession(Session):
+    """Session that sends users-table statements to its bind (the directory
+    database) and everything else to `shard`, set by route_to_user() once the
+    request's user is known. With no shard everything goes to the bind.
+
+    With sharding on (or the user on a shard), a session routed to a user
+    re-reads users.shard before committing and raises ShardMoved if the user moved meanwhile (e.g. a worker still routing
+    by a cached principal while backend.app.rebalance runs), so the write is
+    rolled back instead of landing on the old shard and being swept away.
+    """
+
+    def __init__(self, *args, shard_bind=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shard = None
+        self.user_id = None
+        self._shard_bind = shard_bind or shard_engine
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.shard is None or _is_directory_table(mapper, clause):
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        return self._shard_bind(self.shard)
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./finance_ai.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+@event.listens_for(RoutingSession, "before_commit")
+def _check_shard(session):
+    # Unsharded, nobody can be moved: spare every write the directory round trip
+    if session.user_id is None or (SHARD_COUNT == 0 and session.shard is None):
+        return
+    from . import models
+
+    # Writers bump the user's user_versions row, which rebalance.move_user holds
+    # locked until the move commits; a commit that gets here after a move sees it
+    current = session.query(models.UserDB.shard).filter(models.UserDB.id == session.user_id).scalar()
+    if current != session.shard:
+        raise ShardMoved(session.user_id, session.shard, current)
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def route_to_user(db, user):
+    """Point the request's session (sync or async) at the user's shard."""
+    session = getattr(db, "sync_session", db)
+    if isinstance(session, RoutingSession):
+        session.shard = user.shard
+        session.user_id = user.id
+
 def get_db():
+    """Request session; the auth dependency routes it to the user's shard."""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def shard_session(shard) -> Session:
+    """Session on one shard (None = directory), for work outside a request."""
+    db = SessionLocal()
+    if isinstance(db, RoutingSession):
+        db.shard = shard
+    return db
+
+def user_session(user_id: int) -> Session:
+    """Session routed to the shard holding `user_id`'s data, for background work."""
+    from . import models
+
+    db = SessionLocal()
+    if isinstance(db, RoutingSession):
+        db.shard = db.query(models.UserDB.shard).filter(models.UserDB.id == user_id).scalar()
+        db.user_id = user_id
+    return db
+
+def url_key(bind) -> str:
+    """The bind's database URL without the driver, so caches are shared by the sync and async engines."""
+    url = bind.engine.url
+    return url.set(drivername=url.get_backend_name()).render_as_string(hide_password=True)
+
+def session_key(db) -> str:
+    """url_key of the database a (sync or async, possibly routed) session reads user data from."""
+    return url_key(getattr(db, "sync_session", db).get_bind())
+
+def session_shard(db):
+    """Shard a (sync or async) session is routed to; None = the directory database."""
+    return getattr(getattr(db, "sync_session", db), "shard", None)
+
+def make_async_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """Asyncio counterpart of make_engine() on the same database (same pool sizes and pragmas)."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = make_url(url)
+    backend = url.get_backend_name()
+    url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    if backend != "sqlite":
+        return create_async_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+    async_engine = create_async_engine(
+        url,
+        connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW
+    )
+    event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    return async_engine
+
+# Async engine per database (keyed by url_key), mirroring the sync engines
+_async_engines = {}
+
+def async_engine_for(sync_engine):
+    key = url_key(sync_engine)
+    if key not in _async_engines:
+        _async_engines[key] = make_async_engine(sync_engine.url.render_as_string(hide_password=False))
+    return _async_engines[key]
+
+def _async_shard_bind(shard: int):
+    return async_engine_for(shard_engine(shard)).sync_engine
+
+# async_sessionmaker per directory database, built once; a swapped `engine` gets its own
+_async_sessionmakers = {}
+
+def async_session_factory():
+    """async_sessionmaker on the async twin of `engine`, routed like SessionLocal."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    key = url_key(engine)
+    if key not in _async_sessionmakers:
+        _async_sessionmakers[key] = async_sessionmaker(
+            async_engine_for(engine), sync_session_class=RoutingSession, shard_bind=_async_shard_bind,
+            autoflush=False, expire_on_commit=False
+        )
+    return _async_sessionmakers[key]
+
+async def get_async_db():
+    """AsyncSession dependency for `async def` endpoints; requires the backend's async driver (aiosqlite)."""
+    async with async_session_factory()() as db:
+        yield db
+
+async def dispose_async_engines():
+    for async_engine in list(_async_engines.values()):
+        await async_engine.dispose()
+    _async_engines.clear()
+    _async_sessionmakers.clear()
+
+def init_db(bind=None):
+    """Upgrade the schema to the latest Alembic migration (default: directory and every shard).
+
+    Databases created by the old create_all() call have tables but no
+    alembic_version; they are stamped at the baseline first so only the later
+    migrations run against them. Shards get the full schema, users table
+    included, so a user's rows move between databases unchanged.
+    """
+    if bind is None:
+        for shard in all_shards():
+            init_db(bind_for_shard(shard))
+        return
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    with bind.begin() as connection:
+        config.attributes['connection'] = connection
+        tables = set(inspect(connection).get_table_names())
+        if 'alembic_version' not in tables and 'transactions' in tables:
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
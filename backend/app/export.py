@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+import os
+from typing import Any, Dict, Iterator, List, Tuple
+
+from . import database, models, queries
+
+# Rows fetched from the database cursor per step. Memory use is bounded by
+# this, not by the size of the user's history.
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "10000"))
+
+EXPORT_COLUMNS = (
+    'id', 'date', 'description', 'amount', 'category',
+    'source', 'is_recurring', 'is_anomaly', 'statement_id'
+)
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class ExportUnavailable(Exception):
+    """The requested format needs an optional dependency that isn't installed."""
+
+
+def check_format(fmt: str):
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportUnavailable("Parquet export requires pyarrow")
+
+
+def _chunks(user_id: int, filters: Dict[str, Any]) -> Iterator[List[Tuple]]:
+    """The user's matching transactions in id order, EXPORT_CHUNK_ROWS tuples at a time.
+
+    Uses its own session: the response keeps streaming after the request's
+    session has been closed.
+    """
+    db = database.user_session(user_id)
+    try:
+        txn = models.TransactionDB
+        query = queries.transaction_query(
+            db, user_id, columns=[getattr(txn, c) for c in EXPORT_COLUMNS], **filters
+        ).order_by(txn.id).yield_per(EXPORT_CHUNK_ROWS)
+        chunk = []
+        for row in query:
+            chunk.append(tuple(row))
+            if len(chunk) >= EXPORT_CHUNK_ROWS:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        db.close()
+
+
+def _ndjson(chunks) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + '\n' for row in chunk
+        ).encode()
+
+
+def _csv(chunks) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ByteSink(io.RawIOBase):
+    """Write-only file that hands its bytes to the response as they are produced."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+
+def _parquet(chunks) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()), ('date', pa.date32()), ('description', pa.string()),
+        ('amount', pa.float64()), ('category', pa.string()), ('source', pa.string()),
+        ('is_recurring', pa.bool_()), ('is_anomaly', pa.bool_()), ('statement_id', pa.int64()),
+    ])
+    sink = _ByteSink()
+    # One row group per chunk, flushed to the client as soon as it is written
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.drain()
+    yield sink.drain()
+
+
+_WRITERS = {'ndjson': _ndjson, 'csv': _csv, 'parquet': _parquet}
+
+
+def stream(user_id: int, fmt: str, filters: Dict[str, Any]) -> Iterator[bytes]:
+    """Encoded export of the user's transactions, one piece per fetched chunk."""
+    return _WRITERS[fmt](_chunks(user_id, filters))
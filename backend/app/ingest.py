@@ -0,0 +1,108 @@
+import sqlite3
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+
+from . import anomaly, changes, models, parsers, versions
+from .ml import ml_service
+
+# Rows parsed, classified and flushed per step. Peak memory is bounded by this,
+# not by the size of the uploaded statement.
+UPLOAD_CHUNK_SIZE = 20_000
+
+# Column order for the tuples passed to bulk_insert_transactions
+TRANSACTION_INSERT_COLUMNS = (
+    'user_id', 'date', 'description', 'amount', 'category',
+    'source', 'is_recurring', 'is_anomaly', 'statement_id'
+)
+_INSERT_SQL = "INSERT INTO {table} ({columns}) VALUES ({params})".format(
+    table=models.TransactionDB.__tablename__,
+    columns=", ".join(TRANSACTION_INSERT_COLUMNS),
+    params=", ".join("?" * len(TRANSACTION_INSERT_COLUMNS))
+)
+
+# SQLite caps bound parameters per statement (999 before 3.32, 32766 since).
+# Bulk inserts are batched so that one batch never exceeds that limit, which
+# also keeps each executemany call's parameter list to a bounded size.
+SQLITE_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+INSERT_BATCH_ROWS = SQLITE_MAX_VARIABLES // len(TRANSACTION_INSERT_COLUMNS)
+
+
+def bulk_insert_transactions(db: Session, rows: List[Tuple]) -> int:
+    """Insert transaction tuples (TRANSACTION_INSERT_COLUMNS order) with executemany.
+
+    Skips ORM object construction and SQLAlchemy's per-row parameter processing,
+    so dates must already be ISO strings and booleans 0/1, exactly as SQLAlchemy
+    would store them. Runs in the caller's transaction; nothing is committed here.
+    """
+    conn = db.connection()
+    for start in range(0, len(rows), INSERT_BATCH_ROWS):
+        conn.exec_driver_sql(_INSERT_SQL, rows[start:start + INSERT_BATCH_ROWS])
+    return len(rows)
+
+
+def ingest_statement(db: Session, user_id: int, file_path: str, filename: str,
+                     chunk_size: int = UPLOAD_CHUNK_SIZE,
+                     progress: Optional[Callable[[int], None]] = None) -> models.UploadedStatementDB:
+    """Parse, classify and store a statement chunk by chunk.
+
+    Every chunk is bulk-inserted before the next one is read, and the whole
+    statement is committed once at the end, so a failed upload leaves nothing
+    behind. `progress` is called with the number of rows written per chunk.
+    """
+    parser = parsers.BankStatementParser()
+
+    statement = models.UploadedStatementDB(
+        user_id=user_id,
+        filename=filename,
+        uploaded_at=datetime.now().isoformat(),
+        transaction_count=0
+    )
+    db.add(statement)
+    db.flush()  # assigns statement.id without committing
+
+    total = 0
+    try:
+        for chunk in parser.iter_csv_chunks(file_path, chunk_size):
+            # Score the whole chunk in one classifier / anomaly-detector call
+            uncategorized = [t for t in chunk if not t.category]
+            if uncategorized:
+                predicted = ml_service.predict_category_batch(
+                    [t.description for t in uncategorized],
+                    [t.amount for t in uncategorized]
+                )
+                for txn_data, category in zip(uncategorized, predicted):
+                    txn_data.category = category
+
+            # Scored against the user's stats as of the previous chunk, then merged
+            categories = [t.category for t in chunk]
+            amounts = [t.amount for t in chunk]
+            anomalies = anomaly.score_batch(db, user_id, categories, amounts)
+            changes.apply_rows(db, user_id, added=[(t.date, t.category, t.amount) for t in chunk])
+
+            written = bulk_insert_transactions(db, [
+                (
+                    user_id,
+                    txn_data.date.isoformat(),
+                    txn_data.description,
+                    txn_data.amount,
+                    txn_data.category,
+                    txn_data.source,
+                    0,
+                    int(is_anomaly),
+                    statement.id
+                )
+                for txn_data, is_anomaly in zip(chunk, anomalies)
+            ])
+            total += written
+            if progress:
+                progress(written)
+
+        statement.transaction_count = total
+        versions.bump(db, user_id)
+        db.commit()
+        db.refresh(statement)
+        return statement
+    except Exception:
+        db.rollback()
+        raise
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from . import database, ingest, metrics
+
+logger = logging.getLogger(__name__)
+
+# Concurrency limits for statement ingestion. Uploads run on their own pool so a
+# burst of large imports cannot take over the threads that serve the API.
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_MAX_PENDING = int(os.getenv("UPLOAD_MAX_PENDING", "8"))
+JOB_RETENTION_SECONDS = int(os.getenv("UPLOAD_JOB_RETENTION_SECONDS", "3600"))
+
+
+class JobQueueFull(Exception):
+    """Raised when every worker is busy and the pending queue is full."""
+
+
+class UploadJob:
+    def __init__(self, user_id: int, filename: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.filename = filename
+        self.status = "queued"
+        self.rows_processed = 0
+        self.statement_id: Optional[int] = None
+        self.errors: List[str] = []
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def advance(self, rows: int):
+        self.rows_processed += rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'rows_processed': self.rows_processed,
+            'rows_per_second': round(self.rows_processed / elapsed, 1) if elapsed > 0 else 0.0,
+            'elapsed_seconds': round(elapsed, 3),
+            'statement_id': self.statement_id,
+            # Kept for clients that read the old synchronous /upload response
+            'transactions_count': self.rows_processed,
+            'errors': list(self.errors)
+        }
+
+
+class UploadJobManager:
+    """Runs statement ingestion on a bounded thread pool and tracks job progress."""
+
+    def __init__(self, max_workers: int = UPLOAD_WORKERS, max_pending: int = UPLOAD_MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        # One slot per running or queued job; submit() fails fast when none are free
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._jobs: Dict[str, UploadJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user_id: int, file_path: str, filename: str) -> UploadJob:
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull("Too many uploads in progress")
+        job = UploadJob(user_id, filename)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, file_path)
+        return job
+
+    def get(self, job_id: str, user_id: int) -> Optional[UploadJob]:
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _run(self, job: UploadJob, file_path: str):
+        job.status = "running"
+        job.started_at = time.time()
+        db = None
+        try:
+            # Inside the try: it looks the user's shard up, and a failure must still fail the job
+            db = database.user_session(job.user_id)
+            statement = ingest.ingest_statement(
+                db, job.user_id, file_path, job.filename, progress=job.advance
+            )
+            job.statement_id = statement.id
+            job.status = "completed"
+        except Exception as e:
+            logger.error(f"Error processing upload {job.id}: {str(e)}", exc_info=True)
+            job.errors.append(f"Error processing file: {str(e)}")
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self._observe(job)
+            if db is not None:
+                db.close()
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            self._slots.release()
+
+    @staticmethod
+    def _observe(job: UploadJob):
+        seconds = job.finished_at - job.started_at
+        metrics.UPLOAD_SECONDS.observe(seconds, status=job.status)
+        metrics.UPLOAD_ROWS.inc(job.rows_processed, status=job.status)
+        if job.status == "completed" and seconds > 0:
+            metrics.UPLOAD_ROWS_PER_SECOND.observe(job.rows_processed / seconds)
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        """Retained jobs per status."""
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in ("queued", "running", "completed", "failed")}
+
+
+upload_jobs = UploadJobManager()
@@ -0,0 +1,22 @@
+import importlib
+
+
+class LazyModule:
+    """Stand-in for a heavy module that is only imported on first attribute access.
+
+    Lets modules keep `pd.DataFrame(...)`-style code while deferring the import of
+    pandas/numpy/scipy until a request (or the warmup task) actually needs them.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def load(self):
+        """Import the module now (used by warmup) and return it."""
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
@@ -0,0 +1,129 @@
+import os
+from typing import Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import database, models, versions
+from .cache import LRUCache
+from .lazy import LazyModule
+
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+
+# Users whose ledgers stay in memory between requests
+LEDGER_CACHE_SIZE = int(os.getenv("LEDGER_CACHE_SIZE", "256"))
+
+
+class Ledger:
+    """Columnar, read-only snapshot of one user's transactions.
+
+    Dates, amounts and dictionary-encoded categories / descriptions live in
+    NumPy arrays and the DataFrame built from them is made once, so every
+    analytics method shares one build instead of hydrating ORM rows and
+    calling pd.to_datetime itself.
+    """
+
+    def __init__(self, dates, amounts, category_codes, categories, description_codes, descriptions):
+        self.dates = dates                            # datetime64[ns]
+        self.amounts = amounts                        # float64
+        self.category_codes = category_codes          # int, -1 = no category
+        self.categories = categories                  # code -> category
+        self.description_codes = description_codes
+        self.descriptions = descriptions              # code -> description
+        self._df = None
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[Any, float, Optional[str], Optional[str]]]) -> "Ledger":
+        """Build from (date, amount, category, description) tuples."""
+        rows = list(rows)
+        dates, amounts, categories, descriptions = zip(*rows) if rows else ((), (), (), ())
+        category_codes, category_values = pd.factorize(pd.Series(categories, dtype=object))
+        description_codes, description_values = pd.factorize(pd.Series(descriptions, dtype=object))
+        return cls(
+            dates=pd.to_datetime(pd.Series(dates, dtype=object)).to_numpy(),
+            amounts=np.asarray(amounts, dtype=float),
+            category_codes=category_codes,
+            categories=np.asarray(category_values, dtype=object),
+            description_codes=description_codes,
+            descriptions=np.asarray(description_values, dtype=object)
+        )
+
+    @classmethod
+    def from_transactions(cls, transactions: List[Any]) -> "Ledger":
+        """Build from transaction objects (ORM rows or schemas.Transaction)."""
+        return cls.from_rows(
+            (t.date, t.amount, getattr(t, 'category', None), t.description) for t in transactions
+        )
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    @staticmethod
+    def _decode(codes, values):
+        decoded = np.empty(len(codes), dtype=object)
+        valid = codes >= 0
+        decoded[valid] = values[codes[valid]]
+        decoded[~valid] = None
+        return decoded
+
+    @property
+    def df(self):
+        if self._df is None:
+            self._df = pd.DataFrame({
+                'date': self.dates,
+                'amount': self.amounts,
+                'category': self._decode(self.category_codes, self.categories),
+                'description': self._decode(self.description_codes, self.descriptions)
+            })
+        return self._df
+
+    def frame(self, *columns: str, category_default: Optional[str] = None):
+        """A private copy of the requested columns, safe for callers to modify."""
+        df = self.df[list(columns)].copy()
+        if category_default is not None and 'category' in df:
+            df['category'] = df['category'].fillna(category_default)
+        return df
+
+
+_ledgers = LRUCache(LEDGER_CACHE_SIZE)
+
+
+def bump(db: Session, user_id: int):
+    """Invalidate the user's cached ledger. Call in the same transaction as the write."""
+    versions.bump(db, user_id, ledger=True)
+
+
+def cached_ledger(db: Session, user_id: int) -> Tuple[Optional[Ledger], Tuple, int]:
+    """(cached ledger if still current else None, cache key, current ledger_version)."""
+    # Read the version before the rows: a write landing in between makes the
+    # cached copy look older than it is, never newer.
+    version = versions.get(db, user_id)['ledger_version']
+    key = (database.session_key(db), user_id)
+    cached = _ledgers.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1], key, version
+    return None, key, version
+
+
+def ledger_rows(db: Session, user_id: int) -> List[Tuple]:
+    txn = models.TransactionDB
+    return db.query(txn.date, txn.amount, txn.category, txn.description).filter(
+        txn.user_id == user_id
+    ).order_by(txn.id).all()
+
+
+def store(key: Tuple, version: int, ledger: Ledger):
+    _ledgers.put(key, (version, ledger))
+
+
+def get_ledger(db: Session, user_id: int) -> Ledger:
+    """The user's ledger, rebuilt only when their ledger_version has moved."""
+    ledger, key, version = cached_ledger(db, user_id)
+    if ledger is None:
+        ledger = Ledger.from_rows(ledger_rows(db, user_id))
+        store(key, version, ledger)
+    return ledger
+
+
+def cache_stats():
+    return _ledgers.stats()
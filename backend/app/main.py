@@ -1,12 +1,22 @@
-from fastapi import FastAPI, Depends, UploadFile, File, HTTPException
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Depends, UploadFile, File, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import date
 import shutil
 import os
+import tempfile
 
-from . import models, schemas, database, parsers
+from . import models, schemas, database, jobs, anomaly, ledger, changes, dashboard
+from . import async_loaders, conditional, export, metrics, passwords, profiling, queries, versions
 from .ml import ml_service
+from .jobs import upload_jobs
 from . import auth as auth_module
 import logging
 
@@ -25,113 +35,192 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Request-Id"],
 )
-
-# Database
-models.Base.metadata.create_all(bind=database.engine)
+# Profiles requests sent with X-Profile: $PROFILE_TOKEN, or PROFILE_SAMPLE_RATE of them
+app.add_middleware(profiling.ProfilingMiddleware)
+# Outermost, so latency includes every other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Load models in the background (ML_WARMUP=0 leaves them to load on first use)
+ML_WARMUP = os.getenv("ML_WARMUP", "1") == "1"
+# How often workers check the model registry for a newly published version (0 = never)
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "30"))
+# Largest page GET /transactions will return
+TRANSACTIONS_MAX_PAGE = int(os.getenv("TRANSACTIONS_MAX_PAGE", "5000"))
+startup_timings = {'import_seconds': round(time.perf_counter() - _import_started, 4), 'startup_seconds': None}
 
 @app.on_event("startup")
 async def startup_event():
-    ml_service.load_models()
+    # Schema (and the one-off backfill of derived state) is managed by Alembic
+    # (backend/migrations); bring it up to date first
+    database.init_db()
+    await passwords.hash_pool.start()
+    if ML_WARMUP:
+        ml_service.start_warmup()
+    if MODEL_RELOAD_INTERVAL > 0:
+        ml_service.start_reload_watcher(MODEL_RELOAD_INTERVAL)
+    startup_timings['startup_seconds'] = round(time.perf_counter() - _import_started, 4)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    passwords.hash_pool.shutdown()
+    await database.dispose_async_engines()
+
+@app.get("/health/ready")
+def readiness():
+    """Per-model load state and timings; 503 until the serving models are loaded."""
+    report = ml_service.readiness()
+    report.update(startup_timings)
+    return JSONResponse(content=report, status_code=200 if report['ready'] else 503)
+
+metrics.observe_caches({
+    'ledger': ledger.cache_stats,
+    'conditional': conditional.cache_stats,
+    'auth': auth_module.cache_stats,
+    'category': lambda: ml_service.category_cache.stats(),
+})
+
+@metrics.registry.collector
+def _collect_queues():
+    for status, count in upload_jobs.stats().items():
+        metrics.UPLOAD_JOBS.set(count, status=status)
+    metrics.PASSWORD_HASHES_IN_FLIGHT.set(passwords.hash_pool.in_flight)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text-format metrics: request / ML latency, uploads, DB queries, caches."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.exception_handler(database.ShardMoved)
+async def shard_moved(request: Request, exc: database.ShardMoved):
+    # The write was rolled back; drop the stale principal so the retry routes to the new shard
+    auth_module.invalidate_user(exc.user_id)
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
+
+def _profile_access(x_profile: Optional[str] = Header(None)):
+    # Profiles reveal code paths and timings; without PROFILE_TOKEN they can't be downloaded
+    if not profiling.authorized(x_profile):
+        raise HTTPException(status_code=404, detail="Not found")
+
+@app.get("/profiles", dependencies=[Depends(_profile_access)])
+def list_profiles():
+    """Saved request profiles, newest first. Send the X-Profile token."""
+    return profiling.list_profiles()
+
+@app.get("/profiles/{request_id}", dependencies=[Depends(_profile_access)])
+def download_profile(request_id: str, format: str = "json"):
+    """A request's profile: JSON with a per-function summary, or format=folded for flame graphs."""
+    profile = profiling.load(request_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        return PlainTextResponse(profiling.folded(profile), headers={
+            "Content-Disposition": f'attachment; filename="{request_id}.folded"'
+        })
+    return JSONResponse(profile, headers={"Content-Disposition": f'attachment; filename="{request_id}.json"'})
 
 # ===== AUTH ENDPOINTS =====
 
+def _auth_busy(e: Exception) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
 @app.post("/auth/register", response_model=schemas.Token)
-def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_async_db)):
     """Register a new user."""
-    existing = db.query(models.UserDB).filter(models.UserDB.username == user.username).first()
+    existing = (await db.execute(select(models.UserDB.id).where(models.UserDB.username == user.username))).first()
     if existing:
         raise HTTPException(status_code=400, detail="Username already taken")
-    existing_email = db.query(models.UserDB).filter(models.UserDB.email == user.email).first()
+    existing_email = (await db.execute(select(models.UserDB.id).where(models.UserDB.email == user.email))).first()
     if existing_email:
         raise HTTPException(status_code=400, detail="Email already registered")
-    
+
+    # Hand the pooled connection back while the hash runs
+    await db.commit()
+    try:
+        hashed_password = await passwords.hash_pool.hash(user.password)
+    except passwords.HashingBusy as e:
+        raise _auth_busy(e)
+
     from datetime import datetime
     db_user = models.UserDB(
         username=user.username,
         email=user.email,
-        hashed_password=auth_module.get_password_hash(user.password),
+        hashed_password=hashed_password,
         full_name=user.full_name,
         created_at=datetime.now().isoformat()
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()  # assigns the id the shard is derived from
+    db_user.shard = database.assign_shard(db_user.id)
+    await db.commit()
+    auth_module.invalidate_user(db_user.id, db_user.username)  # a deleted user of the same name may still be cached
     
-    access_token = auth_module.create_access_token(data={"sub": db_user.username})
+    access_token = auth_module.token_for(db_user)
     return {"access_token": access_token, "token_type": "bearer", "user": db_user}
 
 @app.post("/auth/login", response_model=schemas.Token)
-def login(credentials: schemas.UserLogin, db: Session = Depends(database.get_db)):
+async def login(credentials: schemas.UserLogin, db: AsyncSession = Depends(database.get_async_db)):
     """Login and get a JWT token."""
-    user = db.query(models.UserDB).filter(models.UserDB.username == credentials.username).first()
-    if not user or not auth_module.verify_password(credentials.password, user.hashed_password):
+    try:
+        # Counted as a failure up front: concurrent guesses can't all pass the check during the hash
+        attempt = passwords.login_throttle.reserve(credentials.username)
+    except passwords.LoginThrottled as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+
+    try:
+        user = (await db.execute(
+            select(models.UserDB).where(models.UserDB.username == credentials.username)
+        )).scalars().first()
+        await db.commit()  # hand the pooled connection back while the hash runs
+        valid = user is not None and await passwords.hash_pool.verify(credentials.password, user.hashed_password)
+    except Exception as e:
+        # Never verified, so not a failed login
+        passwords.login_throttle.release(credentials.username, attempt)
+        if isinstance(e, passwords.HashingBusy):
+            raise _auth_busy(e)
+        raise
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid username or password")
+    passwords.login_throttle.succeeded(credentials.username)
     
-    access_token = auth_module.create_access_token(data={"sub": user.username})
+    access_token = auth_module.token_for(user)
     return {"access_token": access_token, "token_type": "bearer", "user": user}
 
 @app.get("/auth/me", response_model=schemas.UserResponse)
-def get_current_user(current_user=Depends(auth_module.get_current_user_required)):
+async def get_current_user(current_user=Depends(auth_module.get_current_user_required_async)):
     """Get current authenticated user."""
     return current_user
 
 # ===== DATA ENDPOINTS (all user-scoped) =====
 
-@app.post("/upload")
-async def upload_statement(
+@app.post("/upload", status_code=202)
+def upload_statement(
     file: UploadFile = File(...),
-    db: Session = Depends(database.get_db),
     current_user=Depends(auth_module.get_current_user_required)
 ):
-    temp_file = f"temp_{file.filename}"
-    with open(temp_file, "wb") as buffer:
+    """Queue a statement for background ingestion and return its job id."""
+    fd, temp_file = tempfile.mkstemp(prefix="upload_", suffix=".csv")
+    with os.fdopen(fd, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
-        
+
     try:
-        parser = parsers.BankStatementParser()
-        transactions = parser.parse_csv(temp_file)
-        
-        from datetime import datetime
-        statement = models.UploadedStatementDB(
-            user_id=current_user.id,
-            filename=file.filename,
-            uploaded_at=datetime.now().isoformat(),
-            transaction_count=len(transactions)
-        )
-        db.add(statement)
-        db.commit()
-        db.refresh(statement)
-        
-        saved_txns = []
-        for txn_data in transactions:
-            if not txn_data.category:
-                txn_data.category = ml_service.predict_category(txn_data.description, txn_data.amount)
-            
-            is_anomaly = ml_service.detect_anomaly(txn_data.amount)
-            
-            db_txn = models.TransactionDB(
-                user_id=current_user.id,
-                date=txn_data.date,
-                description=txn_data.description,
-                amount=txn_data.amount,
-                category=txn_data.category,
-                source=txn_data.source,
-                is_anomaly=is_anomaly,
-                statement_id=statement.id
-            )
-            db.add(db_txn)
-            saved_txns.append(db_txn)
-        
-        db.commit()
-            
-        return {"transactions_count": len(saved_txns), "statement_id": statement.id, "filename": file.filename}
-    except Exception as e:
-        logger.error(f"Error processing upload: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
-    finally:
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+        job = upload_jobs.submit(current_user.id, temp_file, file.filename)
+    except jobs.JobQueueFull:
+        os.remove(temp_file)
+        raise HTTPException(status_code=429, detail="Too many uploads in progress, please retry shortly")
+    return job.to_dict()
+
+@app.get("/upload/jobs/{job_id}")
+def get_upload_job(
+    job_id: str,
+    current_user=Depends(auth_module.get_current_user_required)
+):
+    """Report progress of a background upload."""
+    job = upload_jobs.get(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job.to_dict()
 
 @app.post("/transactions", response_model=schemas.TransactionResponse)
 def create_transaction(
@@ -144,7 +233,8 @@ def create_transaction(
     if not category:
         category = ml_service.predict_category(txn.description, txn.amount)
     
-    is_anomaly = ml_service.detect_anomaly(txn.amount)
+    # Scored against the user's stats before this transaction is added to them
+    is_anomaly = anomaly.score(db, current_user.id, category, txn.amount)
     
     db_txn = models.TransactionDB(
         user_id=current_user.id,
@@ -157,32 +247,70 @@ def create_transaction(
         statement_id=None
     )
     db.add(db_txn)
+    changes.apply_rows(db, current_user.id, added=[(txn.date, category, txn.amount)])
     db.commit()
     db.refresh(db_txn)
     return db_txn
 
 @app.get("/transactions", response_model=List[schemas.TransactionResponse])
-def get_transactions(
-    skip: int = 0, limit: int = 500, statement_ids: str = None,
-    db: Session = Depends(database.get_db),
+async def get_transactions(
+    request: Request,
+    limit: int = 500, cursor: Optional[str] = None,
+    start: Optional[date] = None, end: Optional[date] = None, category: Optional[str] = None,
+    min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+    is_anomaly: Optional[bool] = None, statement_ids: str = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
+):
+    """Newest first. When more rows match, the X-Next-Cursor header holds the `cursor` for the next page."""
+    async def compute():
+        try:
+            rows, next_cursor = await async_loaders.transaction_page(
+                db, current_user.id, cursor, max(1, min(limit, TRANSACTIONS_MAX_PAGE)),
+                start=start, end=end, category=category, min_amount=min_amount, max_amount=max_amount,
+                is_anomaly=is_anomaly, statement_ids=queries.parse_ids(statement_ids)
+            )
+        except queries.InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return conditional.Page(rows, {'X-Next-Cursor': next_cursor} if next_cursor else {})
+    return await conditional.respond_async(request, db, current_user.id, compute, model=schemas.TransactionResponse)
+
+@app.get("/transactions/export")
+def export_transactions(
+    format: str = "ndjson",
+    start: Optional[date] = None, end: Optional[date] = None, category: Optional[str] = None,
+    min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+    is_anomaly: Optional[bool] = None, statement_ids: str = None,
     current_user=Depends(auth_module.get_current_user_required)
 ):
-    query = db.query(models.TransactionDB).filter(models.TransactionDB.user_id == current_user.id)
-    if statement_ids:
-        ids = [int(id.strip()) for id in statement_ids.split(',') if id.strip()]
-        if ids:
-            query = query.filter(models.TransactionDB.statement_id.in_(ids))
-    return query.offset(skip).limit(limit).all()
+    """Stream all matching transactions as NDJSON, CSV or Parquet, in id order."""
+    try:
+        export.check_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except export.ExportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    filters = dict(
+        start=start, end=end, category=category, min_amount=min_amount, max_amount=max_amount,
+        is_anomaly=is_anomaly, statement_ids=queries.parse_ids(statement_ids)
+    )
+    return StreamingResponse(
+        export.stream(current_user.id, format, filters),
+        media_type=export.MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="transactions.{format}"'}
+    )
 
 @app.get("/statements", response_model=List[schemas.UploadedStatementResponse])
-def get_statements(
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+async def get_statements(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
     """Get all uploaded statements for the current user."""
-    return db.query(models.UploadedStatementDB).filter(
-        models.UploadedStatementDB.user_id == current_user.id
-    ).order_by(models.UploadedStatementDB.id.desc()).all()
+    async def compute():
+        statement = models.UploadedStatementDB
+        return await async_loaders.user_rows(db, statement, current_user.id, order_by=statement.id.desc())
+    return await conditional.respond_async(request, db, current_user.id, compute, model=schemas.UploadedStatementResponse)
 
 @app.delete("/statements/{statement_id}")
 def delete_statement(
@@ -198,10 +326,12 @@ def delete_statement(
     if not statement:
         raise HTTPException(status_code=404, detail="Statement not found")
     
-    deleted_count = db.query(models.TransactionDB).filter(
+    criteria = (
         models.TransactionDB.statement_id == statement_id,
         models.TransactionDB.user_id == current_user.id
-    ).delete(synchronize_session=False)
+    )
+    changes.remove_matching(db, current_user.id, *criteria)
+    deleted_count = db.query(models.TransactionDB).filter(*criteria).delete(synchronize_session=False)
     
     db.delete(statement)
     db.commit()
@@ -221,12 +351,22 @@ def update_transaction(
     if not db_txn:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
+    old_row = (db_txn.date, db_txn.category, db_txn.amount)
     if txn_update.description is not None:
         db_txn.description = txn_update.description
     if txn_update.amount is not None:
         db_txn.amount = txn_update.amount
     if txn_update.category is not None:
         db_txn.category = txn_update.category
+
+    new_row = (db_txn.date, db_txn.category, db_txn.amount)
+    if new_row != old_row:
+        # Re-score against the stats without the old values, then swap them in
+        changes.apply_rows(db, current_user.id, removed=[old_row])
+        db_txn.is_anomaly = anomaly.score(db, current_user.id, db_txn.category, db_txn.amount)
+        changes.apply_rows(db, current_user.id, added=[new_row])
+    else:
+        ledger.bump(db, current_user.id)  # description changed
     
     db.commit()
     db.refresh(db_txn)
@@ -244,6 +384,7 @@ def delete_transaction(
     ).first()
     if not db_txn:
         raise HTTPException(status_code=404, detail="Transaction not found")
+    changes.apply_rows(db, current_user.id, removed=[(db_txn.date, db_txn.category, db_txn.amount)])
     db.delete(db_txn)
     db.commit()
     return {"message": "Transaction deleted"}
@@ -254,75 +395,91 @@ def bulk_delete_transactions(
     db: Session = Depends(database.get_db),
     current_user=Depends(auth_module.get_current_user_required)
 ):
-    deleted_count = db.query(models.TransactionDB).filter(
+    criteria = (
         models.TransactionDB.id.in_(ids),
         models.TransactionDB.user_id == current_user.id
-    ).delete(synchronize_session=False)
+    )
+    changes.remove_matching(db, current_user.id, *criteria)
+    deleted_count = db.query(models.TransactionDB).filter(*criteria).delete(synchronize_session=False)
     db.commit()
     return {"message": f"Deleted {deleted_count} transactions"}
 
 # Analytics (all user-scoped)
 
 @app.get("/analytics/forecast")
-def get_forecast(
+async def get_forecast(
+    request: Request,
     days: int = 30,
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
-    transactions = db.query(models.TransactionDB).filter(models.TransactionDB.user_id == current_user.id).all()
-    return ml_service.forecast_balance(transactions, days)
+    async def compute():
+        daily = await async_loaders.daily_frame(db, current_user.id)
+        return await ml_service.offload(ml_service.forecast_from_daily, daily, days)
+    return await conditional.respond_async(request, db, current_user.id, compute)
 
 @app.get("/analytics/spending")
-def get_spending_breakdown(
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+async def get_spending_breakdown(
+    request: Request,
+    start: Optional[date] = None, end: Optional[date] = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
-    txns = db.query(models.TransactionDB).filter(models.TransactionDB.user_id == current_user.id).all()
-    breakdown = {}
-    for t in txns:
-        if t.amount is not None and t.amount < 0:
-            cat = t.category or "Uncategorized"
-            breakdown[cat] = breakdown.get(cat, 0) + abs(t.amount)
-    return breakdown
+    async def compute():
+        return await async_loaders.spending_by_category(db, current_user.id, start, end)
+    return await conditional.respond_async(request, db, current_user.id, compute)
 
 @app.get("/analytics/summary")
-def get_analytics_summary(
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+async def get_analytics_summary(
+    request: Request,
+    start: Optional[date] = None, end: Optional[date] = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
     """Get comprehensive financial analytics summary."""
-    transactions = db.query(models.TransactionDB).filter(models.TransactionDB.user_id == current_user.id).all()
-    summary = ml_service.calculate_analytics_summary(transactions)
-    summary['investment_suggestions'] = ml_service.get_investment_suggestions(summary)
-    return summary
+    async def compute():
+        summary = ml_service.summarize_totals(await async_loaders.totals(db, current_user.id, start, end))
+        summary['investment_suggestions'] = ml_service.get_investment_suggestions(summary)
+        return summary
+    return await conditional.respond_async(request, db, current_user.id, compute)
 
 @app.get("/analytics/subscriptions")
-def get_subscriptions(
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+async def get_subscriptions(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
     """Detect recurring subscriptions."""
-    transactions = db.query(models.TransactionDB).filter(models.TransactionDB.user_id == current_user.id).all()
-    return ml_service.detect_subscriptions(transactions)
+    async def compute():
+        transactions = await async_loaders.get_ledger(db, current_user.id)
+        return await ml_service.offload(ml_service.detect_subscriptions, transactions)
+    return await conditional.respond_async(request, db, current_user.id, compute)
 
 @app.get("/analytics/income-patterns")
-def get_income_patterns(
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+async def get_income_patterns(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
     """Detect salary/income patterns."""
-    transactions = db.query(models.TransactionDB).filter(models.TransactionDB.user_id == current_user.id).all()
-    return ml_service.detect_income_patterns(transactions)
+    async def compute():
+        transactions = await async_loaders.get_ledger(db, current_user.id)
+        return await ml_service.offload(ml_service.detect_income_patterns, transactions)
+    return await conditional.respond_async(request, db, current_user.id, compute)
 
 @app.get("/analytics/savings-projection")
-def get_savings_projection(
+async def get_savings_projection(
+    request: Request,
     months: int = 12,
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+    start: Optional[date] = None, end: Optional[date] = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
     """Project savings growth."""
-    transactions = db.query(models.TransactionDB).filter(models.TransactionDB.user_id == current_user.id).all()
-    return ml_service.project_savings(transactions, months)
+    async def compute():
+        totals = await async_loaders.totals(db, current_user.id, start, end)
+        return ml_service.project_savings_from_totals(totals, months)
+    return await conditional.respond_async(request, db, current_user.id, compute)
 
 # Budgets (user-scoped)
 
@@ -342,16 +499,20 @@ def create_budget(
     else:
         db_budget = models.BudgetDB(user_id=current_user.id, category=budget.category, amount=budget.amount)
         db.add(db_budget)
+    versions.bump(db, current_user.id)
     db.commit()
     db.refresh(db_budget)
     return db_budget
 
 @app.get("/budgets", response_model=List[schemas.BudgetResponse])
-def get_budgets(
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+async def get_budgets(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
-    return db.query(models.BudgetDB).filter(models.BudgetDB.user_id == current_user.id).all()
+    async def compute():
+        return await async_loaders.user_rows(db, models.BudgetDB, current_user.id)
+    return await conditional.respond_async(request, db, current_user.id, compute, model=schemas.BudgetResponse)
 
 @app.delete("/budgets/{budget_id}")
 def delete_budget(
@@ -366,20 +527,23 @@ def delete_budget(
     if not db_budget:
         raise HTTPException(status_code=404, detail="Budget not found")
     db.delete(db_budget)
+    versions.bump(db, current_user.id)
     db.commit()
     return {"message": "Budget deleted"}
 
 # Bill Reminders (user-scoped)
 
 @app.get("/bill-reminders", response_model=List[schemas.BillReminderResponse])
-def get_bill_reminders(
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+async def get_bill_reminders(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
-    return db.query(models.BillReminderDB).filter(
-        models.BillReminderDB.user_id == current_user.id,
-        models.BillReminderDB.is_active == True
-    ).all()
+    async def compute():
+        return await async_loaders.user_rows(
+            db, models.BillReminderDB, current_user.id, models.BillReminderDB.is_active == True
+        )
+    return await conditional.respond_async(request, db, current_user.id, compute, model=schemas.BillReminderResponse)
 
 @app.post("/bill-reminders", response_model=schemas.BillReminderResponse)
 def create_bill_reminder(
@@ -389,6 +553,7 @@ def create_bill_reminder(
 ):
     db_reminder = models.BillReminderDB(user_id=current_user.id, **reminder.dict())
     db.add(db_reminder)
+    versions.bump(db, current_user.id)
     db.commit()
     db.refresh(db_reminder)
     return db_reminder
@@ -406,6 +571,7 @@ def delete_bill_reminder(
     if not db_reminder:
         raise HTTPException(status_code=404, detail="Bill reminder not found")
     db.delete(db_reminder)
+    versions.bump(db, current_user.id)
     db.commit()
     return {"message": "Bill reminder deleted"}
 
@@ -413,11 +579,14 @@ def delete_bill_reminder(
 
 # Goals CRUD
 @app.get("/goals", response_model=List[schemas.GoalResponse])
-def get_goals(
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+async def get_goals(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
-    return db.query(models.GoalDB).filter(models.GoalDB.user_id == current_user.id).all()
+    async def compute():
+        return await async_loaders.user_rows(db, models.GoalDB, current_user.id)
+    return await conditional.respond_async(request, db, current_user.id, compute, model=schemas.GoalResponse)
 
 @app.post("/goals", response_model=schemas.GoalResponse)
 def create_goal(
@@ -435,6 +604,7 @@ def create_goal(
         created_at=datetime.now().isoformat()
     )
     db.add(db_goal)
+    versions.bump(db, current_user.id)
     db.commit()
     db.refresh(db_goal)
     return db_goal
@@ -459,6 +629,7 @@ def update_goal(
         db_goal.current_saved = goal_update.current_saved
     if goal_update.deadline is not None:
         db_goal.deadline = goal_update.deadline
+    versions.bump(db, current_user.id)
     db.commit()
     db.refresh(db_goal)
     return db_goal
@@ -476,49 +647,79 @@ def delete_goal(
     if not db_goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     db.delete(db_goal)
+    versions.bump(db, current_user.id)
     db.commit()
     return {"message": "Goal deleted"}
 
 @app.get("/goals/{goal_id}/plan")
-def get_goal_plan(
+async def get_goal_plan(
+    request: Request,
     goal_id: int,
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
     """Get detailed goal planning analysis."""
-    db_goal = db.query(models.GoalDB).filter(
-        models.GoalDB.id == goal_id,
-        models.GoalDB.user_id == current_user.id
-    ).first()
-    if not db_goal:
-        raise HTTPException(status_code=404, detail="Goal not found")
-    transactions = db.query(models.TransactionDB).filter(models.TransactionDB.user_id == current_user.id).all()
-    return ml_service.plan_goal(
-        db_goal.target_amount, 
-        db_goal.deadline, 
-        transactions, 
-        db_goal.current_saved
-    )
+    async def compute():
+        db_goal = await async_loaders.user_row(db, models.GoalDB, current_user.id, goal_id)
+        if not db_goal:
+            raise HTTPException(status_code=404, detail="Goal not found")
+        transactions = await async_loaders.get_ledger(db, current_user.id)
+        return await ml_service.offload(
+            ml_service.plan_goal,
+            db_goal.target_amount,
+            db_goal.deadline,
+            transactions,
+            db_goal.current_saved
+        )
+    return await conditional.respond_async(request, db, current_user.id, compute, vary_by_day=True)
 
 # Emergency Detection
 @app.get("/analytics/emergencies")
-def get_emergencies(
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+async def get_emergencies(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
     """Detect financial emergencies and get recovery suggestions."""
-    transactions = db.query(models.TransactionDB).filter(models.TransactionDB.user_id == current_user.id).all()
-    return ml_service.detect_emergencies(transactions)
+    async def compute():
+        transactions = await async_loaders.get_ledger(db, current_user.id)
+        return await ml_service.offload(
+            ml_service.detect_emergencies,
+            transactions,
+            monthly=await async_loaders.monthly_frame(db, current_user.id),
+            totals=await async_loaders.totals(db, current_user.id)
+        )
+    return await conditional.respond_async(request, db, current_user.id, compute)
 
 # Spending Personality
 @app.get("/analytics/personality")
-def get_spending_personality(
-    db: Session = Depends(database.get_db),
-    current_user=Depends(auth_module.get_current_user_required)
+async def get_spending_personality(
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
 ):
     """Analyze and classify spending personality."""
-    transactions = db.query(models.TransactionDB).filter(models.TransactionDB.user_id == current_user.id).all()
-    return ml_service.analyze_spending_personality(transactions)
+    async def compute():
+        transactions = await async_loaders.get_ledger(db, current_user.id)
+        return await ml_service.offload(ml_service.analyze_spending_personality, transactions)
+    return await conditional.respond_async(request, db, current_user.id, compute)
+
+# Dashboard
+@app.get("/dashboard")
+async def get_dashboard(
+    request: Request,
+    panels: Optional[str] = None, days: int = 30, months: int = 12,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user=Depends(auth_module.get_current_user_required_async)
+):
+    """All analytics panels (or the comma-separated `panels`) in one response."""
+    async def compute():
+        names = [name.strip() for name in panels.split(',') if name.strip()] if panels else list(dashboard.PANELS)
+        unknown = [name for name in names if name not in dashboard.PANELS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown panels: {', '.join(unknown)}")
+        return await dashboard.build_dashboard_async(db, current_user.id, names, days, months)
+    return await conditional.respond_async(request, db, current_user.id, compute)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,277 @@
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# In-process metrics in the Prometheus text exposition format, served by
+# GET /metrics. Counters, gauges and histograms are labelled; gauges whose
+# value lives elsewhere (cache stats, pool depths) are read at scrape time
+# through collectors.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+ROWS_PER_SECOND_BUCKETS = (10, 100, 1e3, 5e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}' for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            items = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = _format_labels(self.label_names, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self.add(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.add(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, help_text, labels, buckets))
+
+    def collector(self, fn: Callable[[], None]):
+        """Register fn to refresh gauges from their source right before each scrape."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception:
+                # One failing source mustn't take the whole scrape down
+                logger.exception("Metrics collector error")
+        return '\n'.join(line for metric in self._metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route, method and status',
+    ('route', 'method', 'status'))
+REQUESTS_IN_FLIGHT = registry.gauge('http_requests_in_flight', 'HTTP requests currently being served')
+REQUEST_DB_QUERIES = registry.histogram(
+    'http_request_db_queries', 'SQL statements executed per HTTP request', ('route',), COUNT_BUCKETS)
+DB_QUERIES = registry.counter('db_queries_total', 'SQL statements executed, in or outside requests')
+ML_SECONDS = registry.histogram(
+    'ml_method_duration_seconds', 'MLService method latency', ('method',))
+ML_ROWS = registry.counter(
+    'ml_method_rows_total', 'Rows (transactions, descriptions, days) processed by MLService methods', ('method',))
+ML_ERRORS = registry.counter('ml_method_errors_total', 'MLService methods that raised', ('method',))
+UPLOAD_ROWS = registry.counter('upload_rows_total', 'Transactions stored by statement uploads', ('status',))
+UPLOAD_SECONDS = registry.histogram(
+    'upload_duration_seconds', 'Statement ingestion time', ('status',), LATENCY_BUCKETS + (30.0, 60.0, 120.0))
+UPLOAD_ROWS_PER_SECOND = registry.histogram(
+    'upload_rows_per_second', 'Ingestion throughput of completed uploads', (), ROWS_PER_SECOND_BUCKETS)
+UPLOAD_JOBS = registry.gauge('upload_jobs', 'Retained upload jobs by status', ('status',))
+PASSWORD_HASHES_IN_FLIGHT = registry.gauge(
+    'password_hashes_in_flight', 'Password hashes / verifications running or queued')
+CACHE_HIT_RATIO = registry.gauge('cache_hit_ratio', 'Hits / lookups since start', ('cache',))
+CACHE_ENTRIES = registry.gauge('cache_entries', 'Entries currently cached', ('cache',))
+CACHE_LOOKUPS = registry.gauge('cache_lookups', 'Lookups since start', ('cache', 'result'))
+
+
+def observe_caches(caches: Dict[str, Callable[[], Dict[str, Any]]]):
+    """Collector for LRUCache-style stats() providers, keyed by cache name."""
+    def collect():
+        for name, stats in caches.items():
+            values = stats()
+            CACHE_HIT_RATIO.set(values['hit_ratio'], cache=name)
+            CACHE_ENTRIES.set(values['size'], cache=name)
+            CACHE_LOOKUPS.set(values['hits'], cache=name, result='hit')
+            CACHE_LOOKUPS.set(values['misses'], cache=name, result='miss')
+    registry.collector(collect)
+
+
+# SQL statements run by the current request (None outside requests)
+_request_queries: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    'request_queries', default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    DB_QUERIES.inc()
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def _rows(args, kwargs) -> int:
+    """Rows an MLService call works on: its first collection argument (totals count their rows)."""
+    for value in (*args, *kwargs.values()):
+        if isinstance(value, dict):
+            if 'count' in value:
+                return int(value['count'] or 0)
+        elif hasattr(value, '__len__') and not isinstance(value, str):
+            return len(value)
+    return 1
+
+
+def instrument(cls, method_names: Sequence[str]):
+    """Time and count rows for the named methods of `cls` (ML_SECONDS / ML_ROWS)."""
+    for name in method_names:
+        setattr(cls, name, _timed(getattr(cls, name), name))
+
+
+def _timed(method, name: str):
+    @functools.wraps(method)
+    def timed(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            ML_ERRORS.inc(method=name)
+            raise
+        finally:
+            ML_SECONDS.observe(time.perf_counter() - started, method=name)
+            ML_ROWS.inc(_rows(args, kwargs), method=name)
+    return timed
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and SQL statements per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        queries = [0]
+        token = _request_queries.set(queries)
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            _request_queries.reset(token)
+            route = scope.get('route')
+            # Route templates, not raw paths, keep label cardinality bounded
+            route = getattr(route, 'path', None) or 'unmatched'
+            REQUEST_SECONDS.observe(elapsed, route=route, method=scope['method'], status=status[0])
+            REQUEST_DB_QUERIES.observe(queries[0], route=route)
+
+
+def render() -> str:
+    return registry.render()
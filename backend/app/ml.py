@@ -1,50 +1,274 @@
+import asyncio
+import contextvars
+import functools
 import pickle
 import os
-import pandas as pd
-import numpy as np
-from typing import List, Dict, Any
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple
+from . import metrics
+from .cache import LRUCache
+from .lazy import LazyModule
+from .ledger import Ledger
+from .rollups import VALUE_COLUMNS as ROLLUP_COLUMNS
+from .parsers import BankStatementParser
+from ml_service import registry
+
+# Heavy numeric stack, imported on first use or by the warmup task
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+sparse = LazyModule("scipy.sparse")
+
+# Bounded memo of (normalized description, amount bucket) -> category
+CATEGORY_CACHE_SIZE = int(os.getenv("CATEGORY_CACHE_SIZE", "50000"))
+# Amount buckets are quarter-octaves of |amount| (~19% wide), split by sign
+AMOUNT_BUCKETS_PER_OCTAVE = 4
+# Threads running analytics for async endpoints (MLService.offload)
+ML_WORKERS = int(os.getenv("ML_WORKERS", "4"))
+
+# Model attribute -> artifact file in model_dir
+MODEL_ARTIFACTS = {
+    'classifier': 'classifier_model.pkl',
+    'tfidf': 'tfidf.pkl',
+    'label_encoder': 'label_encoder.pkl',
+    'anomaly_detector': 'anomaly_model.pkl',
+    'forecaster': 'prophet_model.pkl',
+}
+# Loaded by warmup / load_models. The Prophet model is only unpickled if something
+# asks for it: forecast_balance doesn't, and unpickling it drags in Prophet/cmdstan.
+WARMUP_MODELS = ('tfidf', 'label_encoder', 'classifier', 'anomaly_detector')
+# Timed with rows processed in /metrics (ml_method_duration_seconds, ml_method_rows_total)
+INSTRUMENTED_METHODS = (
+    'predict_category', 'detect_anomaly', 'predict_category_batch', 'detect_anomaly_batch',
+    'forecast_balance', 'forecast_from_daily', 'calculate_analytics_summary', 'summarize_totals',
+    'detect_subscriptions', 'detect_income_patterns', 'project_savings', 'project_savings_from_totals',
+    'get_investment_suggestions', 'predict_salary', 'generate_smart_budget', 'smart_budget_from_rollups',
+    'simulate_purchase', 'detect_emergencies', 'analyze_spending_personality', 'plan_goal',
+)
+
+_description_normalizer = BankStatementParser()
+
+
+class ModelBundle:
+    """One registry version's artifacts, loaded lazily, with per-model load state.
+
+    Requests grab the active bundle once, so a hot reload never mixes, say, a new
+    TF-IDF vocabulary with an old classifier. Each bundle has its own category
+    cache, so swapping bundles also drops predictions made by the old models.
+    """
+
+    def __init__(self, version: str, artifact_dir: str, manifest: Dict[str, Any] = None):
+        self.version = version
+        self.artifact_dir = artifact_dir
+        self.manifest = manifest or {}
+        self._models: Dict[str, Any] = {}
+        self._locks = {name: threading.Lock() for name in MODEL_ARTIFACTS}
+        self.status = {name: {'state': 'unloaded', 'load_seconds': None, 'error': None}
+                       for name in MODEL_ARTIFACTS}
+        self.category_cache = LRUCache(CATEGORY_CACHE_SIZE)
+
+    def get(self, name: str):
+        if name in self._models:
+            return self._models[name]
+        with self._locks[name]:
+            # A failed artifact isn't retried on every call; load_models() resets it
+            if name not in self._models and self.status[name]['state'] != 'failed':
+                self._load(name)
+        return self._models.get(name)
+
+    def set(self, name: str, model: Any):
+        self._models[name] = model
+        self.status[name] = {'state': 'loaded', 'load_seconds': 0.0, 'error': None}
+
+    def _load(self, name: str):
+        status = {'state': 'loading', 'load_seconds': None, 'error': None}
+        self.status[name] = status
+        start = time.perf_counter()
+        filename = MODEL_ARTIFACTS[name]
+        try:
+            with open(os.path.join(self.artifact_dir, filename), 'rb') as f:
+                data = f.read()
+            expected = self.manifest.get('artifacts', {}).get(filename, {}).get('sha256')
+            if expected and registry.sha256_bytes(data) != expected:
+                raise ValueError(f"checksum mismatch for {filename} in version {self.version}")
+            self._models[name] = pickle.loads(data)
+            status['state'] = 'loaded'
+        except Exception as e:
+            print(f"Error loading model '{name}': {e}")
+            # Non-critical for app startup, but this ML feature won't work
+            status['state'] = 'failed'
+            status['error'] = str(e)
+        status['load_seconds'] = round(time.perf_counter() - start, 4)
+
+    def load_all(self, names=WARMUP_MODELS) -> bool:
+        for name in names:
+            self.get(name)
+        return self.is_ready(names)
+
+    def is_ready(self, names=WARMUP_MODELS) -> bool:
+        return all(self.status[name]['state'] == 'loaded' for name in names)
+
+
+class _LazyModel:
+    """MLService attribute that resolves to a model of the active bundle."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, service, owner=None):
+        if service is None:
+            return self
+        return service._bundle.get(self.name)
+
+    def __set__(self, service, value):
+        service._bundle.set(self.name, value)
+
 
 class MLService:
+    classifier = _LazyModel()
+    tfidf = _LazyModel()
+    label_encoder = _LazyModel()
+    forecaster = _LazyModel()
+    anomaly_detector = _LazyModel()
+
     def __init__(self, model_dir: str = "ml_service/models"):
         self.model_dir = model_dir
-        self.classifier = None
-        self.tfidf = None
-        self.label_encoder = None
-        self.forecaster = None
-        self.anomaly_detector = None
-        
+        self._bundle = self._open_bundle()
+        self._reload_lock = threading.Lock()
+        self._rejected_version = None
+        self.warmup_seconds = None
+        self._executor = ThreadPoolExecutor(max_workers=ML_WORKERS, thread_name_prefix="ml")
+
+    async def offload(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) on the ML worker threads instead of the event loop.
+
+        Async endpoints must route pandas / scikit-learn work through here: a
+        few hundred milliseconds of it on the loop stalls every other request.
+        """
+        loop = asyncio.get_running_loop()
+        # In the caller's context, so per-request state (metrics' query count) follows the work
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, context.run, functools.partial(fn, *args, **kwargs))
+
+    @property
+    def model_status(self) -> Dict[str, Dict[str, Any]]:
+        return self._bundle.status
+
+    @property
+    def model_version(self) -> str:
+        return self._bundle.version
+
+    @property
+    def category_cache(self) -> LRUCache:
+        return self._bundle.category_cache
+
+    def _open_bundle(self, version: str = None) -> ModelBundle:
+        """Bundle for `version` (default: the registry's CURRENT, else the flat legacy files)."""
+        version = version or registry.current_version(self.model_dir) or registry.LEGACY_VERSION
+        return ModelBundle(
+            version,
+            registry.version_dir(self.model_dir, version),
+            registry.load_manifest(self.model_dir, version)
+        )
+
     def load_models(self):
+        """(Re)load the serving models of the current version now and make them active."""
         print("Loading ML models...")
-        try:
-            with open(os.path.join(self.model_dir, 'classifier_model.pkl'), 'rb') as f:
-                self.classifier = pickle.load(f)
-            with open(os.path.join(self.model_dir, 'tfidf.pkl'), 'rb') as f:
-                self.tfidf = pickle.load(f)
-            with open(os.path.join(self.model_dir, 'label_encoder.pkl'), 'rb') as f:
-                self.label_encoder = pickle.load(f)
-            # Prophet model loading
-            with open(os.path.join(self.model_dir, 'prophet_model.pkl'), 'rb') as f:
-                self.forecaster = pickle.load(f)
-            # Anomaly detector loading
-            with open(os.path.join(self.model_dir, 'anomaly_model.pkl'), 'rb') as f:
-                self.anomaly_detector = pickle.load(f)
+        with self._reload_lock:
+            bundle = self._open_bundle()
+            bundle.load_all()
+            self._bundle = bundle
+        if bundle.is_ready():
             print("ML models loaded successfully.")
-        except Exception as e:
-            print(f"Error loading models: {e}")
-            # Non-critical for app startup, but ML features won't work
-            
+
+    def reload_if_changed(self) -> bool:
+        """Hot-swap to the registry's CURRENT version if it differs from the active one.
+
+        The new bundle is fully loaded and checksum-verified before a single reference
+        assignment makes it active; in-flight requests finish on the bundle they
+        started with. A version that fails to load is not activated.
+        """
+        version = registry.current_version(self.model_dir)
+        if not version or version in (self._bundle.version, self._rejected_version):
+            return False
+        with self._reload_lock:
+            if version == self._bundle.version:
+                return False
+            bundle = self._open_bundle(version)
+            if not bundle.load_all():
+                print(f"Model version {version} failed to load; keeping {self._bundle.version}")
+                self._rejected_version = version
+                return False
+            self._bundle = bundle
+        print(f"Switched to model version {version}")
+        return True
+
+    def start_reload_watcher(self, interval: float) -> threading.Thread:
+        """Poll the registry every `interval` seconds and hot-swap new versions."""
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    print(f"Model reload error: {e}")
+
+        thread = threading.Thread(target=watch, name="ml-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def warmup(self):
+        """Import the numeric stack and load every serving model that isn't loaded yet."""
+        start = time.perf_counter()
+        for module in (pd, np, sparse):
+            module.load()
+        self._bundle.load_all()
+        self.warmup_seconds = round(time.perf_counter() - start, 4)
+
+    def start_warmup(self) -> threading.Thread:
+        """Run warmup() on a background thread so startup doesn't wait for it."""
+        thread = threading.Thread(target=self.warmup, name="ml-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def readiness(self) -> Dict[str, Any]:
+        bundle = self._bundle
+        return {
+            'ready': bundle.is_ready(),
+            'model_version': bundle.version,
+            'warmup_seconds': self.warmup_seconds,
+            'models': {name: dict(status) for name, status in bundle.status.items()}
+        }
+
+    def _category_key(self, description: str, amount: float) -> Tuple[str, int]:
+        """Cache key: normalized merchant text plus a signed log-scale amount bucket."""
+        bucket = round(math.log2(1 + abs(amount)) * AMOUNT_BUCKETS_PER_OCTAVE)
+        return _description_normalizer.clean_description(description), int(math.copysign(bucket, amount))
+
+    def _classify(self, bundle: ModelBundle, descriptions: List[str], amounts: List[float]) -> List[str]:
+        # Raw text and exact amounts, as the models were trained on; callers cache the
+        # result under the (normalized text, amount bucket) key of the first input seen.
+        # Keep features sparse: TF-IDF rows plus the amount as one extra sparse column
+        text_vec = bundle.get('tfidf').transform(descriptions)
+        amounts = np.asarray(amounts, dtype=float).reshape(-1, 1)
+        features = sparse.hstack((text_vec, sparse.csr_matrix(amounts)), format='csr')
+
+        cat_idx = bundle.get('classifier').predict(features)
+        return bundle.get('label_encoder').inverse_transform(cat_idx).tolist()
+
     def predict_category(self, description: str, amount: float) -> str:
-        if not self.classifier or not self.tfidf:
+        bundle = self._bundle
+        if not bundle.get('classifier') or not bundle.get('tfidf'):
             return "Uncategorized"
             
         try:
-            # Preprocess
-            text_vec = self.tfidf.transform([description]).toarray()
-            features = np.hstack((text_vec, [[amount]]))
-            
-            # Predict
-            cat_idx = self.classifier.predict(features)[0]
-            category = self.label_encoder.inverse_transform([cat_idx])[0]
+            key = self._category_key(description, amount)
+            category = bundle.category_cache.get(key)
+            if category is None:
+                category = self._classify(bundle, [description], [amount])[0]
+                bundle.category_cache.put(key, category)
             return category
         except Exception as e:
             print(f"Prediction error: {e}")
@@ -62,6 +286,60 @@ class MLService:
             print(f"Anomaly detection error: {e}")
             return False
 
+    def predict_category_batch(self, descriptions: List[str], amounts: List[float]) -> List[str]:
+        """
+        Vectorized predict_category: cache misses are scored in one classifier call.
+        """
+        if not descriptions:
+            return []
+        bundle = self._bundle
+        if not bundle.get('classifier') or not bundle.get('tfidf'):
+            return ["Uncategorized"] * len(descriptions)
+
+        try:
+            keys = [self._category_key(d, a) for d, a in zip(descriptions, amounts)]
+            resolved = {}
+            misses = {}  # key -> index of its first row, whose raw input gets classified
+            for i, key in enumerate(keys):
+                if key not in resolved:
+                    resolved[key] = bundle.category_cache.get(key)
+                    if resolved[key] is None:
+                        misses[key] = i
+            if misses:
+                rows = list(misses.values())
+                categories = self._classify(bundle, [descriptions[i] for i in rows], [amounts[i] for i in rows])
+                for key, category in zip(misses, categories):
+                    resolved[key] = category
+                    bundle.category_cache.put(key, category)
+            return [resolved[key] for key in keys]
+        except Exception as e:
+            print(f"Batch prediction error: {e}")
+            return ["Uncategorized"] * len(descriptions)
+
+    def detect_anomaly_batch(self, amounts: List[float]) -> List[bool]:
+        """
+        Vectorized detect_anomaly: one IsolationForest call for all amounts.
+        """
+        if len(amounts) == 0:
+            return []
+        if not self.anomaly_detector:
+            return [False] * len(amounts)
+
+        try:
+            predictions = self.anomaly_detector.predict(np.asarray(amounts, dtype=float).reshape(-1, 1))
+            return (predictions == -1).tolist()
+        except Exception as e:
+            print(f"Batch anomaly detection error: {e}")
+            return [False] * len(amounts)
+
+    def _frame(self, transactions, *columns: str, category_default: str = None):
+        """
+        DataFrame of the requested columns, from a cached Ledger or a list of transactions.
+        """
+        if not isinstance(transactions, Ledger):
+            transactions = Ledger.from_transactions(transactions)
+        return transactions.frame(*columns, category_default=category_default)
+
     def forecast_balance(self, transactions: List[Any], days: int = 30) -> List[Dict[str, Any]]:
         """
         Generates a simple linear forecast based on transaction history.
@@ -70,13 +348,19 @@ class MLService:
             return []
             
         try:
-            # Convert to DataFrame
-            data = [{'date': t.date, 'amount': t.amount} for t in transactions]
-            df = pd.DataFrame(data)
-            df['date'] = pd.to_datetime(df['date'])
-            
-            # Group by date and sum amounts
-            daily_net = df.groupby('date')['amount'].sum().sort_index()
+            return self.forecast_from_daily(self._rollup_frames(transactions)[0], days)
+        except Exception as e:
+            print(f"Forecasting error: {e}")
+            return []
+
+    def forecast_from_daily(self, daily, days: int = 30) -> List[Dict[str, Any]]:
+        """
+        forecast_balance from daily totals (rollups.daily_frame or _rollup_frames).
+        """
+        try:
+            # Net amount per day
+            daily_net = pd.Series((daily['income'] - daily['expense']).to_numpy(),
+                                  index=daily['date']).sort_index()
             
             # Calculate cumulative balance
             # Assuming starting balance is 0 or implicit in transactions (opening balance)
@@ -118,11 +402,55 @@ class MLService:
             print(f"Forecasting error: {e}")
             return []
 
+    def _rollup_frames(self, transactions):
+        """
+        (daily, monthly) frames shaped like rollups.daily_frame / rollups.monthly_frame.
+        """
+        df = self._frame(transactions, 'date', 'category', 'amount').dropna(subset=['date', 'amount'])
+        buckets = pd.DataFrame({
+            'date': df['date'],
+            'month': df['date'].dt.strftime('%Y-%m'),
+            'category': df['category'].fillna(''),
+            'income': df['amount'].clip(lower=0),
+            'expense': (-df['amount']).clip(lower=0),
+            'count': 1,
+            'income_count': (df['amount'] > 0).astype(int)
+        })
+        daily = buckets.groupby('date', as_index=False)[list(ROLLUP_COLUMNS)].sum()
+        monthly = buckets.groupby(['month', 'category'], as_index=False)[list(ROLLUP_COLUMNS)].sum()
+        return daily, monthly
+
+    def _totals(self, transactions) -> Dict[str, Any]:
+        """
+        Income / expense split, net balance and date range; same shape as aggregates.totals.
+        """
+        df = self._frame(transactions, 'date', 'amount')
+        return {
+            'count': len(df),
+            'total_income': df[df['amount'] > 0]['amount'].sum(),
+            'total_expenses': abs(df[df['amount'] < 0]['amount'].sum()),
+            'net': df['amount'].sum(),
+            'first_date': df['date'].min(),
+            'last_date': df['date'].max()
+        }
+
     def calculate_analytics_summary(self, transactions: List[Any], current_balance: float = None) -> Dict[str, Any]:
         """
         Calculate comprehensive analytics: burn rate, days until broke, health score, etc.
         """
         if not transactions:
+            return self.summarize_totals({'count': 0}, current_balance)
+        try:
+            return self.summarize_totals(self._totals(transactions), current_balance)
+        except Exception as e:
+            print(f"Analytics calculation error: {e}")
+            return {'error': str(e)}
+
+    def summarize_totals(self, totals: Dict[str, Any], current_balance: float = None) -> Dict[str, Any]:
+        """
+        calculate_analytics_summary from precomputed totals (e.g. aggregated in SQL).
+        """
+        if not totals['count']:
             return {
                 'burn_rate_daily': 0,
                 'burn_rate_monthly': 0,
@@ -134,16 +462,12 @@ class MLService:
             }
         
         try:
-            data = [{'date': t.date, 'amount': t.amount} for t in transactions]
-            df = pd.DataFrame(data)
-            df['date'] = pd.to_datetime(df['date'])
-            
             # Calculate income and expenses
-            total_income = df[df['amount'] > 0]['amount'].sum()
-            total_expenses = abs(df[df['amount'] < 0]['amount'].sum())
+            total_income = totals['total_income']
+            total_expenses = totals['total_expenses']
             
             # Date range
-            date_range = (df['date'].max() - df['date'].min()).days or 1
+            date_range = (pd.Timestamp(totals['last_date']) - pd.Timestamp(totals['first_date'])).days or 1
             
             # Burn rate (daily average spending)
             burn_rate_daily = total_expenses / date_range if date_range > 0 else 0
@@ -151,7 +475,7 @@ class MLService:
             
             # Current balance (estimate from transactions if not provided)
             if current_balance is None:
-                current_balance = df['amount'].sum()
+                current_balance = totals['net']
             
             # Days until broke
             days_until_broke = None
@@ -225,9 +549,8 @@ class MLService:
             return []
         
         try:
-            data = [{'date': t.date, 'description': t.description, 'amount': t.amount} 
-                    for t in transactions if t.amount < 0]  # Only expenses
-            df = pd.DataFrame(data)
+            df = self._frame(transactions, 'date', 'description', 'amount')
+            df = df[df['amount'] < 0]  # Only expenses
             
             if df.empty:
                 return []
@@ -263,9 +586,8 @@ class MLService:
             return []
         
         try:
-            data = [{'date': t.date, 'description': t.description, 'amount': t.amount} 
-                    for t in transactions if t.amount > 0]  # Only income
-            df = pd.DataFrame(data)
+            df = self._frame(transactions, 'date', 'description', 'amount')
+            df = df[df['amount'] > 0]  # Only income
             
             if df.empty:
                 return []
@@ -303,27 +625,36 @@ class MLService:
         """
         if not transactions:
             return []
+        try:
+            return self.project_savings_from_totals(self._totals(transactions), months)
+        except Exception as e:
+            print(f"Savings projection error: {e}")
+            return []
+
+    def project_savings_from_totals(self, totals: Dict[str, Any], months: int = 12) -> List[Dict[str, Any]]:
+        """
+        project_savings from precomputed totals (e.g. aggregated in SQL).
+        """
+        if not totals['count']:
+            return []
         
         try:
-            data = [{'date': t.date, 'amount': t.amount} for t in transactions]
-            df = pd.DataFrame(data)
-            df['date'] = pd.to_datetime(df['date'])
+            total_income = totals['total_income']
+            total_expenses = totals['total_expenses']
+            last_date = pd.Timestamp(totals['last_date'])
             
-            total_income = df[df['amount'] > 0]['amount'].sum()
-            total_expenses = abs(df[df['amount'] < 0]['amount'].sum())
-            
-            date_range = (df['date'].max() - df['date'].min()).days or 30
+            date_range = (last_date - pd.Timestamp(totals['first_date'])).days or 30
             months_of_data = date_range / 30
             
             monthly_income = total_income / months_of_data if months_of_data > 0 else 0
             monthly_expenses = total_expenses / months_of_data if months_of_data > 0 else 0
             monthly_savings = monthly_income - monthly_expenses
             
-            current_balance = df['amount'].sum()
+            current_balance = totals['net']
             
             projections = []
             for i in range(months + 1):
-                projected_date = df['date'].max() + pd.DateOffset(months=i)
+                projected_date = last_date + pd.DateOffset(months=i)
                 projected_balance = current_balance + (monthly_savings * i)
                 
                 projections.append({
@@ -399,14 +730,12 @@ class MLService:
         
         try:
             # Filter income transactions
-            data = [{'date': t.date, 'description': t.description, 'amount': t.amount} 
-                    for t in transactions if t.amount > 0]
-            df = pd.DataFrame(data)
+            df = self._frame(transactions, 'date', 'description', 'amount')
+            df = df[df['amount'] > 0]
             
             if df.empty:
                 return {'error': 'No income transactions found'}
             
-            df['date'] = pd.to_datetime(df['date'])
             df = df.sort_values('date')
             
             # Find the largest recurring income (likely salary)
@@ -461,19 +790,28 @@ class MLService:
             return {'category_budgets': {}, 'savings_target': 0, 'total_budget': 0}
         
         try:
-            data = [{'date': t.date, 'category': t.category or 'Other', 'amount': t.amount} 
-                    for t in transactions]
-            df = pd.DataFrame(data)
-            df['date'] = pd.to_datetime(df['date'])
-            
+            monthly = self._rollup_frames(transactions)[1]
+            return self.smart_budget_from_rollups(monthly, self._totals(transactions), goals)
+        except Exception as e:
+            print(f"Smart budget error: {e}")
+            return {'error': str(e)}
+
+    def smart_budget_from_rollups(self, monthly, totals: Dict[str, Any],
+                                  goals: List[Any] = None) -> Dict[str, Any]:
+        """
+        generate_smart_budget from month x category rollups and totals.
+        """
+        if not totals['count']:
+            return {'category_budgets': {}, 'savings_target': 0, 'total_budget': 0}
+        
+        try:
             # Calculate monthly averages per category
-            expenses = df[df['amount'] < 0].copy()
-            expenses['amount'] = expenses['amount'].abs()
+            expenses = monthly[monthly['expense'] > 0]
             
-            date_range = (df['date'].max() - df['date'].min()).days or 30
+            date_range = (pd.Timestamp(totals['last_date']) - pd.Timestamp(totals['first_date'])).days or 30
             months = max(1, date_range / 30)
             
-            category_totals = expenses.groupby('category')['amount'].sum()
+            category_totals = expenses.groupby(expenses['category'].replace('', 'Other'))['expense'].sum()
             category_monthly = (category_totals / months).to_dict()
             
             # Apply budget optimization (slightly reduce discretionary spending)
@@ -490,7 +828,7 @@ class MLService:
             total_budget = sum(category_budgets.values())
             
             # Calculate income and savings target
-            income = df[df['amount'] > 0]['amount'].sum()
+            income = totals['total_income']
             monthly_income = income / months
             savings_target = max(0, round(monthly_income * 0.2, 2))  # Target 20% savings
             
@@ -524,9 +862,7 @@ class MLService:
             return {'error': 'No transaction data'}
         
         try:
-            data = [{'date': t.date, 'amount': t.amount} for t in transactions]
-            df = pd.DataFrame(data)
-            df['date'] = pd.to_datetime(df['date'])
+            df = self._frame(transactions, 'date', 'amount')
             
             current_balance = df['amount'].sum()
             
@@ -590,19 +926,19 @@ class MLService:
             print(f"Purchase simulation error: {e}")
             return {'error': str(e)}
 
-    def detect_emergencies(self, transactions: List[Any]) -> Dict[str, Any]:
+    def detect_emergencies(self, transactions: List[Any], monthly=None,
+                           totals: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Detect financial emergencies: unusual large spends, income drops, sudden bills.
+        Income drops, cutbacks and recovery time use the month x category rollups and
+        totals when given; only the large-expense check needs individual rows.
         """
         if not transactions:
             return {'alerts': [], 'suggested_cutbacks': [], 'recovery_days': 0}
         
         try:
-            data = [{'date': t.date, 'description': t.description, 
-                     'amount': t.amount, 'category': t.category or 'Other'} 
-                    for t in transactions]
-            df = pd.DataFrame(data)
-            df['date'] = pd.to_datetime(df['date'])
+            df = self._frame(transactions, 'date', 'description', 'amount', 'category',
+                             category_default='Other')
             df = df.sort_values('date')
             
             alerts = []
@@ -636,11 +972,15 @@ class MLService:
                             'amount': abs(row['amount'])
                         })
             
+            if monthly is None:
+                monthly = self._rollup_frames(transactions)[1]
+            if totals is None:
+                totals = self._totals(transactions)
+            
             # 2. Detect income drops (compare last month to previous average)
-            income = df[df['amount'] > 0].copy()
-            if len(income) > 3:
-                income['month'] = income['date'].dt.to_period('M')
-                monthly_income = income.groupby('month')['amount'].sum()
+            if monthly['income_count'].sum() > 3:
+                income = monthly[monthly['income_count'] > 0]
+                monthly_income = income.groupby('month')['income'].sum()
                 
                 if len(monthly_income) >= 2:
                     avg_income = monthly_income[:-1].mean()
@@ -657,11 +997,11 @@ class MLService:
             
             # 3. Suggest cutbacks based on discretionary spending
             suggested_cutbacks = []
-            discretionary = df[(df['amount'] < 0) & 
-                              (df['category'].isin(['Entertainment', 'Shopping', 'Food', 'Travel']))]
+            discretionary = monthly[(monthly['expense'] > 0) & 
+                                   (monthly['category'].isin(['Entertainment', 'Shopping', 'Food', 'Travel']))]
             
             if not discretionary.empty:
-                category_spending = discretionary.groupby('category')['amount'].sum().abs()
+                category_spending = discretionary.groupby('category')['expense'].sum()
                 for cat, spending in category_spending.items():
                     suggested_cutbacks.append({
                         'category': cat,
@@ -671,8 +1011,9 @@ class MLService:
                     })
             
             # 4. Calculate recovery days
-            current_balance = df['amount'].sum()
-            daily_savings = (df[df['amount'] > 0]['amount'].sum() - abs(df[df['amount'] < 0]['amount'].sum())) / max(1, (df['date'].max() - df['date'].min()).days)
+            current_balance = totals['net']
+            days_of_data = (pd.Timestamp(totals['last_date']) - pd.Timestamp(totals['first_date'])).days
+            daily_savings = (totals['total_income'] - totals['total_expenses']) / max(1, days_of_data)
             
             total_emergency_cost = sum(a.get('amount', 0) for a in alerts if a.get('type') in ['medical_emergency', 'unusual_expense'])
             recovery_days = int(total_emergency_cost / daily_savings) if daily_savings > 0 and total_emergency_cost > 0 else 0
@@ -697,10 +1038,9 @@ class MLService:
             return {'personality_type': 'Unknown', 'traits': [], 'confidence': 0}
         
         try:
-            data = [{'date': t.date, 'amount': t.amount, 'category': t.category or 'Other'} 
-                    for t in transactions]
-            df = pd.DataFrame(data)
-            df['date'] = pd.to_datetime(df['date'])
+            if not isinstance(transactions, Ledger):
+                transactions = Ledger.from_transactions(transactions)
+            df = self._frame(transactions, 'date', 'amount', 'category', category_default='Other')
             
             # Calculate key metrics
             total_income = df[df['amount'] > 0]['amount'].sum()
@@ -718,10 +1058,10 @@ class MLService:
             
             # Investment-like transactions (placeholder - recurring positive unusual patterns)
             has_investments = any(
-                'invest' in str(t.description).lower() or 
-                'dividend' in str(t.description).lower() or
-                'stock' in str(t.description).lower()
-                for t in transactions
+                'invest' in str(description).lower() or 
+                'dividend' in str(description).lower() or
+                'stock' in str(description).lower()
+                for description in transactions.descriptions  # distinct values only
             )
             
             # Classify personality
@@ -806,9 +1146,7 @@ class MLService:
             
             # Get current savings capacity
             if transactions:
-                data = [{'date': t.date, 'amount': t.amount} for t in transactions]
-                df = pd.DataFrame(data)
-                df['date'] = pd.to_datetime(df['date'])
+                df = self._frame(transactions, 'date', 'amount')
                 
                 date_range = (df['date'].max() - df['date'].min()).days or 30
                 months_of_data = max(1, date_range / 30)
@@ -877,5 +1215,7 @@ class MLService:
             print(f"Goal planning error: {e}")
             return {'error': str(e)}
 
+metrics.instrument(MLService, INSTRUMENTED_METHODS)
+
 # Singleton instance
 ml_service = MLService()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, Boolean, Index
 from .database import Base
 
 class TransactionDB(Base):
@@ -15,6 +15,13 @@ class TransactionDB(Base):
     is_anomaly = Column(Boolean, default=False)
     statement_id = Column(Integer, nullable=True, index=True)  # Links to UploadedStatementDB
 
+    __table_args__ = (
+        # Keyset pagination (GET /transactions) and per-user date scans
+        Index("ix_transactions_user_date_id", "user_id", "date", "id"),
+        # Per-user category filters and GROUP BYs
+        Index("ix_transactions_user_category", "user_id", "category"),
+    )
+
 class BudgetDB(Base):
     __tablename__ = "budgets"
 
@@ -63,3 +70,54 @@ class UserDB(Base):
     hashed_password = Column(String)
     full_name = Column(String, nullable=True)
     created_at = Column(String)
+    shard = Column(Integer, nullable=True)  # Database holding the user's data; None = this (directory) one
+
+class AnomalyStatsDB(Base):
+    """Running amount statistics per user and category (category '*' = all of them).
+
+    Kept as power sums so inserts and deletes are O(1) updates; mean and variance
+    are derived on read.
+    """
+    __tablename__ = "anomaly_stats"
+
+    user_id = Column(Integer, primary_key=True)
+    category = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+    total = Column(Float, default=0.0)
+    total_sq = Column(Float, default=0.0)
+
+class UserVersionDB(Base):
+    """Per-user change counters, compared by caches instead of re-reading the data.
+
+    ledger_version moves with every write to the user's transactions (the
+    analytics ledger); data_version with every write to anything the user owns
+    (transactions, statements, budgets, bills, goals) and drives HTTP ETags.
+    """
+    __tablename__ = "user_versions"
+
+    user_id = Column(Integer, primary_key=True)
+    ledger_version = Column(Integer, nullable=False, default=0)
+    data_version = Column(Integer, nullable=False, default=0)
+
+class DailyRollupDB(Base):
+    """Per-user daily income / expense totals, maintained on every transaction write."""
+    __tablename__ = "daily_rollups"
+
+    user_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    income = Column(Float, default=0.0)
+    expense = Column(Float, default=0.0)  # positive
+    count = Column(Integer, default=0)
+    income_count = Column(Integer, default=0)
+
+class MonthlyCategoryRollupDB(Base):
+    """Per-user income / expense totals by month ('YYYY-MM') and category ('' = none)."""
+    __tablename__ = "monthly_category_rollups"
+
+    user_id = Column(Integer, primary_key=True)
+    month = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    income = Column(Float, default=0.0)
+    expense = Column(Float, default=0.0)  # positive
+    count = Column(Integer, default=0)
+    income_count = Column(Integer, default=0)
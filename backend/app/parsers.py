@@ -1,10 +1,16 @@
-import pandas as pd
-from typing import List
+from __future__ import annotations
+
+from typing import Iterator, List
 from datetime import datetime
+from .lazy import LazyModule
 from .schemas import Transaction
 
+# Imported on first parse so API startup doesn't pay for pandas
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+
 class BankStatementParser:
-    def parse_csv(self, file_path: str) -> List[Transaction]:
+    def parse_csv(self, file_path: str, vectorized: bool = True) -> List[Transaction]:
         df = pd.read_csv(file_path)
         
         # Normalize columns headers: strip whitespace and convert to lower case
@@ -12,9 +18,36 @@ class BankStatementParser:
         
         # Identify columns using regex patterns
         # Note: We keep original column names for data extraction
-        # Identify columns using regex patterns
-        # Note: We keep original column names for data extraction
-        col_map = {
+        col_map = self._map_columns(df)
+
+        if vectorized:
+            return self._parse_columns(df, col_map)
+        return self._parse_rows(df, col_map)
+
+    def iter_csv(self, file_path: str, chunksize: int = 50_000) -> Iterator[Transaction]:
+        """Stream transactions from a statement without loading the whole file."""
+        for chunk in self.iter_csv_chunks(file_path, chunksize):
+            yield from chunk
+
+    def iter_csv_chunks(self, file_path: str, chunksize: int = 50_000) -> Iterator[List[Transaction]]:
+        """Read the statement `chunksize` rows at a time and yield each chunk's transactions.
+
+        Only one chunk is held in memory at once, so multi-GB exports can be ingested
+        with flat memory use. Column mapping is resolved once from the header.
+        """
+        col_map = None
+        with pd.read_csv(file_path, chunksize=chunksize) as reader:
+            for df in reader:
+                df.columns = [str(c).strip() for c in df.columns]
+                if col_map is None:
+                    col_map = self._map_columns(df)
+                transactions = self._parse_columns(df, col_map)
+                if transactions:
+                    yield transactions
+
+    def _map_columns(self, df: pd.DataFrame) -> dict:
+        """Resolve which statement column holds each transaction field."""
+        return {
             'date': self._find_col(df, [r'date', r'posted', r'time', r'day']),
             'desc': self._find_col(df, [r'desc', r'narration', r'details', r'merchant', r'memo', r'transaction', r'payee']),
             'amount': self._find_col(df, [r'amount', r'value', r'\bmnt\b', r'in.*out']),
@@ -23,6 +56,8 @@ class BankStatementParser:
             'category': self._find_col(df, [r'category', r'type', r'class'])
         }
 
+    def _parse_rows(self, df: pd.DataFrame, col_map: dict) -> List[Transaction]:
+        """Reference engine: walks the frame row by row."""
         transactions = []
         for _, row in df.iterrows():
             # Date Parsing
@@ -81,6 +116,102 @@ class BankStatementParser:
             
         return transactions
 
+    def _parse_columns(self, df: pd.DataFrame, col_map: dict) -> List[Transaction]:
+        """Column-wise engine: resolves every field with whole-column operations.
+
+        Produces the same transactions as _parse_rows. Dates, descriptions and
+        categories are low-cardinality, so they are factorized and the scalar
+        rules are applied once per distinct value; amounts are parsed as arrays.
+        """
+        n = len(df)
+        if n == 0 or not col_map['date']:
+            return []
+
+        # Date Parsing
+        dates = self._map_unique(df[col_map['date']], self._to_date)
+        keep = pd.notna(dates)
+
+        # Amount Parsing (same precedence as the per-row engine)
+        if col_map['debit'] and col_map['credit']:
+            debit_vals = self._parse_amount_column(df[col_map['debit']])
+            credit_vals = self._parse_amount_column(df[col_map['credit']])
+            amounts = credit_vals - np.abs(debit_vals)
+        elif col_map['amount']:
+            amounts = self._parse_amount_column(df[col_map['amount']], allow_negative=True)
+        elif col_map['debit']:
+            amounts = -np.abs(self._parse_amount_column(df[col_map['debit']]))
+        elif col_map['credit']:
+            amounts = np.abs(self._parse_amount_column(df[col_map['credit']]))
+        else:
+            amounts = np.zeros(n)
+
+        # Skip if amount is effectively zero
+        keep &= ~(np.abs(amounts) < 0.01)
+        if not keep.any():
+            return []
+
+        # Description Parsing
+        if col_map['desc']:
+            descriptions = self._map_unique(
+                df[col_map['desc']],
+                lambda v: self.clean_description(str(v).strip() or "Unknown Transaction"),
+                missing=self.clean_description("Unknown Transaction"),
+            )
+        else:
+            descriptions = np.full(n, self.clean_description("Unknown Transaction"), dtype=object)
+
+        # Category Parsing
+        if col_map['category']:
+            categories = self._map_unique(df[col_map['category']], lambda v: str(v).strip())
+        else:
+            categories = np.full(n, None, dtype=object)
+
+        return [
+            Transaction(date=d, description=desc, amount=amt, category=cat, source="csv_upload")
+            for d, desc, amt, cat in zip(
+                dates[keep].tolist(),
+                descriptions[keep].tolist(),
+                amounts[keep].tolist(),
+                categories[keep].tolist(),
+            )
+        ]
+
+    def _map_unique(self, col: pd.Series, func, missing=None) -> np.ndarray:
+        """Apply func once per distinct non-null value and broadcast the results back."""
+        codes, uniques = pd.factorize(col)
+        mapped = np.empty(len(uniques) + 1, dtype=object)
+        mapped[:-1] = [func(v) for v in uniques]
+        mapped[-1] = missing  # code -1 marks a null cell
+        return mapped[codes]
+
+    def _parse_amount_column(self, col: pd.Series, allow_negative=False) -> np.ndarray:
+        """Array version of _parse_amount."""
+        if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+            values = col.to_numpy(dtype='float64', na_value=np.nan)
+            # _parse_amount goes through str(), which turns inf/nan into 0 and mangles
+            # exponent notation; route those (rare) values through the scalar path.
+            magnitude = np.abs(values)
+            odd = ~np.isfinite(values) | (magnitude >= 1e16) | ((magnitude < 1e-4) & (magnitude > 0))
+            odd &= col.notna().to_numpy()
+            result = np.where(np.isnan(values), 0.0, values)
+            if odd.any():
+                result[odd] = [self._parse_amount(v, allow_negative=True) for v in col[odd]]
+        else:
+            result = np.zeros(len(col))
+            present = col.notna().to_numpy()
+            cleaned = col[present].astype(str).str.strip().str.replace(r'[^\d\.\-]', '', regex=True)
+            ascii_number = cleaned.str.fullmatch(r'-?(?:[0-9]+\.?[0-9]*|\.[0-9]+)').to_numpy(dtype=bool)
+            parsed = np.zeros(len(cleaned))
+            parsed[ascii_number] = cleaned[ascii_number].astype('float64').to_numpy()
+            # Anything else (unicode digits, stray dots/dashes) takes the scalar path
+            leftover = ~ascii_number & (cleaned != '').to_numpy(dtype=bool)
+            if leftover.any():
+                parsed[leftover] = [self._parse_amount(v, allow_negative=True) for v in cleaned[leftover]]
+            result[present] = parsed
+        if not allow_negative:
+            return np.abs(result)
+        return result
+
     def _find_col(self, df: pd.DataFrame, patterns: List[str]) -> str:
         """Find matches for a column type based on regex regex_patterns."""
         import re
@@ -93,26 +224,32 @@ class BankStatementParser:
     def _parse_date(self, row: pd.Series, col_name: str):
         if not col_name:
             return None
-        val = row[col_name]
+        return self._to_date(row[col_name])
+
+    def _to_date(self, val):
         try:
-            return pd.to_datetime(val, dayfirst=True).date()
+            parsed = pd.to_datetime(val, dayfirst=True)
         except:
             return None
+        # Empty cells parse to NaT, which is not a usable date
+        if pd.isna(parsed):
+            return None
+        return parsed.date()
 
     def _parse_amount(self, val, allow_negative=False) -> float:
         """Clean and parse amount values, handling currency symbols and formatting."""
         if pd.isna(val) or val is None:
             return 0.0
-            
+
         # Convert to string
         s = str(val).strip()
-        
+
         # Remove currency symbols and common separators
         # Keep dots, digits, and negative sign
         import re
         # Remove currency symbols (except dot and minus)
         cleaned = re.sub(r'[^\d\.\-]', '', s)
-        
+
         try:
             amount = float(cleaned)
             if not allow_negative:
@@ -125,16 +262,16 @@ class BankStatementParser:
         """Normalize transaction description by removing common prefixes/suffixes and extra whitespace."""
         if not description:
             return "Unknown"
-        
+
         description = str(description).strip().upper()
-        
+
         # Remove common prefixes
         prefixes = ["POS PURCHASE ", "DEBIT CARD PURCHASE ", "Ref: ", "ACH ", "TXN "]
         for prefix in prefixes:
             if description.startswith(prefix):
                 description = description[len(prefix):].strip()
-                
+
         # Remove extra whitespace
         description = " ".join(description.split())
-        
+
         return description
@@ -0,0 +1,180 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from passlib.context import CryptContext
+
+from .cache import LRUCache
+
+# Password hashing runs in its own small process pool: pbkdf2 is deliberately
+# slow CPU work, and on the request threadpool (or event loop) a login storm
+# would starve every other endpoint. Only auth degrades under load: once
+# HASH_QUEUE_LIMIT hashes are pending, further ones are refused (503).
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "64"))
+# Scheduling niceness of the hashing processes: on a busy CPU the API process wins
+HASH_WORKER_NICE = int(os.getenv("HASH_WORKER_NICE", "10"))
+
+# Per-username login throttling: LOGIN_MAX_FAILURES failed attempts within
+# LOGIN_FAILURE_WINDOW_SECONDS lock the username until the oldest one ages out.
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_FAILURE_WINDOW_SECONDS = float(os.getenv("LOGIN_FAILURE_WINDOW_SECONDS", "300"))
+LOGIN_THROTTLE_USERS = int(os.getenv("LOGIN_THROTTLE_USERS", "100000"))
+
+# Using pbkdf2_sha256 - avoids bcrypt 4.x compatibility issues
+pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+
+
+class HashingBusy(Exception):
+    """More password hashes are pending than HASH_QUEUE_LIMIT allows."""
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Too many failed logins, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _init_worker():
+    if HASH_WORKER_NICE and hasattr(os, "nice"):
+        os.nice(HASH_WORKER_NICE)
+
+
+def _ready() -> bool:
+    return True
+
+
+class HashPool:
+    """Bounded process pool for hash / verify calls awaited from async endpoints."""
+
+    def __init__(self, workers: int = HASH_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that already runs threads can deadlock the child
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return self._executor
+
+    async def run(self, fn, *args) -> Any:
+        # Runs on the event loop thread, so the counters need no lock
+        if self.in_flight >= self.queue_limit:
+            self.rejected += 1
+            raise HashingBusy("Too many sign-ins in progress, please retry shortly")
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.total_seconds += time.perf_counter() - started
+
+    async def start(self):
+        """Start every worker now rather than on the first sign-ins (spawning blocks the caller)."""
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        await asyncio.gather(*(loop.run_in_executor(pool, _ready) for _ in range(self.workers)))
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(verify_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'queue_limit': self.queue_limit,
+            'in_flight': self.in_flight,
+            'queued': max(0, self.in_flight - self.workers),
+            'peak_in_flight': self.peak_in_flight,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'avg_seconds': round(self.total_seconds / self.completed, 4) if self.completed else 0.0,
+        }
+
+
+class LoginThrottle:
+    """Sliding window of recent failed logins per username.
+
+    An attempt is reserved (counted as a failure) before its password is
+    verified, so concurrent attempts can't all get past the limit while the
+    slow hashes run; success clears the username's failures, and an attempt
+    that couldn't be verified at all is released.
+    """
+
+    def __init__(self, max_failures: int = LOGIN_MAX_FAILURES, window: float = LOGIN_FAILURE_WINDOW_SECONDS,
+                 max_users: int = LOGIN_THROTTLE_USERS):
+        self.max_failures = max_failures
+        self.window = window
+        self._failures = LRUCache(max_users, ttl=window)
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def _recent(self, username: str, now: float) -> deque:
+        failures = self._failures.get(username)
+        if failures is None:
+            return deque()
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        return failures
+
+    def reserve(self, username: str) -> float:
+        """Count an attempt, or raise LoginThrottled if the username has used up its failures."""
+        with self._lock:
+            now = time.monotonic()
+            failures = self._recent(username, now)
+            if len(failures) >= self.max_failures:
+                self.throttled += 1
+                raise LoginThrottled(failures[0] + self.window - now)
+            failures.append(now)
+            self._failures.put(username, failures)
+            return now
+
+    def release(self, username: str, attempt: float):
+        """Un-count a reserve()d attempt that neither failed nor succeeded."""
+        with self._lock:
+            failures = self._failures.get(username)
+            if failures is not None and attempt in failures:
+                failures.remove(attempt)
+
+    def succeeded(self, username: str):
+        with self._lock:
+            self._failures.pop(username)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'tracked_users': len(self._failures), 'throttled': self.throttled}
+
+
+hash_pool = HashPool()
+login_throttle = LoginThrottle()
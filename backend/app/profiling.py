@@ -0,0 +1,200 @@
+import asyncio
+import collections
+import functools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+# Opt-in request profiling. A request is profiled when it carries
+# `X-Profile: <PROFILE_TOKEN>` or is picked at PROFILE_SAMPLE_RATE; with neither
+# configured the middleware passes requests straight through.
+#
+# Profiles are sampled rather than traced: while the request runs, a sampler
+# thread records the Python stack of every thread that is inside backend/app
+# code, so SQL, pandas and scikit-learn phases show up whether they run on the
+# event loop, the request threadpool, the dashboard or the ML worker threads.
+# Every stack is rooted at its thread name; other requests served by the same
+# worker at the same time appear under their threads too.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+# Profiles kept on disk; the oldest are deleted beyond this
+PROFILE_RETENTION = int(os.getenv("PROFILE_RETENTION", "200"))
+# Functions listed in a profile's summary
+PROFILE_TOP_FUNCTIONS = 30
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Threads that sit inside app code while idle
+IGNORED_THREADS = frozenset({"ml-reload"})
+# Never profiled: fetching profiles (which carries the token) and scrapes
+EXCLUDED_PATHS = ("/profiles", "/metrics")
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def enabled() -> bool:
+    return bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+
+def authorized(token: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN) and token == PROFILE_TOKEN
+
+
+@functools.lru_cache(maxsize=None)
+def _code_label(code) -> str:
+    filename = code.co_filename
+    for root in (os.path.dirname(APP_DIR), *sys.path):
+        if root and filename.startswith(root + os.sep):
+            filename = filename[len(root) + 1:]
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class Sampler(threading.Thread):
+    """Counts the stacks of threads running app code every `interval` seconds until stopped."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.stacks: collections.Counter = collections.Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        names: Dict[int, str] = {}
+        while not self._stopped.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                name = names.get(ident, str(ident))
+                if name in IGNORED_THREADS:
+                    continue
+                stack, in_app = [], False
+                while frame is not None:
+                    in_app = in_app or frame.f_code.co_filename.startswith(APP_DIR)
+                    stack.append(frame)
+                    frame = frame.f_back
+                if in_app:
+                    # Labels are only built for kept stacks
+                    self.stacks[(name, *(_code_label(f.f_code) for f in reversed(stack)))] += 1
+
+    def stop(self):
+        """Ask the thread to finish; join() it (off the event loop) before reading the stacks."""
+        self._stopped.set()
+
+
+def summarize(stacks: collections.Counter, limit: int = PROFILE_TOP_FUNCTIONS) -> List[Dict[str, Any]]:
+    """Functions by samples on top of the stack (self) and anywhere on it (total)."""
+    own: collections.Counter = collections.Counter()
+    total: collections.Counter = collections.Counter()
+    for stack, count in stacks.items():
+        own[stack[-1]] += count
+        for function in set(stack[1:]):
+            total[function] += count
+    return [
+        {'function': function, 'total_samples': count, 'self_samples': own[function]}
+        for function, count in total.most_common(limit)
+    ]
+
+
+def _path(request_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{request_id}.json")
+
+
+def save(profile: Dict[str, Any]):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(_path(profile['request_id']), "w") as f:
+        json.dump(profile, f)
+    saved = sorted(
+        (entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in saved[:max(0, len(saved) - PROFILE_RETENTION)]:
+        os.remove(entry.path)
+
+
+def load(request_id: str) -> Optional[Dict[str, Any]]:
+    if not _REQUEST_ID.match(request_id) or not os.path.exists(_path(request_id)):
+        return None
+    with open(_path(request_id)) as f:
+        return json.load(f)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Saved profiles, newest first, without their stacks."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in sorted(os.scandir(PROFILE_DIR), key=lambda e: e.stat().st_mtime, reverse=True):
+        if entry.name.endswith(".json"):
+            with open(entry.path) as f:
+                profile = json.load(f)
+            profiles.append({k: v for k, v in profile.items() if k not in ('stacks', 'top')})
+    return profiles
+
+
+def folded(profile: Dict[str, Any]) -> str:
+    """Collapsed stacks ("frame;frame;frame count"), as read by flamegraph.pl and speedscope."""
+    return ''.join(f"{stack} {count}\n" for stack, count in profile['stacks'].items())
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that ask for it (X-Profile) or are sampled."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not enabled() or scope['path'].startswith(EXCLUDED_PATHS):
+            return await self.app(scope, receive, send)
+        headers = dict(scope['headers'])
+        requested = authorized(headers.get(b'x-profile', b'').decode('latin-1'))
+        if not requested and random.random() >= PROFILE_SAMPLE_RATE:
+            return await self.app(scope, receive, send)
+
+        # Always ours: a client-chosen id would name (and could overwrite) another profile's file
+        request_id = uuid.uuid4().hex
+        status = [500]
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+                message['headers'] = [*message.get('headers', []), (b'x-request-id', request_id.encode())]
+            await send(message)
+
+        sampler = Sampler(PROFILE_INTERVAL_MS / 1000)
+        started_at, started = time.time(), time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            sampler.stop()
+            loop = asyncio.get_running_loop()
+            # The last sample can take a while with many threads; don't hold the loop for it
+            await loop.run_in_executor(None, sampler.join)
+            route = getattr(scope.get('route'), 'path', None)
+            profile = {
+                'request_id': request_id,
+                'method': scope['method'],
+                'path': scope['path'],
+                'route': route,
+                'status': status[0],
+                'trigger': 'header' if requested else 'sampled',
+                'started_at': started_at,
+                'duration_ms': round(elapsed * 1000, 2),
+                'interval_ms': PROFILE_INTERVAL_MS,
+                'samples': sampler.samples,
+                'top': summarize(sampler.stacks),
+                'stacks': {';'.join(stack): count for stack, count in sampler.stacks.most_common()},
+            }
+            await loop.run_in_executor(None, save, profile)
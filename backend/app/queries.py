@@ -0,0 +1,90 @@
+import base64
+import json
+from datetime import date
+from typing import List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query, Session
+
+from . import models
+
+# Transaction listing: shared filters plus keyset pagination over
+# (date DESC, id DESC), served by the (user_id, date, id) index so a page
+# costs the same however deep it is.
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def parse_ids(value: Optional[str]) -> List[int]:
+    """Comma-separated ids ("1,2, 3") as a list of ints."""
+    if not value:
+        return []
+    return [int(part.strip()) for part in value.split(',') if part.strip()]
+
+
+def transaction_query(db: Session, user_id: int, start: Optional[date] = None, end: Optional[date] = None,
+                      category: Optional[str] = None, min_amount: Optional[float] = None,
+                      max_amount: Optional[float] = None, is_anomaly: Optional[bool] = None,
+                      statement_ids: Optional[List[int]] = None, columns=None) -> Query:
+    """The user's transactions narrowed by the optional filters (unordered).
+
+    `category` may list several categories separated by commas.
+    """
+    txn = models.TransactionDB
+    query = db.query(*(columns or (txn,))).filter(txn.user_id == user_id)
+    if start is not None:
+        query = query.filter(txn.date >= start)
+    if end is not None:
+        query = query.filter(txn.date <= end)
+    if category:
+        query = query.filter(txn.category.in_([c.strip() for c in category.split(',') if c.strip()]))
+    if min_amount is not None:
+        query = query.filter(txn.amount >= min_amount)
+    if max_amount is not None:
+        query = query.filter(txn.amount <= max_amount)
+    if is_anomaly is not None:
+        query = query.filter(txn.is_anomaly == is_anomaly)
+    if statement_ids:
+        query = query.filter(txn.statement_id.in_(statement_ids))
+    return query
+
+
+def encode_cursor(row: models.TransactionDB) -> str:
+    key = [row.date.isoformat() if row.date else None, row.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[date], int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        day, row_id = json.loads(raw)
+        return (date.fromisoformat(day) if day else None), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_page(query: Query, cursor: Optional[str], limit: int) -> Tuple[List[models.TransactionDB], Optional[str]]:
+    """One page, newest first, and the cursor for the next page (None on the last page).
+
+    The cursor is the (date, id) of the last row returned, and the next page
+    starts with a row-value comparison against it, which SQLite answers with a
+    range seek on the index. Undated rows (if any) come after all dated ones.
+    """
+    txn = models.TransactionDB
+    day, row_id = decode_cursor(cursor) if cursor else (None, None)
+    rows = []
+    if not (cursor and day is None):
+        dated = query.filter(txn.date.isnot(None))
+        if cursor:
+            dated = dated.filter(tuple_(txn.date, txn.id) < tuple_(day, row_id))
+        rows = dated.order_by(txn.date.desc(), txn.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        undated = query.filter(txn.date.is_(None))
+        if cursor and day is None:
+            undated = undated.filter(txn.id < row_id)
+        rows += undated.order_by(txn.id.desc()).limit(limit + 1 - len(rows)).all()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
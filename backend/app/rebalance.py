@@ -0,0 +1,159 @@
+"""Move users' data between shard databases.
+
+Run from the repository root:
+
+    python -m backend.app.rebalance --shards 4 [--dry-run]
+
+Every user is reassigned to user_id % --shards (0 moves everyone back into the
+directory database) and the data of each user whose assignment changed is
+moved: copied into the target in one transaction, the directory repointed,
+then deleted from the source, with the user's writes on the source held off
+for the whole move. The API can keep running: workers still routing a moved
+user to the old shard (cached principals live up to AUTH_CACHE_TTL_SECONDS)
+read the old shard's now empty data until the cache expires, and their writes
+are refused (503, retried against the new shard) rather than lost; workers
+only check for moves with SHARD_COUNT set, so set it on the API before moving
+users out of the directory database for the first time. While a
+SQLite shard's user is being moved, other writes to that shard wait up to
+SQLITE_BUSY_TIMEOUT_MS. A user interrupted after the directory was repointed
+is served from the target; running the tool again clears the leftovers. Row
+ids are reallocated in the target database, so transaction, statement,
+budget, bill and goal ids of moved users change.
+"""
+import argparse
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, insert, select, update
+
+from . import auth, database, models, versions
+
+logger = logging.getLogger(__name__)
+
+# Rows copied per executemany when moving transactions
+MOVE_BATCH_ROWS = 5000
+
+# Everything a user owns. Statements go first: transactions refer to them by id
+# (there is no foreign key to order them by).
+USER_TABLES = sorted(
+    (table for table in models.Base.metadata.sorted_tables
+     if table.name not in database.DIRECTORY_TABLES and 'user_id' in table.c),
+    key=lambda table: table.name != models.UploadedStatementDB.__tablename__
+)
+
+
+def _copy_user(source, target, user_id: int):
+    """Copy the user's rows from connection `source` to `target`, reallocating surrogate ids."""
+    statement_ids: Dict[int, int] = {}
+    for table in USER_TABLES:
+        target.execute(delete(table).where(table.c.user_id == user_id))
+        has_id = 'id' in table.c and table.c.id.primary_key
+        columns = [c for c in table.c if not (has_id and c.name == 'id')]
+        query = select(*table.c).where(table.c.user_id == user_id)
+        if has_id:
+            query = query.order_by(table.c.id)  # keeps transactions in insertion order
+        rows = source.execute(query).mappings()
+
+        if table.name == models.UploadedStatementDB.__tablename__:
+            for row in rows:
+                result = target.execute(insert(table).values({c.name: row[c.name] for c in columns}))
+                statement_ids[row['id']] = result.inserted_primary_key[0]
+            continue
+
+        batch: List[dict] = []
+        for row in rows:
+            values = {c.name: row[c.name] for c in columns}
+            if table.name == models.TransactionDB.__tablename__ and values['statement_id'] is not None:
+                values['statement_id'] = statement_ids.get(values['statement_id'])
+            batch.append(values)
+            if len(batch) >= MOVE_BATCH_ROWS:
+                target.execute(insert(table), batch)
+                batch = []
+        if batch:
+            target.execute(insert(table), batch)
+
+
+def _delete_user(connection, user_id: int):
+    for table in reversed(USER_TABLES):
+        connection.execute(delete(table).where(table.c.user_id == user_id))
+
+
+def move_user(user_id: int, source_shard: Optional[int], target_shard: Optional[int]):
+    """Move the user's rows; safe while API workers still route the user to the source.
+
+    The source transaction starts by bumping the user's versions, which holds
+    their user_versions row (and, on SQLite, the shard's writer lock) until the
+    source rows are deleted: writers bump that row too, so none can commit to
+    the source between the copy and the delete. Writes that reach the source
+    after the directory is repointed fail the RoutingSession shard check.
+    """
+    source, target = database.bind_for_shard(source_shard), database.bind_for_shard(target_shard)
+    with source.begin() as source_conn:
+        versions.bump(source_conn, user_id, ledger=True)
+        with target.begin() as target_conn:
+            _copy_user(source_conn, target_conn, user_id)
+            # New ETags and a rebuilt ledger: ids changed even where the data didn't
+            versions.bump(target_conn, user_id, ledger=True)
+        repoint = (update(models.UserDB.__table__).where(models.UserDB.id == user_id)
+                   .values(shard=target_shard).returning(models.UserDB.username))
+        if source is database.engine:
+            # Moving out of the directory database: a second connection would wait on our own lock
+            username = source_conn.execute(repoint).scalar()
+        else:
+            with database.engine.begin() as directory:
+                username = directory.execute(repoint).scalar()
+        _delete_user(source_conn, user_id)
+    # Only reaches this process's cache; API workers whose cached principal still
+    # points at the source get ShardMoved on their next write and re-route
+    auth.invalidate_user(user_id, username)
+
+
+def sweep(shard: Optional[int]) -> int:
+    """Delete rows on `shard` belonging to users the directory places elsewhere."""
+    with database.engine.connect() as directory:
+        owners = {
+            user_id for user_id, user_shard in directory.execute(select(models.UserDB.id, models.UserDB.shard))
+            if user_shard == shard
+        }
+    stray = set()
+    with database.bind_for_shard(shard).begin() as connection:
+        for table in USER_TABLES:
+            stray.update(connection.execute(select(table.c.user_id).distinct()).scalars())
+        stray -= owners
+        for user_id in stray:
+            _delete_user(connection, user_id)
+    return len(stray)
+
+
+def rebalance(shard_count: int, dry_run: bool = False) -> List[tuple]:
+    """Reassign every user for `shard_count` shards; returns (user_id, from, to) per move."""
+    targets = [None, *range(shard_count)]
+    if not dry_run:
+        for shard in targets:
+            database.init_db(database.bind_for_shard(shard))
+    with database.engine.connect() as directory:
+        users = directory.execute(select(models.UserDB.id, models.UserDB.shard)).all()
+    moves = [
+        (user_id, shard, database.assign_shard(user_id, shard_count))
+        for user_id, shard in users
+        if shard != database.assign_shard(user_id, shard_count)
+    ]
+    for user_id, source, target in moves:
+        logger.info(f"Moving user {user_id}: shard {source} -> {target}")
+        if not dry_run:
+            move_user(user_id, source, target)
+    if not dry_run:
+        for shard in set(targets) | {source for _, source, _ in moves}:
+            sweep(shard)
+    return moves
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--shards", type=int, default=database.SHARD_COUNT,
+                    help="shard count to balance for (default: SHARD_COUNT)")
+    ap.add_argument("--dry-run", action="store_true", help="only list the moves")
+    args = ap.parse_args()
+    moved = rebalance(args.shards, dry_run=args.dry_run)
+    print(f"{len(moved)} user(s) {'to move' if args.dry_run else 'moved'}")
@@ -0,0 +1,132 @@
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .lazy import LazyModule
+
+pd = LazyModule("pandas")
+
+# Time-bucketed totals per user: one row per day, and one per month and
+# category. Writes add or subtract deltas (upserts keyed by the bucket), so
+# reading them costs O(days) or O(months x categories) however many
+# transactions the user has.
+VALUE_COLUMNS = ('income', 'expense', 'count', 'income_count')
+
+# (date, category, amount) for each transaction added or removed
+Row = Tuple[Optional[date], Optional[str], float]
+
+
+def _values(amount: float) -> List[float]:
+    return [max(amount, 0.0), max(-amount, 0.0), 1, 1 if amount > 0 else 0]
+
+
+def _add(buckets: Dict[Any, List[float]], key, values):
+    bucket = buckets.setdefault(key, [0.0, 0.0, 0, 0])
+    for i, value in enumerate(values):
+        bucket[i] += value or 0
+
+
+def summarize(rows: Iterable[Row]) -> Dict[str, Dict[Any, List[float]]]:
+    """Bucket (date, category, amount) rows into daily and monthly x category deltas."""
+    daily: Dict[Any, List[float]] = {}
+    monthly: Dict[Any, List[float]] = {}
+    for day, category, amount in rows:
+        if day is None or amount is None:
+            continue
+        values = _values(amount)
+        _add(daily, day, values)
+        _add(monthly, (day.strftime('%Y-%m'), category or ''), values)
+    return {'daily': daily, 'monthly': monthly}
+
+
+def summarize_query(db: Session, *criteria) -> Dict[str, Dict[Any, List[float]]]:
+    """Deltas for the transactions matching `criteria`, bucketed in SQL (used before bulk deletes)."""
+    txn = models.TransactionDB
+    values = (
+        func.sum(case((txn.amount > 0, txn.amount), else_=0.0)),
+        func.sum(case((txn.amount < 0, -txn.amount), else_=0.0)),
+        func.count(txn.id),
+        func.sum(case((txn.amount > 0, 1), else_=0))
+    )
+    daily: Dict[Any, List[float]] = {}
+    for day, *row in db.query(txn.date, *values).filter(
+        *criteria, txn.date.isnot(None), txn.amount.isnot(None)
+    ).group_by(txn.date):
+        _add(daily, day, row)
+
+    month = func.strftime('%Y-%m', txn.date)
+    category = func.coalesce(txn.category, '')
+    monthly: Dict[Any, List[float]] = {}
+    for month_key, category_key, *row in db.query(month, category, *values).filter(
+        *criteria, txn.date.isnot(None), txn.amount.isnot(None)
+    ).group_by(month, category):
+        _add(monthly, (month_key, category_key), row)
+    return {'daily': daily, 'monthly': monthly}
+
+
+def _upsert(db: Session, table, keys: Tuple[str, ...], rows: List[Dict[str, Any]]):
+    if not rows:
+        return
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c[k] for k in keys],
+        set_={c: table.c[c] + stmt.excluded[c] for c in VALUE_COLUMNS}
+    )
+    db.execute(stmt, rows)
+    # Buckets whose last transaction went away
+    db.execute(table.delete().where(table.c.user_id == rows[0]['user_id'], table.c.count <= 0))
+
+
+def apply(db: Session, user_id: int, added: Optional[Dict] = None, removed: Optional[Dict] = None):
+    """Merge summarize()/summarize_query() deltas into the rollup tables, in the caller's transaction."""
+    for name, table, keys in (
+        ('daily', models.DailyRollupDB.__table__, ('user_id', 'day')),
+        ('monthly', models.MonthlyCategoryRollupDB.__table__, ('user_id', 'month', 'category')),
+    ):
+        combined: Dict[Any, List[float]] = {}
+        for deltas, sign in ((added or {}, 1), (removed or {}, -1)):
+            for key, values in deltas.get(name, {}).items():
+                _add(combined, key, [sign * v for v in values])
+
+        rows = []
+        for key, values in combined.items():
+            row = dict(zip(keys[1:], key if isinstance(key, tuple) else (key,)))
+            row.update(zip(VALUE_COLUMNS, values))
+            row['user_id'] = user_id
+            rows.append(row)
+        _upsert(db, table, keys, rows)
+
+
+def rebuild(db: Session, user_id: int):
+    """Recompute a user's rollups from their transactions."""
+    for model in (models.DailyRollupDB, models.MonthlyCategoryRollupDB):
+        db.query(model).filter(model.user_id == user_id).delete()
+    apply(db, user_id, added=summarize_query(db, models.TransactionDB.user_id == user_id))
+
+
+def daily_frame(db: Session, user_id: int, start: Optional[date] = None, end: Optional[date] = None):
+    """DataFrame of the user's daily rollups (date, income, expense, count, income_count), by date."""
+    daily = models.DailyRollupDB
+    query = db.query(daily.day, daily.income, daily.expense, daily.count, daily.income_count).filter(
+        daily.user_id == user_id
+    )
+    if start is not None:
+        query = query.filter(daily.day >= start)
+    if end is not None:
+        query = query.filter(daily.day <= end)
+    df = pd.DataFrame(query.order_by(daily.day).all(), columns=['date', *VALUE_COLUMNS])
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def monthly_frame(db: Session, user_id: int):
+    """DataFrame of the user's month x category rollups (month, category, income, expense, ...)."""
+    monthly = models.MonthlyCategoryRollupDB
+    rows = db.query(
+        monthly.month, monthly.category, monthly.income, monthly.expense, monthly.count, monthly.income_count
+    ).filter(monthly.user_id == user_id).order_by(monthly.month, monthly.category).all()
+    return pd.DataFrame(rows, columns=['month', 'category', *VALUE_COLUMNS])
@@ -0,0 +1,34 @@
+from typing import Dict
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Per-user change counters (UserVersionDB). Bumps run in the caller's
+# transaction, so a counter only moves once the write it describes commits.
+# A Session also notes the bumped users in its info, for caches keyed by
+# version to drop their entries once the commit lands (see conditional).
+BUMPED_USERS = 'bumped_users'
+
+
+def bump(db: Session, user_id: int, ledger: bool = False):
+    """Advance data_version, and ledger_version too if transactions changed."""
+    table = models.UserVersionDB.__table__
+    changes = {'data_version': table.c.data_version + 1}
+    if ledger:
+        changes['ledger_version'] = table.c.ledger_version + 1
+    db.execute(insert(table).values(
+        user_id=user_id, data_version=1, ledger_version=1 if ledger else 0
+    ).on_conflict_do_update(index_elements=[table.c.user_id], set_=changes))
+    if isinstance(db, Session):
+        db.info.setdefault(BUMPED_USERS, set()).add(user_id)
+
+
+def get(db: Session, user_id: int) -> Dict[str, int]:
+    row = db.query(models.UserVersionDB.ledger_version, models.UserVersionDB.data_version).filter(
+        models.UserVersionDB.user_id == user_id
+    ).first()
+    if row is None:
+        return {'ledger_version': 0, 'data_version': 0}
+    return {'ledger_version': row.ledger_version, 'data_version': row.data_version}
@@ -0,0 +1,42 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from backend.app import database, models  # noqa: F401 (registers the tables)
+
+config = context.config
+target_metadata = database.Base.metadata
+
+# database.init_db() hands over its connection; the alembic CLI doesn't
+connection = config.attributes.get('connection')
+if connection is None and config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+
+def _configure(**kwargs):
+    # Batch mode lets ALTERs work on SQLite by copying the table
+    context.configure(target_metadata=target_metadata, render_as_batch=True, **kwargs)
+
+
+def run_migrations_offline():
+    _configure(url=database.SQLALCHEMY_DATABASE_URL, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    if connection is not None:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+    with database.engine.connect() as conn:
+        _configure(connection=conn)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,95 @@
+"""Baseline: the tables create_all() used to build at startup
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _indexes(table, *columns, unique=()):
+    for column in columns:
+        op.create_index(f'ix_{table}_{column}', table, [column], unique=column in unique)
+
+
+def upgrade():
+    op.create_table(
+        'transactions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date()),
+        sa.Column('description', sa.String()),
+        sa.Column('amount', sa.Float()),
+        sa.Column('category', sa.String(), nullable=True),
+        sa.Column('source', sa.String()),
+        sa.Column('is_recurring', sa.Boolean()),
+        sa.Column('is_anomaly', sa.Boolean()),
+        sa.Column('statement_id', sa.Integer(), nullable=True),
+    )
+    _indexes('transactions', 'id', 'user_id', 'description', 'category', 'statement_id')
+
+    op.create_table(
+        'budgets',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('category', sa.String()),
+        sa.Column('amount', sa.Float()),
+    )
+    _indexes('budgets', 'id', 'user_id', 'category')
+
+    op.create_table(
+        'bill_reminders',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String()),
+        sa.Column('amount', sa.Float()),
+        sa.Column('due_day', sa.Integer()),
+        sa.Column('is_active', sa.Boolean()),
+        sa.Column('category', sa.String(), nullable=True),
+    )
+    _indexes('bill_reminders', 'id', 'user_id', 'name')
+
+    op.create_table(
+        'uploaded_statements',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String()),
+        sa.Column('uploaded_at', sa.String()),
+        sa.Column('transaction_count', sa.Integer()),
+    )
+    _indexes('uploaded_statements', 'id', 'user_id', 'filename')
+
+    op.create_table(
+        'goals',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String()),
+        sa.Column('target_amount', sa.Float()),
+        sa.Column('deadline', sa.String()),
+        sa.Column('current_saved', sa.Float()),
+        sa.Column('created_at', sa.String()),
+    )
+    _indexes('goals', 'id', 'user_id', 'name')
+
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('username', sa.String()),
+        sa.Column('email', sa.String()),
+        sa.Column('hashed_password', sa.String()),
+        sa.Column('full_name', sa.String(), nullable=True),
+        sa.Column('created_at', sa.String()),
+    )
+    _indexes('users', 'id', 'username', 'email', unique=('username', 'email'))
+
+
+def downgrade():
+    for table in ('users', 'goals', 'uploaded_statements', 'bill_reminders', 'budgets', 'transactions'):
+        op.drop_table(table)
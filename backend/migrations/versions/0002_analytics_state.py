@@ -0,0 +1,69 @@
+"""Anomaly stats, user versions, rollups and composite transaction indexes
+
+Databases that ran the pre-migration code may already have some of these
+(create_all() added new tables as they appeared), hence if_not_exists.
+
+Revision ID: 0002_analytics_state
+Revises: 0001_baseline
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002_analytics_state'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+_TOTALS = (
+    ('income', sa.Float()),
+    ('expense', sa.Float()),
+    ('count', sa.Integer()),
+    ('income_count', sa.Integer()),
+)
+
+
+def upgrade():
+    op.create_table(
+        'anomaly_stats',
+        sa.Column('user_id', sa.Integer(), primary_key=True),
+        sa.Column('category', sa.String(), primary_key=True),
+        sa.Column('count', sa.Integer()),
+        sa.Column('total', sa.Float()),
+        sa.Column('total_sq', sa.Float()),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'user_versions',
+        sa.Column('user_id', sa.Integer(), primary_key=True),
+        sa.Column('ledger_version', sa.Integer(), nullable=False),
+        sa.Column('data_version', sa.Integer(), nullable=False),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'daily_rollups',
+        sa.Column('user_id', sa.Integer(), primary_key=True),
+        sa.Column('day', sa.Date(), primary_key=True),
+        *(sa.Column(name, type_) for name, type_ in _TOTALS),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'monthly_category_rollups',
+        sa.Column('user_id', sa.Integer(), primary_key=True),
+        sa.Column('month', sa.String(), primary_key=True),
+        sa.Column('category', sa.String(), primary_key=True),
+        *(sa.Column(name, type_) for name, type_ in _TOTALS),
+        if_not_exists=True,
+    )
+    op.create_index('ix_transactions_user_date_id', 'transactions', ['user_id', 'date', 'id'],
+                    if_not_exists=True)
+    op.create_index('ix_transactions_user_category', 'transactions', ['user_id', 'category'],
+                    if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_transactions_user_category', table_name='transactions')
+    op.drop_index('ix_transactions_user_date_id', table_name='transactions')
+    for table in ('monthly_category_rollups', 'daily_rollups', 'user_versions', 'anomaly_stats'):
+        op.drop_table(table)
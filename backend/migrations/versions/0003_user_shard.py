@@ -0,0 +1,24 @@
+"""Record which shard database holds each user's data
+
+Revision ID: 0003_user_shard
+Revises: 0002_analytics_state
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003_user_shard'
+down_revision = '0002_analytics_state'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('shard', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('shard')
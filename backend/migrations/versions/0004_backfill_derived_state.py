@@ -0,0 +1,73 @@
+"""Derive rollups and anomaly stats for transactions stored before those tables existed
+
+Runs once per database, instead of a scan of transactions on every API boot.
+The SQL is written out here rather than calling the application's rebuild
+code, so the migration keeps doing what it did at this revision whatever
+backend.app later becomes. It matches changes.rebuild() as of this revision:
+users with transactions but no daily rollups get their rollups and anomaly
+stats recomputed and their versions bumped.
+
+Revision ID: 0004_backfill_derived_state
+Revises: 0003_user_shard
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004_backfill_derived_state'
+down_revision = '0003_user_shard'
+branch_labels = None
+depends_on = None
+
+# income, expense, count, income_count of a group of transactions
+_TOTALS = """
+    SUM(CASE WHEN amount > 0 THEN amount ELSE 0.0 END),
+    SUM(CASE WHEN amount < 0 THEN -amount ELSE 0.0 END),
+    COUNT(id),
+    SUM(CASE WHEN amount > 0 THEN 1 ELSE 0 END)
+"""
+_PENDING = "user_id IN (SELECT user_id FROM backfill_users)"
+_DATED = "date IS NOT NULL AND amount IS NOT NULL"
+
+_STATEMENTS = (
+    """CREATE TEMP TABLE backfill_users AS
+       SELECT DISTINCT user_id FROM transactions
+       WHERE user_id NOT IN (SELECT DISTINCT user_id FROM daily_rollups)""",
+    f"DELETE FROM daily_rollups WHERE {_PENDING}",
+    f"DELETE FROM monthly_category_rollups WHERE {_PENDING}",
+    f"DELETE FROM anomaly_stats WHERE {_PENDING}",
+    f"""INSERT INTO daily_rollups (user_id, day, income, expense, count, income_count)
+        SELECT user_id, date, {_TOTALS} FROM transactions
+        WHERE {_PENDING} AND {_DATED}
+        GROUP BY user_id, date""",
+    f"""INSERT INTO monthly_category_rollups (user_id, month, category, income, expense, count, income_count)
+        SELECT user_id, strftime('%Y-%m', date), COALESCE(category, ''), {_TOTALS} FROM transactions
+        WHERE {_PENDING} AND {_DATED}
+        GROUP BY user_id, strftime('%Y-%m', date), COALESCE(category, '')""",
+    # Per category ('' and NULL both count as Uncategorized), then '*' for all of them
+    f"""INSERT INTO anomaly_stats (user_id, category, count, total, total_sq)
+        SELECT user_id, COALESCE(NULLIF(category, ''), 'Uncategorized'), COUNT(id),
+               COALESCE(SUM(amount), 0.0), COALESCE(SUM(amount * amount), 0.0)
+        FROM transactions WHERE {_PENDING}
+        GROUP BY user_id, COALESCE(NULLIF(category, ''), 'Uncategorized')""",
+    f"""INSERT INTO anomaly_stats (user_id, category, count, total, total_sq)
+        SELECT user_id, '*', COUNT(id), COALESCE(SUM(amount), 0.0), COALESCE(SUM(amount * amount), 0.0)
+        FROM transactions WHERE {_PENDING}
+        GROUP BY user_id""",
+    # WHERE true: SQLite needs it to parse ON CONFLICT after INSERT ... SELECT
+    """INSERT INTO user_versions (user_id, ledger_version, data_version)
+       SELECT user_id, 1, 1 FROM backfill_users WHERE true
+       ON CONFLICT (user_id) DO UPDATE SET ledger_version = ledger_version + 1,
+                                           data_version = data_version + 1""",
+    "DROP TABLE backfill_users",
+)
+
+
+def upgrade():
+    for statement in _STATEMENTS:
+        op.execute(sa.text(statement))
+
+
+def downgrade():
+    pass
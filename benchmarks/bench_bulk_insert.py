@@ -0,0 +1,83 @@
+"""Compare per-row ORM inserts with ingest.bulk_insert_transactions.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_bulk_insert --rows 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from backend.app import models
+from backend.app.ingest import bulk_insert_transactions, INSERT_BATCH_ROWS, TRANSACTION_INSERT_COLUMNS
+
+
+def make_rows(count: int, user_id: int = 1, statement_id: int = 1, seed: int = 42):
+    rng = random.Random(seed)
+    start = date(2021, 1, 1)
+    return [
+        {
+            'user_id': user_id,
+            'date': start + timedelta(days=rng.randint(0, 1000)),
+            'description': rng.choice(["NETFLIX", "UBER", "WHOLE FOODS", "SALARY", "RENT"]),
+            'amount': round(rng.uniform(-500, 500), 2),
+            'category': rng.choice(["Entertainment", "Transport", "Groceries", "Income", "Rent"]),
+            'source': "csv_upload",
+            'is_recurring': False,
+            'is_anomaly': False,
+            'statement_id': statement_id,
+        }
+        for _ in range(count)
+    ]
+
+
+def fresh_session(path: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def orm_insert(db, rows):
+    for row in rows:
+        db.add(models.TransactionDB(**row))
+    db.commit()
+
+
+def bulk_insert(db, rows):
+    bulk_insert_transactions(db, [
+        tuple(row[c].isoformat() if c == 'date' else row[c] for c in TRANSACTION_INSERT_COLUMNS)
+        for row in rows
+    ])
+    db.commit()
+
+
+def run(count: int):
+    rows = make_rows(count)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, insert_fn in (("orm", orm_insert), ("bulk", bulk_insert)):
+            engine, db = fresh_session(os.path.join(tmp, f"{name}.db"))
+            start = time.perf_counter()
+            insert_fn(db, rows)
+            elapsed = time.perf_counter() - start
+            stored = db.query(func.count(models.TransactionDB.id)).scalar()
+            assert stored == count, f"{name} stored {stored} rows"
+            db.close()
+            engine.dispose()
+            results[name] = elapsed
+            print(f"{name:>4}: {count:,} rows in {elapsed:7.3f}s ({count / elapsed:>10,.0f} rows/s)")
+    print(f"bulk batch size: {INSERT_BATCH_ROWS} rows | speedup {results['orm'] / results['bulk']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=100_000)
+    args = ap.parse_args()
+    run(args.rows)
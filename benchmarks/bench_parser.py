@@ -0,0 +1,73 @@
+"""Compare the per-row and column-wise BankStatementParser engines.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_parser
+    python -m benchmarks.bench_parser --sizes 1000 100000 1000000 --skip-rows-above 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from backend.app.parsers import BankStatementParser
+
+MERCHANTS = [
+    "POS PURCHASE NETFLIX", "UBER TRIP", "WHOLE FOODS store #412", "SALARY ACME CORP",
+    "ACH RENT PAYMENT", "STARBUCKS", "AMAZON MKTPLACE", "SHELL OIL 5512",
+]
+CATEGORIES = ["Entertainment", "Transport", "Groceries", "Income", "Rent", "Dining", "Shopping", ""]
+
+
+def write_statement(path: str, rows: int, seed: int = 42) -> None:
+    """Write a Date/Description/Debit/Credit statement with realistic formatting noise."""
+    rng = random.Random(seed)
+    start = date(2021, 1, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Date,Description,Debit,Credit,Category\n")
+        for _ in range(rows):
+            day = (start + timedelta(days=rng.randint(0, 3 * 365))).strftime("%d/%m/%Y")
+            merchant = rng.choice(MERCHANTS)
+            amount = f"${rng.uniform(1, 2500):,.2f}".replace(",", "")
+            if merchant.startswith("SALARY"):
+                f.write(f"{day},{merchant},,{amount},Income\n")
+            else:
+                f.write(f"{day},{merchant},{amount},,{rng.choice(CATEGORIES)}\n")
+
+
+def time_engine(parser: BankStatementParser, path: str, vectorized: bool) -> tuple:
+    start = time.perf_counter()
+    txns = parser.parse_csv(path, vectorized=vectorized)
+    return time.perf_counter() - start, txns
+
+
+def run(sizes, skip_rows_above=None):
+    parser = BankStatementParser()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            path = os.path.join(tmp, f"statement_{rows}.csv")
+            write_statement(path, rows)
+
+            vec_time, vec_txns = time_engine(parser, path, vectorized=True)
+            row_time = None
+            if skip_rows_above is None or rows <= skip_rows_above:
+                row_time, row_txns = time_engine(parser, path, vectorized=False)
+                assert row_txns == vec_txns, "engines disagree"
+
+            results.append({"rows": rows, "vectorized_s": vec_time, "rows_s": row_time})
+            speedup = f"{row_time / vec_time:6.1f}x" if row_time else "   n/a"
+            row_str = f"{row_time:9.3f}s" if row_time else "  skipped"
+            print(f"{rows:>9,} rows | per-row {row_str} | vectorized {vec_time:8.3f}s | speedup {speedup}")
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    ap.add_argument("--skip-rows-above", type=int, default=None,
+                    help="don't time the per-row engine above this many rows")
+    args = ap.parse_args()
+    run(args.sizes, args.skip_rows_above)
@@ -0,0 +1,102 @@
+"""Concurrent upload throughput as the number of shard databases grows.
+
+Each of --users processes (standing in for API workers) stores a statement for
+its own user the way ingest_statement does (rollups / anomaly stats updated,
+rows bulk-inserted, one commit at the end), against the shard
+user_id % shards. With one shard every upload queues on the same SQLite
+writer lock, and those waiting longer than SQLITE_BUSY_TIMEOUT_MS fail with
+"database is locked"; with more shards they proceed in parallel. ML
+categorisation is left out (rows come pre-categorised) so the numbers reflect
+storage, not the classifier. Scaling is bounded by the CPU count.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_shard_uploads --users 8 --rows 50000 --shards 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend.app import changes, database, versions
+from backend.app.ingest import bulk_insert_transactions, UPLOAD_CHUNK_SIZE
+from benchmarks.bench_bulk_insert import make_rows
+from benchmarks.bench_sqlite_concurrency import _insert_tuples
+
+
+def _shard_url(tmp: str, shard_count: int, shard: int) -> str:
+    return f"sqlite:///{os.path.join(tmp, f'{shard_count}-shard{shard}.db')}"
+
+
+def _upload(url: str, user_id: int, rows: int, start, results):
+    """One worker process: prepare the statement, wait for the start signal, store it."""
+    engine = database.make_engine(url)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    statement = make_rows(rows, user_id=user_id, seed=user_id)
+    start.wait()
+    began = time.time()
+    try:
+        for offset in range(0, len(statement), UPLOAD_CHUNK_SIZE):
+            chunk = statement[offset:offset + UPLOAD_CHUNK_SIZE]
+            changes.apply_rows(db, user_id, added=[(r['date'], r['category'], r['amount']) for r in chunk])
+            bulk_insert_transactions(db, _insert_tuples(chunk))
+        versions.bump(db, user_id)
+        db.commit()
+        results.put((user_id, began, time.time(), None))
+    except OperationalError as e:
+        db.rollback()
+        results.put((user_id, began, time.time(), str(e.orig)))
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def run_shards(tmp: str, shard_count: int, users: int, rows: int):
+    for shard in range(shard_count):
+        engine = database.make_engine(_shard_url(tmp, shard_count, shard))
+        database.init_db(engine)
+        engine.dispose()
+
+    start, results = multiprocessing.Event(), multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_upload, args=(
+            _shard_url(tmp, shard_count, user_id % shard_count), user_id, rows, start, results))
+        for user_id in range(1, users + 1)
+    ]
+    for worker in workers:
+        worker.start()
+    time.sleep(1.0)  # let every worker finish generating its rows
+    start.set()
+    outcomes = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    elapsed = max(end for _, _, end, _ in outcomes) - min(began for _, began, _, _ in outcomes)
+    failed = sum(1 for *_, error in outcomes if error)
+    stored = (users - failed) * rows
+    print(f"{shard_count:>2} shard(s): {stored:,} rows stored in {elapsed:6.2f}s "
+          f"({stored / elapsed:>9,.0f} rows/s) | failed uploads {failed}/{users}")
+    return {'rows_per_second': stored / elapsed, 'failed': failed}
+
+
+def run(users: int, rows: int, shard_counts):
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {n: run_shards(tmp, n, users, rows) for n in shard_counts}
+    base = results[shard_counts[0]]['rows_per_second']
+    print(f"scaling vs {shard_counts[0]} shard(s): "
+          + ", ".join(f"{n}: {r['rows_per_second'] / base:.2f}x" for n, r in results.items())
+          + f" | CPUs: {os.cpu_count()}")
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--users", type=int, default=8)
+    ap.add_argument("--rows", type=int, default=50_000)
+    ap.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = ap.parse_args()
+    run(args.users, args.rows, args.shards)
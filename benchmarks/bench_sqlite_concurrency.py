@@ -0,0 +1,126 @@
+"""Read latency while an upload-sized write transaction runs, with and without the SQLite profile.
+
+A writer thread inserts a statement's worth of rows in one transaction, the
+way ingest_statement does, while reader threads keep fetching the first page
+of GET /transactions for another user. "default" is a plain engine
+(rollback journal, synchronous=FULL); "tuned" is database.make_engine (WAL,
+synchronous=NORMAL, busy_timeout, mmap, larger cache, pooled connections).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_sqlite_concurrency --rows 200000 --readers 4
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from backend.app import database, queries
+from backend.app.ingest import bulk_insert_transactions, TRANSACTION_INSERT_COLUMNS
+from benchmarks.bench_bulk_insert import make_rows
+
+PAGE_SIZE = 50
+
+
+def _engine(profile: str, path: str):
+    url = f"sqlite:///{path}"
+    if profile == "tuned":
+        return database.make_engine(url)
+    return create_engine(url, connect_args={"check_same_thread": False})
+
+
+def _insert_tuples(rows):
+    return [
+        tuple(row[c].isoformat() if c == 'date' else row[c] for c in TRANSACTION_INSERT_COLUMNS)
+        for row in rows
+    ]
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_profile(profile: str, path: str, rows: int, readers: int):
+    engine = _engine(profile, path)
+    database.init_db(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    # The readers' user already has some history
+    db = Session()
+    bulk_insert_transactions(db, _insert_tuples(make_rows(5000, user_id=2, seed=7)))
+    db.commit()
+    db.close()
+
+    upload = _insert_tuples(make_rows(rows, user_id=1))
+    writing = threading.Event()
+    done = threading.Event()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def writer():
+        session = Session()
+        try:
+            writing.set()
+            bulk_insert_transactions(session, upload)
+            session.commit()
+        finally:
+            session.close()
+            done.set()
+
+    def reader():
+        writing.wait()
+        while not done.is_set():
+            session = Session()
+            start = time.perf_counter()
+            try:
+                queries.keyset_page(queries.transaction_query(session, 2), None, PAGE_SIZE)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+            except OperationalError as e:
+                with lock:
+                    errors.append(str(e.orig))
+            finally:
+                session.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    write_start = time.perf_counter()
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    writer_thread.join()
+    write_seconds = time.perf_counter() - write_start
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    ms = [x * 1000 for x in latencies] or [float('nan')]
+    print(f"{profile:>7}: write {rows:,} rows in {write_seconds:6.2f}s | reads {len(latencies):>6,} "
+          f"p50 {statistics.median(ms):7.2f}ms p95 {_percentile(ms, 0.95):7.2f}ms "
+          f"max {max(ms):8.2f}ms | failed reads {len(errors)}")
+    return {'write_seconds': write_seconds, 'reads': len(latencies), 'errors': len(errors),
+            'p50_ms': statistics.median(ms), 'p95_ms': _percentile(ms, 0.95), 'max_ms': max(ms)}
+
+
+def run(rows: int, readers: int):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in ("default", "tuned"):
+            results[profile] = run_profile(profile, os.path.join(tmp, f"{profile}.db"), rows, readers)
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--readers", type=int, default=4)
+    args = ap.parse_args()
+    run(args.rows, args.readers)
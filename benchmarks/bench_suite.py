@@ -0,0 +1,272 @@
+"""Benchmark suite: parser, upload, inference and every MLService analytics method.
+
+For each history size a statement is generated (benchmarks.bench_parser) and
+these cases are timed:
+
+  parse_csv                 BankStatementParser.parse_csv on the statement
+  upload                    POST /upload through a TestClient until the job completes
+  ledger_build              Ledger.from_rows, the columnar snapshot analytics runs on
+  predict_category          single calls for up to SINGLE_CALLS rows, category cache cleared
+  predict_category_batch    one batch over every row, category cache cleared
+  detect_anomaly            single calls for up to SINGLE_CALLS rows
+  detect_anomaly_batch      one batch over every row
+  ml.<method>               each analytics method of MLService on the ledger / rollups
+
+Each case runs --repeat times (once above REPEAT_ROWS_LIMIT rows) and its
+fastest run is kept. Results are written as JSON (--output) and compared with
+a stored baseline (--baseline): a case more than --tolerance slower than its
+baseline is a regression and the exit status is 1. Baselines only compare
+like with like: regenerate one with --update-baseline on the machine that
+runs the comparison.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_suite --sizes 1000 100000 1000000
+    python -m benchmarks.bench_suite --sizes 1000 100000 --update-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+from backend.app import database
+from backend.app.ledger import Ledger
+from backend.app.ml import INSTRUMENTED_METHODS, ml_service
+from backend.app.parsers import BankStatementParser
+from benchmarks.bench_parser import write_statement
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Single-call inference cases stop after this many rows
+SINGLE_CALLS = 200
+# Larger histories are timed once whatever --repeat says
+REPEAT_ROWS_LIMIT = 100_000
+# Slowdowns smaller than this are timer noise, whatever the ratio
+NOISE_FLOOR_SECONDS = 0.005
+UPLOAD_TIMEOUT_SECONDS = 3600
+
+# Arguments for each analytics method, from the context built by _analytics_context
+ANALYTICS_CASES = {
+    'forecast_balance': lambda c: (c['ledger'],),
+    'forecast_from_daily': lambda c: (c['daily'],),
+    'calculate_analytics_summary': lambda c: (c['ledger'],),
+    'summarize_totals': lambda c: (c['totals'],),
+    'detect_subscriptions': lambda c: (c['ledger'],),
+    'detect_income_patterns': lambda c: (c['ledger'],),
+    'project_savings': lambda c: (c['ledger'],),
+    'project_savings_from_totals': lambda c: (c['totals'],),
+    'get_investment_suggestions': lambda c: (c['summary'],),
+    'predict_salary': lambda c: (c['ledger'],),
+    'generate_smart_budget': lambda c: (c['ledger'],),
+    'smart_budget_from_rollups': lambda c: (c['monthly'], c['totals']),
+    'simulate_purchase': lambda c: (5000.0, c['ledger']),
+    'detect_emergencies': lambda c: (c['ledger'], c['monthly'], c['totals']),
+    'analyze_spending_personality': lambda c: (c['ledger'],),
+    'plan_goal': lambda c: (20000.0, (date.today() + timedelta(days=365)).isoformat(), c['ledger']),
+}
+INFERENCE_METHODS = ('predict_category', 'detect_anomaly', 'predict_category_batch', 'detect_anomaly_batch')
+_unbenchmarked = set(INSTRUMENTED_METHODS) - set(ANALYTICS_CASES) - set(INFERENCE_METHODS)
+assert not _unbenchmarked, f"MLService methods without a benchmark case: {sorted(_unbenchmarked)}"
+
+
+def _time(fn, repeats: int, setup=None):
+    """(fastest, median) seconds of `repeats` calls of fn; setup runs untimed before each."""
+    timings = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+
+def _analytics_context(ledger: Ledger):
+    daily, monthly = ml_service._rollup_frames(ledger)
+    totals = ml_service._totals(ledger)
+    return {'ledger': ledger, 'daily': daily, 'monthly': monthly, 'totals': totals,
+            'summary': ml_service.summarize_totals(totals)}
+
+
+class UploadBench:
+    """The API on a scratch database; each upload goes to a new user."""
+
+    def __init__(self, tmp: str):
+        from fastapi.testclient import TestClient
+        from backend.app.main import app
+
+        engine = database.make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        self._saved = database.engine, database.SessionLocal
+        database.engine = engine
+        database.SessionLocal = sessionmaker(class_=database.RoutingSession, autocommit=False,
+                                             autoflush=False, bind=engine)
+        self.client = TestClient(app).__enter__()
+        self.users = 0
+
+    def new_user(self):
+        self.users += 1
+        username = f"bench{self.users}"
+        r = self.client.post("/auth/register", json={
+            "username": username, "email": f"{username}@bench.local", "password": "bench"
+        })
+        self.headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    def upload(self, path: str):
+        with open(path, "rb") as f:
+            r = self.client.post("/upload", files={"file": ("statement.csv", f)}, headers=self.headers)
+        job = r.json()
+        deadline = time.time() + UPLOAD_TIMEOUT_SECONDS
+        while job["status"] in ("queued", "running"):
+            if time.time() > deadline:
+                raise TimeoutError(f"upload job {job['job_id']} did not finish")
+            time.sleep(0.02)
+            job = self.client.get(f"/upload/jobs/{job['job_id']}", headers=self.headers).json()
+        if job["status"] != "completed":
+            raise RuntimeError(f"upload failed: {job['errors']}")
+
+    def close(self):
+        self.client.__exit__(None, None, None)
+        database.engine.dispose()
+        database.engine, database.SessionLocal = self._saved
+
+
+def run_size(rows: int, tmp: str, repeat: int, cases=None, uploads: UploadBench = None):
+    """Time every case (or those named in `cases`) on a `rows`-transaction history."""
+    repeats = repeat if rows <= REPEAT_ROWS_LIMIT else 1
+    wanted = (lambda name: cases is None or name in cases or name.split('.', 1)[-1] in cases)
+    results = {}
+
+    def record(name, fn, count, setup=None):
+        if not wanted(name):
+            return
+        fastest, median = _time(fn, repeats, setup)
+        results[f"{name}@{rows}"] = {
+            'case': name, 'size': rows, 'rows': count, 'repeats': repeats,
+            'seconds': round(fastest, 6), 'median_seconds': round(median, 6),
+            'rows_per_second': round(count / fastest, 1) if fastest else None,
+        }
+        print(f"{name:<36} {rows:>9,} rows | {fastest * 1000:11.2f}ms | {count / fastest:>13,.0f} rows/s")
+
+    path = os.path.join(tmp, f"statement_{rows}.csv")
+    write_statement(path, rows)
+    parser = BankStatementParser()
+    transactions = parser.parse_csv(path)
+    record('parse_csv', lambda: parser.parse_csv(path), rows)
+
+    if uploads is not None:
+        record('upload', lambda: uploads.upload(path), rows, setup=uploads.new_user)
+
+    ledger_rows = [(t.date, t.amount, t.category, t.description) for t in transactions]
+    record('ledger_build', lambda: Ledger.from_rows(ledger_rows), rows)
+    ledger = Ledger.from_rows(ledger_rows)
+    ledger.df  # built once and cached in production too
+
+    descriptions = [t.description for t in transactions]
+    amounts = [t.amount for t in transactions]
+    single = min(rows, SINGLE_CALLS)
+    clear_cache = ml_service.category_cache.clear
+    record('predict_category', lambda: [ml_service.predict_category(d, a) for d, a in
+                                        zip(descriptions[:single], amounts[:single])], single, clear_cache)
+    record('predict_category_batch', lambda: ml_service.predict_category_batch(descriptions, amounts),
+           rows, clear_cache)
+    record('detect_anomaly', lambda: [ml_service.detect_anomaly(a) for a in amounts[:single]], single)
+    record('detect_anomaly_batch', lambda: ml_service.detect_anomaly_batch(amounts), rows)
+
+    context = _analytics_context(ledger)
+    for method, arguments in ANALYTICS_CASES.items():
+        fn = getattr(ml_service, method)
+        args = arguments(context)
+        record(f"ml.{method}", lambda: fn(*args), rows)
+    return results
+
+
+def _metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'model_version': ml_service.model_version,
+    }
+
+
+def run(sizes, repeat: int = 3, cases=None, upload: bool = True):
+    ml_service.load_models()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        uploads = UploadBench(tmp) if upload and (cases is None or 'upload' in cases) else None
+        try:
+            for rows in sizes:
+                results.update(run_size(rows, tmp, repeat, cases, uploads))
+        finally:
+            if uploads is not None:
+                uploads.close()
+    return {'meta': _metadata(), 'results': results}
+
+
+def compare(current, baseline, tolerance: float):
+    """Regressions: cases more than `tolerance` (and NOISE_FLOOR_SECONDS) slower than the baseline."""
+    regressions = []
+    for key, result in current['results'].items():
+        base = baseline['results'].get(key)
+        if base is None:
+            print(f"{key:<46} new")
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] else float('inf')
+        slower = ratio > 1 + tolerance and result['seconds'] - base['seconds'] > NOISE_FLOOR_SECONDS
+        print(f"{key:<46} {base['seconds'] * 1000:11.2f}ms -> {result['seconds'] * 1000:11.2f}ms "
+              f"({ratio:5.2f}x){'  REGRESSION' if slower else ''}")
+        if slower:
+            regressions.append({'case': key, 'baseline_seconds': base['seconds'],
+                                'seconds': result['seconds'], 'ratio': round(ratio, 3)})
+    return regressions
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--cases", nargs="+", help="only these cases (e.g. parse_csv upload detect_emergencies)")
+    ap.add_argument("--no-upload", action="store_true", help="skip the /upload case")
+    ap.add_argument("--output", default="bench_results.json")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--tolerance", type=float, default=0.25,
+                    help="allowed slowdown vs the baseline (0.25 = 25%%)")
+    ap.add_argument("--update-baseline", action="store_true", help="store the results as the baseline")
+    args = ap.parse_args(argv)
+
+    current = run(args.sizes, args.repeat, args.cases, upload=not args.no_upload)
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"baseline updated: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; create one with --update-baseline")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.tolerance)
+    print(f"{len(regressions)} regression(s) against the baseline from commit {baseline['meta'].get('commit')}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -173,18 +173,19 @@ function App() {
 
   const fetchData = async (statementIds = []) => {
     try {
-      // Parallel fetch for speed
-      const [txns, spendingData, forecastData, budgetData, analyticsData, subsData, incomeData, savingsData, reminders] = await Promise.all([
+      // Parallel fetch for speed; all analytics panels come from one dashboard request
+      const [txns, budgetData, dashboard, reminders] = await Promise.all([
         api.getTransactions(statementIds),
-        api.getSpendingBreakdown(),
-        api.getForecast(),
         api.getBudgets(),
-        api.getAnalyticsSummary().catch(() => null),
-        api.getSubscriptions().catch(() => []),
-        api.getIncomePatterns().catch(() => []),
-        api.getSavingsProjection().catch(() => []),
+        api.getDashboard(),
         api.getBillReminders().catch(() => [])
       ]);
+      const spendingData = dashboard.spending;
+      const forecastData = dashboard.forecast;
+      const analyticsData = dashboard.summary && !dashboard.summary.error ? dashboard.summary : null;
+      const subsData = Array.isArray(dashboard.subscriptions) ? dashboard.subscriptions : [];
+      const incomeData = Array.isArray(dashboard.income_patterns) ? dashboard.income_patterns : [];
+      const savingsData = Array.isArray(dashboard.savings_projection) ? dashboard.savings_projection : [];
 
       setTransactions(txns);
 
@@ -214,14 +215,10 @@ function App() {
 
       // Phase 2: Fetch new analytics data
       try {
-        const [goalsData, emergencyData, personalityData] = await Promise.all([
-          api.getGoals().catch(() => []),
-          api.getEmergencies().catch(() => null),
-          api.getSpendingPersonality().catch(() => null)
-        ]);
+        const goalsData = await api.getGoals().catch(() => []);
         setGoals(goalsData);
-        setEmergencies(emergencyData);
-        setSpendingPersonality(personalityData);
+        setEmergencies(dashboard.emergencies && !dashboard.emergencies.error ? dashboard.emergencies : null);
+        setSpendingPersonality(dashboard.personality && !dashboard.personality.error ? dashboard.personality : null);
       } catch (e) {
         console.log("Phase 2 analytics not available yet");
       }
@@ -50,7 +50,7 @@ export const api = {
         return !!localStorage.getItem('finance_ai_token');
     },
 
-    uploadStatement: async (file) => {
+    uploadStatement: async (file, onProgress = null) => {
         const formData = new FormData();
         formData.append('file', file);
         const response = await axios.post(`${API_URL}/upload`, formData, {
@@ -59,6 +59,22 @@ export const api = {
             },
             timeout: 60000, // 60 second timeout for large files
         });
+
+        // Ingestion runs as a background job; poll until it finishes
+        let job = response.data;
+        while (job.status === 'queued' || job.status === 'running') {
+            await new Promise((resolve) => setTimeout(resolve, 1000));
+            job = await api.getUploadJob(job.job_id);
+            if (onProgress) onProgress(job);
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.errors.join('; ') || 'Upload failed');
+        }
+        return job;
+    },
+
+    getUploadJob: async (jobId) => {
+        const response = await axios.get(`${API_URL}/upload/jobs/${jobId}`);
         return response.data;
     },
 
@@ -71,6 +87,24 @@ export const api = {
         return response.data;
     },
 
+    // One page of transactions (newest first); pass the returned nextCursor to get the next one.
+    // filters: { start, end, category, min_amount, max_amount, is_anomaly, statement_ids, limit }
+    getTransactionPage: async (filters = {}, cursor = null) => {
+        const params = { ...filters };
+        if (cursor) params.cursor = cursor;
+        const response = await axios.get(`${API_URL}/transactions`, { params });
+        return { items: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+    },
+
+    // Full history as a downloadable Blob: format is 'ndjson', 'csv' or 'parquet'
+    exportTransactions: async (format = 'csv', filters = {}) => {
+        const response = await axios.get(`${API_URL}/transactions/export`, {
+            params: { ...filters, format },
+            responseType: 'blob'
+        });
+        return response.data;
+    },
+
     getSpendingBreakdown: async () => {
         const response = await axios.get(`${API_URL}/analytics/spending`);
         return response.data;
@@ -137,6 +171,14 @@ export const api = {
         return response.data;
     },
 
+    // All dashboard panels in one request; `panels` limits which are computed
+    getDashboard: async (panels = null, { days = 30, months = 12 } = {}) => {
+        const params = { days, months };
+        if (panels) params.panels = panels.join(',');
+        const response = await axios.get(`${API_URL}/dashboard`, { params });
+        return response.data;
+    },
+
     // Bill Reminders
     getBillReminders: async () => {
         const response = await axios.get(`${API_URL}/bill-reminders`);
@@ -0,0 +1,137 @@
+"""Versioned model registry shared by the training scripts and the API.
+
+Layout inside a model directory:
+
+    models/
+        versions/<version>/          one immutable artifact set
+            classifier_model.pkl ...
+            manifest.json            version, parent, per-artifact sha256 / size / trained_at
+        CURRENT                      name of the version workers should serve
+
+Training scripts call publish_version() after writing their artifacts. API
+workers poll current_version() and swap to a new version without restarting.
+Directories without a registry keep working: the flat *.pkl files are served
+as the "legacy" version.
+"""
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+LEGACY_VERSION = "legacy"
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def version_dir(model_dir: str, version: str) -> str:
+    if version == LEGACY_VERSION:
+        return model_dir
+    return os.path.join(model_dir, VERSIONS_DIR, version)
+
+
+def current_version(model_dir: str) -> Optional[str]:
+    """Version named by the CURRENT pointer, or None if no version was ever published."""
+    try:
+        with open(os.path.join(model_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_manifest(model_dir: str, version: str) -> Dict:
+    if version == LEGACY_VERSION:
+        return {'version': LEGACY_VERSION, 'artifacts': {}}
+    with open(os.path.join(version_dir(model_dir, version), MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def list_versions(model_dir: str) -> List[str]:
+    root = os.path.join(model_dir, VERSIONS_DIR)
+    if not os.path.isdir(root):
+        return []
+    return sorted(v for v in os.listdir(root)
+                  if os.path.isfile(os.path.join(root, v, MANIFEST_FILE)))
+
+
+def set_current(model_dir: str, version: str):
+    """Atomically point CURRENT at `version` (write a temp file, then os.replace)."""
+    if not os.path.isfile(os.path.join(version_dir(model_dir, version), MANIFEST_FILE)):
+        raise ValueError(f"Unknown model version: {version}")
+    tmp_path = os.path.join(model_dir, f".{CURRENT_FILE}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(model_dir, CURRENT_FILE))
+
+
+def publish_version(model_dir: str, artifact_names: List[str], activate: bool = True) -> str:
+    """Snapshot freshly trained artifacts from model_dir into a new registry version.
+
+    Artifacts not retrained this run are carried over from the current version (or
+    from the legacy flat files), keeping their original checksum and trained_at.
+    The version directory is fully written before CURRENT moves, so readers only
+    ever see complete artifact sets.
+    """
+    now = datetime.now(timezone.utc)
+    version = now.strftime("%Y%m%dT%H%M%S%fZ")
+    parent = current_version(model_dir) or LEGACY_VERSION
+    parent_dir = version_dir(model_dir, parent)
+    parent_artifacts = load_manifest(model_dir, parent).get('artifacts', {})
+
+    staging = os.path.join(model_dir, VERSIONS_DIR, f".staging-{version}")
+    os.makedirs(staging)
+    artifacts = {}
+
+    # Carry over everything the parent served that wasn't retrained
+    carried = set(parent_artifacts) if parent != LEGACY_VERSION else {
+        name for name in os.listdir(parent_dir) if name.endswith('.pkl')
+    }
+    for name in sorted(carried - set(artifact_names)):
+        src = os.path.join(parent_dir, name)
+        if not os.path.isfile(src):
+            continue
+        shutil.copy2(src, os.path.join(staging, name))
+        artifacts[name] = parent_artifacts.get(name) or {
+            'sha256': sha256_file(src),
+            'size': os.path.getsize(src),
+            'trained_at': datetime.fromtimestamp(os.path.getmtime(src), timezone.utc).isoformat()
+        }
+
+    for name in artifact_names:
+        src = os.path.join(model_dir, name)
+        shutil.copy2(src, os.path.join(staging, name))
+        artifacts[name] = {
+            'sha256': sha256_file(src),
+            'size': os.path.getsize(src),
+            'trained_at': now.isoformat()
+        }
+
+    with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+        json.dump({
+            'version': version,
+            'parent': parent,
+            'created_at': now.isoformat(),
+            'artifacts': artifacts
+        }, f, indent=2, sort_keys=True)
+
+    os.rename(staging, version_dir(model_dir, version))
+    if activate:
+        set_current(model_dir, version)
+    print(f"Published model version {version} (parent: {parent})")
+    return version
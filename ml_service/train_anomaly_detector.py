@@ -2,6 +2,7 @@ import pandas as pd
 from sklearn.ensemble import IsolationForest
 import pickle
 import os
+from registry import publish_version
 
 def train_anomaly_detector(data_path, model_dir):
     print("Loading data...")
@@ -24,6 +25,9 @@ def train_anomaly_detector(data_path, model_dir):
     with open(os.path.join(model_dir, 'anomaly_model.pkl'), 'wb') as f:
         pickle.dump(model, f)
         
+    # Snapshot into a new registry version; running API workers pick it up without a restart
+    publish_version(model_dir, ['anomaly_model.pkl'])
+        
     print("Training complete.")
 
 if __name__ == "__main__":
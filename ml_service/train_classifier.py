@@ -1,11 +1,13 @@
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import LabelEncoder
 import pickle
 import os
+from registry import publish_version
 
 def train_categorization_model(data_path, model_dir):
     print("Loading data...")
@@ -14,10 +16,10 @@ def train_categorization_model(data_path, model_dir):
     # Text preprocessing
     print("Vectorizing descriptions...")
     tfidf = TfidfVectorizer(max_features=1000, stop_words='english')
-    X_tfidf = tfidf.fit_transform(df['description']).toarray()
+    X_tfidf = tfidf.fit_transform(df['description'])
     
-    # Feature engineering: Add amount as feature
-    X = np.hstack((X_tfidf, df['amount'].values.reshape(-1, 1)))
+    # Feature engineering: Add amount as feature (kept sparse; never densify N x 1000)
+    X = sparse.hstack((X_tfidf, sparse.csr_matrix(df['amount'].values.reshape(-1, 1))), format='csr')
     
     # Encode labels
     le = LabelEncoder()
@@ -26,7 +28,7 @@ def train_categorization_model(data_path, model_dir):
     # Train/Test Split
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
-    # Train GradientBoostingClassifier
+    # Train GradientBoostingClassifier (accepts sparse CSR/CSC input directly)
     print("Training GradientBoostingClassifier...")
     model = GradientBoostingClassifier(n_estimators=100, learning_rate=0.1, max_depth=3, random_state=42)
     model.fit(X_train, y_train)
@@ -46,6 +48,9 @@ def train_categorization_model(data_path, model_dir):
         
     with open(os.path.join(model_dir, 'classifier_model.pkl'), 'wb') as f:
         pickle.dump(model, f)
+
+    # Snapshot into a new registry version; running API workers pick it up without a restart
+    publish_version(model_dir, ['tfidf.pkl', 'label_encoder.pkl', 'classifier_model.pkl'])
     print("Training complete.")
 
 if __name__ == "__main__":
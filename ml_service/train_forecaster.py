@@ -2,6 +2,7 @@ import pandas as pd
 from prophet import Prophet
 import pickle
 import os
+from registry import publish_version
 
 def train_forecaster(data_path, model_dir):
     print("Loading data...")
@@ -31,6 +32,9 @@ def train_forecaster(data_path, model_dir):
     with open(os.path.join(model_dir, 'prophet_model.pkl'), 'wb') as f:
         pickle.dump(model, f)
         
+    # Snapshot into a new registry version; running API workers pick it up without a restart
+    publish_version(model_dir, ['prophet_model.pkl'])
+        
     print("Training complete.")
 
 if __name__ == "__main__":
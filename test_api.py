@@ -0,0 +1,634 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.app import conditional, database, ledger, models, rollups
+from backend.app.ml import ml_service
+from backend.app.main import app
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Startup migrates the empty database, so every test also exercises the migrations
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    with TestClient(app) as c:
+        yield c
+
+def auth_headers(client, username="alice"):
+    r = client.post("/auth/register", json={"username": username, "email": f"{username}@x.io", "password": "pw"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+def upload(client, headers, csv, filename="statement.csv"):
+    r = client.post("/upload", files={"file": (filename, csv.encode())}, headers=headers)
+    assert r.status_code == 202
+    job = r.json()
+    deadline = time.time() + 30
+    while job["status"] in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.05)
+        job = client.get(f"/upload/jobs/{job['job_id']}", headers=headers).json()
+    return job
+
+def test_upload_runs_as_background_job(client):
+    headers = auth_headers(client)
+    csv = "Date,Description,Amount,Category\n2023-01-01,Grocery,-50.00,Food\n2023-01-02,Salary,2000.00,Income"
+    job = upload(client, headers, csv)
+    assert job["status"] == "completed"
+    assert job["rows_processed"] == 2
+    assert job["errors"] == []
+
+    statements = client.get("/statements", headers=headers).json()
+    assert [(s["id"], s["transaction_count"]) for s in statements] == [(job["statement_id"], 2)]
+    assert len(client.get("/transactions", headers=headers).json()) == 2
+
+    # Jobs are private to the user who started them
+    other = auth_headers(client, "bob")
+    assert client.get(f"/upload/jobs/{job['job_id']}", headers=other).status_code == 404
+
+def test_failed_upload_reports_error_and_leaves_nothing(client):
+    headers = auth_headers(client)
+    job = upload(client, headers, "")
+    assert job["status"] == "failed"
+    assert job["errors"]
+    assert client.get("/statements", headers=headers).json() == []
+
+def test_anomalies_are_scored_against_the_users_own_stats(client):
+    headers = auth_headers(client)
+    rows = "\n".join(f"2023-01-{day:02d},Grocery,-{40 + day % 5}.00,Food" for day in range(1, 21))
+    job = upload(client, headers, "Date,Description,Amount,Category\n" + rows)
+    assert job["status"] == "completed"
+
+    def create(amount):
+        r = client.post("/transactions", headers=headers, json={
+            "date": "2023-02-01", "description": "Grocery", "amount": amount, "category": "Food"
+        })
+        return r.json()
+
+    assert create(-43.0)["is_anomaly"] is False
+    big = create(-900.0)
+    assert big["is_anomaly"] is True
+
+    # Stats follow updates and deletes without rescanning history
+    assert client.put(f"/transactions/{big['id']}", headers=headers, json={"amount": -44.0}).json()["is_anomaly"] is False
+    client.delete(f"/statements/{job['statement_id']}", headers=headers)
+    db = database.SessionLocal()
+    try:
+        user = db.query(models.UserDB).filter(models.UserDB.username == "alice").one()
+        stats = db.get(models.AnomalyStatsDB, (user.id, "Food"))
+        assert (stats.count, round(stats.total, 6)) == (2, -87.0)
+    finally:
+        db.close()
+
+def test_analytics_share_a_cached_ledger_invalidated_by_writes(client):
+    headers = auth_headers(client)
+    csv = "Date,Description,Amount,Category\n2023-01-01,Grocery,-50.00,Food\n2023-01-02,Salary,2000.00,Income"
+    upload(client, headers, csv)
+
+    stats = ledger.cache_stats()
+    client.get("/analytics/subscriptions", headers=headers)
+    client.get("/analytics/income-patterns", headers=headers)
+    client.get("/analytics/personality", headers=headers)
+    assert ledger.cache_stats()["hits"] - stats["hits"] == 2
+
+    client.post("/transactions", headers=headers, json={
+        "date": "2023-01-03", "description": "SALARY", "amount": 2000.0, "category": "Income"
+    })
+    patterns = client.get("/analytics/income-patterns", headers=headers).json()
+    assert [(p["source"], p["occurrences"]) for p in patterns] == [("SALARY", 2)]
+
+def test_aggregate_endpoints_run_in_sql_with_date_filters(client):
+    headers = auth_headers(client)
+    csv = ("Date,Description,Amount,Category\n2023-01-15,Grocery,-50.00,Food\n2023-01-20,Salary,2000.00,Income\n"
+           "2023-02-14,Cinema,-20.00,Fun\n2023-02-16,Grocery,-30.00,Food")
+    upload(client, headers, csv)
+
+    spending = client.get("/analytics/spending", headers=headers).json()
+    assert spending == {"Food": 80.0, "Fun": 20.0}
+    assert client.get("/analytics/spending?start=2023-02-01", headers=headers).json() == {"Food": 30.0, "Fun": 20.0}
+
+    summary = client.get("/analytics/summary", headers=headers).json()
+    assert (summary["total_income"], summary["total_expenses"], summary["current_balance"]) == (2000.0, 100.0, 1900.0)
+    january = client.get("/analytics/summary?end=2023-01-31", headers=headers).json()
+    assert (january["total_income"], january["total_expenses"]) == (2000.0, 50.0)
+
+    projection = client.get("/analytics/savings-projection?months=1&start=2023-02-01", headers=headers).json()
+    assert [p["month"] for p in projection] == ["2023-02", "2023-03"]
+    assert projection[0]["projected_balance"] == -50.0
+
+def test_rollups_track_every_write_path(client):
+    headers = auth_headers(client)
+    csv = ("Date,Description,Amount,Category\n2023-01-15,Grocery,-50.00,Food\n2023-01-20,Salary,2000.00,Income\n"
+           "2023-02-14,Cinema,-20.00,Fun\n2023-02-16,Grocery,-30.00,Food")
+    first = upload(client, headers, csv)
+    upload(client, headers, csv.replace("2023-0", "2023-1"))
+    created = [client.post("/transactions", headers=headers, json={
+        "date": f"2023-03-{day}", "description": "Taxi", "amount": -15.0 * day, "category": "Travel"
+    }).json() for day in (20, 21, 22)]
+    client.put(f"/transactions/{created[0]['id']}", headers=headers, json={"amount": -99.0, "category": "Fun"})
+    client.delete(f"/transactions/{created[1]['id']}", headers=headers)
+    client.post("/transactions/bulk-delete", headers=headers, json=[created[2]["id"]])
+    client.delete(f"/statements/{first['statement_id']}", headers=headers)
+
+    db = database.SessionLocal()
+    try:
+        user = db.query(models.UserDB).filter(models.UserDB.username == "alice").one()
+        daily, monthly = rollups.daily_frame(db, user.id), rollups.monthly_frame(db, user.id)
+        rollups.rebuild(db, user.id)
+        assert daily.equals(rollups.daily_frame(db, user.id))
+        assert monthly.equals(rollups.monthly_frame(db, user.id))
+        assert list(monthly["month"]) == ["2023-03", "2023-11", "2023-11", "2023-12", "2023-12"]
+
+        txns = db.query(models.TransactionDB).filter(models.TransactionDB.user_id == user.id).all()
+        assert client.get("/analytics/forecast?days=3", headers=headers).json() == ml_service.forecast_balance(txns, 3)
+    finally:
+        db.rollback()
+        db.close()
+
+def test_dashboard_matches_individual_endpoints(client):
+    headers = auth_headers(client)
+    csv = ("Date,Description,Amount,Category\n2023-01-15,Grocery,-50.00,Food\n2023-01-20,Salary,2000.00,Income\n"
+           "2023-02-14,Cinema,-20.00,\n2023-02-16,Grocery,-30.00,Food\n2023-02-20,Salary,2000.00,Income")
+    upload(client, headers, csv)
+
+    board = client.get("/dashboard?days=5&months=2", headers=headers).json()
+    endpoints = {
+        "summary": "/analytics/summary", "spending": "/analytics/spending",
+        "forecast": "/analytics/forecast?days=5", "subscriptions": "/analytics/subscriptions",
+        "income_patterns": "/analytics/income-patterns", "savings_projection": "/analytics/savings-projection?months=2",
+        "emergencies": "/analytics/emergencies", "personality": "/analytics/personality",
+    }
+    assert set(board) == set(endpoints)
+    for panel, url in endpoints.items():
+        assert board[panel] == client.get(url, headers=headers).json(), panel
+
+    assert set(client.get("/dashboard?panels=summary,forecast", headers=headers).json()) == {"summary", "forecast"}
+    assert client.get("/dashboard?panels=nope", headers=headers).status_code == 400
+
+def test_conditional_get_uses_per_user_data_version(client):
+    headers = auth_headers(client)
+    client.post("/budgets", headers=headers, json={"category": "Food", "amount": 300.0})
+
+    first = client.get("/analytics/summary", headers=headers)
+    etag = first.headers["etag"]
+    assert client.get("/budgets", headers=headers).headers["etag"] != etag
+
+    stats = conditional.cache_stats()
+    again = client.get("/analytics/summary", headers={**headers, "If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["etag"] == etag
+    assert client.get("/analytics/summary", headers=headers).json() == first.json()
+    assert conditional.cache_stats()["hits"] == stats["hits"] + 1
+
+    # Row listings get ETags but aren't kept; computed bodies are, until the user writes
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    user_key = (database.url_key(database.engine), user_id)
+    cached = lambda: [key for key in conditional._results._data if key[:2] == user_key]
+    assert [key[3] for key in cached()] == ["/analytics/summary?"]
+
+    # Any write moves the version, for transactions and everything else
+    client.post("/goals", headers=headers, json={"name": "Trip", "target_amount": 1000.0, "deadline": "2030-01-01"})
+    assert cached() == []
+    after_goal = client.get("/analytics/summary", headers={**headers, "If-None-Match": etag})
+    assert after_goal.status_code == 200 and after_goal.headers["etag"] != etag
+    client.post("/transactions", headers=headers, json={
+        "date": "2023-01-03", "description": "Cinema", "amount": -20.0, "category": "Fun"
+    })
+    fresh = client.get("/analytics/summary", headers={**headers, "If-None-Match": after_goal.headers["etag"]})
+    assert fresh.status_code == 200 and fresh.json()["total_expenses"] == 20.0
+
+    # ETags are per user
+    other = auth_headers(client, "bob")
+    assert client.get("/analytics/summary", headers={**other, "If-None-Match": fresh.headers["etag"]}).status_code == 200
+
+def test_transactions_keyset_pagination_and_filters(client):
+    headers = auth_headers(client)
+    rows = [f"2023-0{1 + i % 3}-{10 + i % 7},Item {i},-{i + 1}.00,{'Food' if i % 2 else 'Fun'}" for i in range(25)]
+    upload(client, headers, "Date,Description,Amount,Category\n" + "\n".join(rows))
+
+    everything = client.get("/transactions", headers=headers).json()
+    assert len(everything) == 25
+    assert [(t["date"], t["id"]) for t in everything] == sorted(((t["date"], t["id"]) for t in everything), reverse=True)
+
+    seen, cursor = [], None
+    while True:
+        r = client.get("/transactions", headers=headers, params={"limit": 7, **({"cursor": cursor} if cursor else {})})
+        seen += r.json()
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert seen == everything
+
+    food = client.get("/transactions", headers=headers, params={
+        "category": "Food", "start": "2023-02-01", "max_amount": -5
+    }).json()
+    assert food and all(t["category"] == "Food" and t["date"] >= "2023-02-01" and t["amount"] <= -5 for t in food)
+    assert client.get("/transactions?cursor=garbage", headers=headers).status_code == 400
+
+def test_export_streams_every_format(client):
+    import csv, io, json
+    headers = auth_headers(client)
+    rows = [f"2023-01-{10 + i % 15},Item {i},-{i + 1}.00,Food" for i in range(30)]
+    upload(client, headers, "Date,Description,Amount,Category\n" + "\n".join(rows))
+    ids = sorted(t["id"] for t in client.get("/transactions", headers=headers).json())
+
+    ndjson = client.get("/transactions/export", headers=headers)
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["id"] for line in ndjson.text.splitlines()] == ids
+
+    exported = list(csv.DictReader(io.StringIO(client.get("/transactions/export?format=csv", headers=headers).text)))
+    assert [int(r["id"]) for r in exported] == ids and exported[0]["category"] == "Food"
+
+    filtered = client.get("/transactions/export?format=ndjson&max_amount=-29", headers=headers).text.splitlines()
+    assert len(filtered) == 2
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pq.read_table(io.BytesIO(client.get("/transactions/export?format=parquet", headers=headers).content))
+    assert table.column("id").to_pylist() == ids
+
+    assert client.get("/transactions/export?format=xml", headers=headers).status_code == 400
+
+def test_migrations_build_the_model_schema_and_adopt_old_databases(tmp_path):
+    from alembic import command
+    from alembic.autogenerate import compare_metadata
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from sqlalchemy import inspect, text
+
+    migrated = database.make_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    database.init_db(migrated)
+    with migrated.connect() as conn:
+        assert compare_metadata(MigrationContext.configure(conn), models.Base.metadata) == []
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+
+    # A database created by the old create_all() call (the baseline tables, no
+    # alembic_version) is stamped, not re-created, and brought up to date
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    config = Config(database.ALEMBIC_INI)
+    with legacy.begin() as conn:
+        config.attributes['connection'] = conn
+        command.upgrade(config, database.BASELINE_REVISION)
+        conn.execute(text("DROP TABLE alembic_version"))
+        conn.execute(text("INSERT INTO transactions (user_id, date, description, amount, category) VALUES "
+                          "(1, '2023-01-05', 'Grocery', -40.0, 'Food'), (1, '2023-01-05', 'Salary', 900.0, NULL), "
+                          "(1, '2023-02-01', 'Cinema', -12.5, ''), (2, '2023-02-03', 'Grocery', -7.0, 'Food')"))
+    added_tables = {"anomaly_stats", "user_versions", "daily_rollups", "monthly_category_rollups"}
+    added_indexes = {"ix_transactions_user_date_id", "ix_transactions_user_category"}
+
+    def schema():
+        inspector = inspect(legacy)
+        return (set(inspector.get_table_names()),
+                {index["name"] for index in inspector.get_indexes("transactions")},
+                {column["name"] for column in inspector.get_columns("users")})
+    tables, indexes, user_columns = schema()
+    assert not tables & (added_tables | {"alembic_version"}) and not indexes & added_indexes
+    assert "shard" not in user_columns
+
+    database.init_db(legacy)
+    tables, indexes, user_columns = schema()
+    assert added_tables <= tables and added_indexes <= indexes  # 0002
+    assert "shard" in user_columns  # 0003
+    with legacy.connect() as conn:
+        assert compare_metadata(MigrationContext.configure(conn), models.Base.metadata) == []
+        head = MigrationContext.configure(conn).get_current_revision()
+    assert head == "0004_backfill_derived_state"
+
+    # Derived state for the old transactions is built once, by the migrations
+    # (0004), and matches what the application's rebuild computes
+    derived = ("daily_rollups", "monthly_category_rollups", "anomaly_stats", "user_versions")
+    def snapshot():
+        with legacy.connect() as conn:
+            return {table: sorted(conn.execute(text(f"SELECT * FROM {table}")).all()) for table in derived}
+    migrated_state = snapshot()
+    assert [row[:3] for row in migrated_state["daily_rollups"]] == [
+        (1, "2023-01-05", 900.0), (1, "2023-02-01", 0.0), (2, "2023-02-03", 0.0)]
+    from backend.app import changes
+    db = sessionmaker(bind=legacy)()
+    try:
+        for user_id in (1, 2):
+            changes.rebuild(db, user_id)
+        db.commit()
+    finally:
+        db.close()
+    rebuilt = snapshot()
+    # rebuild() bumps the versions once more
+    assert migrated_state["user_versions"] == [(1, 1, 1), (2, 1, 1)]
+    assert rebuilt["user_versions"] == [(1, 2, 2), (2, 2, 2)]
+    assert {t: rows for t, rows in rebuilt.items() if t != "user_versions"} == \
+        {t: rows for t, rows in migrated_state.items() if t != "user_versions"}
+
+def test_async_endpoints_offload_analytics_from_the_event_loop(client, monkeypatch):
+    import threading
+    headers = auth_headers(client)
+    client.post("/transactions", json={"date": "2023-01-15", "description": "Netflix", "amount": -15.0,
+                                       "category": "Entertainment"}, headers=headers)
+    threads = []
+    original = ml_service.detect_subscriptions
+    def spy(transactions):
+        threads.append(threading.current_thread().name)
+        return original(transactions)
+    monkeypatch.setattr(ml_service, "detect_subscriptions", spy)
+
+    assert client.get("/analytics/subscriptions", headers=headers).status_code == 200
+    assert threads and threads[0].startswith("ml")
+    # So do the history fetch behind a ledger rebuild and the rollup frames
+    from backend.app import ledger, rollups
+    for module, name in ((ledger, "ledger_rows"), (rollups, "daily_frame"), (rollups, "monthly_frame")):
+        loader = getattr(module, name)
+        monkeypatch.setattr(module, name, lambda db, *a, _l=loader, **kw: (
+            threads.append(threading.current_thread().name), _l(db, *a, **kw))[1])
+    ledger._ledgers.clear()
+    conditional._results.clear()
+    threads.clear()
+    assert client.get("/analytics/subscriptions", headers=headers).status_code == 200
+    assert client.get("/analytics/forecast", headers=headers).status_code == 200
+    assert len(threads) == 3 and all(name.startswith("ml") for name in threads)
+    # The dashboard loads its rollup frames the same way
+    conditional._results.clear()
+    threads.clear()
+    assert client.get("/dashboard?panels=forecast,spending", headers=headers).status_code == 200
+    assert len(threads) == 2 and all(name.startswith("ml") for name in threads)
+    # One sessionmaker per directory database, not one per request
+    assert database.async_session_factory() is database.async_session_factory()
+    # Reads on the async engine see writes made through the sync one
+    client.post("/budgets", json={"category": "Food", "amount": 100}, headers=headers)
+    assert [b["category"] for b in client.get("/budgets", headers=headers).json()] == ["Food"]
+
+@pytest.fixture
+def sharded_client(tmp_path, monkeypatch):
+    directory = database.make_engine(f"sqlite:///{tmp_path / 'directory.db'}")
+    monkeypatch.setattr(database, "SHARD_COUNT", 2)
+    monkeypatch.setattr(database, "SHARD_URL_TEMPLATE", f"sqlite:///{tmp_path}/shard{{shard}}.db")
+    monkeypatch.setattr(database, "_shard_engines", {})
+    monkeypatch.setattr(database, "engine", directory)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(
+        class_=database.RoutingSession, autocommit=False, autoflush=False, bind=directory))
+    with TestClient(app) as c:
+        yield c
+
+def test_unsharded_writes_skip_the_shard_check(client, monkeypatch):
+    from sqlalchemy import event
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(
+        class_=database.RoutingSession, autocommit=False, autoflush=False, bind=database.engine))
+    headers = auth_headers(client)
+    checks = []
+    def count(conn, cursor, statement, *args):
+        if statement.startswith("SELECT users.shard"):
+            checks.append(statement)
+    event.listen(database.engine, "before_cursor_execute", count)
+    coffee = {"date": "2023-01-16", "description": "Coffee", "amount": -4.0, "category": "Food"}
+    try:
+        assert client.post("/transactions", json=coffee, headers=headers).status_code == 200
+        assert checks == []
+        # With sharding on the same write re-reads the user's shard before committing
+        monkeypatch.setattr(database, "SHARD_COUNT", 2)
+        assert client.post("/transactions", json=coffee, headers=headers).status_code == 200
+        assert len(checks) == 1
+    finally:
+        event.remove(database.engine, "before_cursor_execute", count)
+
+def test_sharded_storage_routes_users_and_rebalances(sharded_client, monkeypatch):
+    from sqlalchemy import func
+    from backend.app import rebalance
+    client = sharded_client
+    alice, bob = auth_headers(client, "alice"), auth_headers(client, "bob")
+    upload(client, alice, "Date,Description,Amount,Category\n2023-01-15,Salary,3000,Income\n2023-01-20,Rent,-1200,Rent")
+    client.post("/transactions", json={"date": "2023-01-16", "description": "Coffee", "amount": -4.0,
+                                       "category": "Food"}, headers=bob)
+
+    def stored(shard):
+        db = database.shard_session(shard)
+        try:
+            return dict(db.query(models.TransactionDB.user_id, func.count()).group_by(models.TransactionDB.user_id).all())
+        finally:
+            db.close()
+    # alice (id 1) lives on shard 1, bob (id 2) on shard 0, nothing in the directory
+    assert stored(1) == {1: 2} and stored(0) == {2: 1} and stored(None) == {}
+    assert len(client.get("/transactions", headers=alice).json()) == 2
+    assert client.get("/analytics/summary", headers=bob).json()["total_expenses"] == 4.0
+    assert len(client.get("/transactions/export", headers=alice).text.splitlines()) == 2
+
+    # Back into the directory database; statements stay linked to their transactions.
+    # The API keeps its cached principals, like a worker the rebalancer can't reach.
+    with monkeypatch.context() as m:
+        m.setattr(rebalance.auth, "invalidate_user", lambda *args: None)
+        assert {(user, target) for user, _, target in rebalance.rebalance(0)} == {(1, None), (2, None)}
+    assert stored(None) == {1: 2, 2: 1} and stored(0) == {} and stored(1) == {}
+
+    # A write routed by the stale principal is refused, not left on the old shard for sweep()
+    coffee = {"date": "2023-01-17", "description": "Coffee", "amount": -5.0, "category": "Food"}
+    refused = client.post("/transactions", json=coffee, headers=bob)
+    assert refused.status_code == 503 and refused.headers["Retry-After"] == "1"
+    assert stored(0) == {}
+    assert client.post("/transactions", json=coffee, headers=bob).status_code == 200
+    assert stored(None) == {1: 2, 2: 2}
+    rebalance.auth.invalidate_user(1, "alice")  # alice's cached principal expires
+    statement = client.get("/statements", headers=alice).json()[0]
+    assert statement["transaction_count"] == 2
+    assert len(client.get(f"/transactions?statement_ids={statement['id']}", headers=alice).json()) == 2
+
+def test_authenticated_users_are_cached_per_token_subject(client, monkeypatch):
+    from jose import jwt
+    from backend.app import auth
+    from backend.app.cache import LRUCache
+    headers = auth_headers(client, "carol")
+    token = headers["Authorization"].split()[1]
+    assert jwt.get_unverified_claims(token)["uid"] == client.get("/auth/me", headers=headers).json()["id"]
+
+    stats = auth.cache_stats()
+    for _ in range(3):
+        assert client.get("/budgets", headers=headers).status_code == 200
+    assert auth.cache_stats()["hits"] - stats["hits"] == 3
+
+    # Tokens issued before `uid` existed still authenticate, by username
+    legacy = {"Authorization": f"Bearer {auth.create_access_token(data={'sub': 'carol'})}"}
+    assert client.get("/auth/me", headers=legacy).json()["username"] == "carol"
+
+    clock = [100.0]
+    monkeypatch.setattr("backend.app.cache.time.monotonic", lambda: clock[0])
+    cache = LRUCache(10, ttl=5)
+    cache.put("k", 1)
+    clock[0] += 4
+    assert cache.get("k") == 1
+    clock[0] += 2
+    assert cache.get("k") is None
+
+def test_login_is_throttled_per_username_and_hashing_is_bounded(client, monkeypatch):
+    from backend.app import passwords
+    monkeypatch.setattr(passwords, "login_throttle", passwords.LoginThrottle(max_failures=3, window=60))
+    auth_headers(client, "dave")
+    auth_headers(client, "erin")
+    assert client.post("/auth/login", json={"username": "dave", "password": "pw"}).status_code == 200
+
+    for _ in range(3):
+        assert client.post("/auth/login", json={"username": "dave", "password": "wrong"}).status_code == 401
+    locked = client.post("/auth/login", json={"username": "dave", "password": "pw"})
+    assert locked.status_code == 429 and int(locked.headers["Retry-After"]) > 0
+    # Other usernames are unaffected
+    assert client.post("/auth/login", json={"username": "erin", "password": "pw"}).status_code == 200
+
+    # Concurrent guesses can't all slip past the limit while their hashes run
+    from collections import Counter
+    from concurrent.futures import ThreadPoolExecutor
+    auth_headers(client, "frank")
+    guess = lambda _: client.post("/auth/login", json={"username": "frank", "password": "wrong"}).status_code
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert Counter(pool.map(guess, range(8))) == {401: 3, 429: 5}
+
+    stats = passwords.hash_pool.stats()
+    assert stats["completed"] > 0 and stats["in_flight"] == 0
+    monkeypatch.setattr(passwords.hash_pool, "queue_limit", 0)
+    for _ in range(3):
+        busy = client.post("/auth/login", json={"username": "erin", "password": "pw"})
+        assert busy.status_code == 503
+    assert passwords.hash_pool.stats()["rejected"] == stats["rejected"] + 3
+    # Refused attempts were never verified, so they don't count as failures
+    monkeypatch.setattr(passwords.hash_pool, "queue_limit", passwords.HASH_QUEUE_LIMIT)
+    assert client.post("/auth/login", json={"username": "erin", "password": "pw"}).status_code == 200
+
+def test_metrics_expose_request_ml_upload_and_cache_figures(client, caplog):
+    import threading
+    from backend.app import metrics
+    headers = auth_headers(client)
+    csv = "Date,Description,Amount\n2023-01-01,Grocery,-50.00\n2023-01-02,Salary,2000.00"
+    assert upload(client, headers, csv)["status"] == "completed"
+    before = metrics.REQUEST_SECONDS.count(route="/analytics/summary", method="GET", status="200")
+    queries = metrics.REQUEST_DB_QUERIES.count(route="/transactions")
+    assert client.get("/analytics/summary", headers=headers).status_code == 200
+    assert client.get("/transactions", headers=headers).status_code == 200
+    assert client.get("/transactions/999", headers=headers).status_code in (404, 405)
+
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = r.text
+    assert metrics.REQUEST_SECONDS.count(route="/analytics/summary", method="GET", status="200") == before + 1
+    # Route templates label requests, never raw paths
+    assert 'route="/upload/jobs/{job_id}"' in text and "/transactions/999" not in text
+    assert metrics.REQUEST_DB_QUERIES.count(route="/transactions") == queries + 1
+    assert metrics.REQUEST_DB_QUERIES._values[("/transactions",)][0][0] == 0  # never zero queries
+    assert "http_requests_in_flight 1" in text  # the scrape itself
+    assert 'ml_method_rows_total{method="predict_category_batch"}' in text
+    assert 'upload_rows_total{status="completed"}' in text and "upload_rows_per_second_count" in text
+    for cache in ("ledger", "conditional", "auth", "category"):
+        assert f'cache_hit_ratio{{cache="{cache}"}}' in text
+
+    # Statements run on the ML threads (a ledger rebuild) count towards their request
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    ran = []
+    count = lambda *args: ran.append(threading.current_thread().name)
+    event.listen(Engine, "before_cursor_execute", count)
+    try:
+        total = lambda: metrics.REQUEST_DB_QUERIES._values[("/analytics/subscriptions",)][1][0]
+        assert client.get("/analytics/subscriptions", headers=headers).status_code == 200
+        before = total()
+        ledger._ledgers.clear()
+        conditional._results.clear()
+        ran.clear()
+        assert client.get("/analytics/subscriptions", headers=headers).status_code == 200
+    finally:
+        event.remove(Engine, "before_cursor_execute", count)
+    assert any(name.startswith("ml") for name in ran) and total() - before == len(ran)
+
+    # A failing collector is logged with its traceback and the rest is still scraped
+    registry = metrics.Registry()
+    registry.counter("scrapes_total", "Scrapes").inc()
+    registry.collector(lambda: 1 / 0)
+    assert "scrapes_total 1" in registry.render()
+    errors = [record for record in caplog.records if record.name == "backend.app.metrics"]
+    assert len(errors) == 1 and errors[0].exc_info[0] is ZeroDivisionError
+
+def test_requests_are_profiled_on_demand_and_downloadable(client, tmp_path, monkeypatch):
+    import threading
+    from backend.app import profiling
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "profiles"))
+    headers = auth_headers(client)
+    rows = "\n".join(f"2023-{m:02d}-{d:02d},Shop {d},-{d}.00" for m in range(1, 13) for d in range(1, 28))
+    assert upload(client, headers, "Date,Description,Amount\n" + rows)["status"] == "completed"
+
+    # Disabled: no profile, no request id
+    assert "X-Request-Id" not in client.get("/analytics/summary", headers=headers).headers
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "s3cret")
+    assert "X-Request-Id" not in client.get("/analytics/summary", headers=headers).headers
+    assert profiling.list_profiles() == []
+
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL_MS", 1)
+    joined_on = []
+    join = profiling.Sampler.join
+    def spy(sampler, *args):
+        joined_on.append(threading.current_thread().name)
+        return join(sampler, *args)
+    monkeypatch.setattr(profiling.Sampler, "join", spy)
+    r = client.get("/analytics/personality", headers={**headers, "X-Profile": "s3cret", "X-Request-Id": "req-1"})
+    request_id = r.headers["X-Request-Id"]
+    # Ids are generated server-side, so a client can't name (or overwrite) a profile
+    assert r.status_code == 200 and request_id != "req-1"
+    assert client.get(f"/profiles/{request_id}").status_code == 404
+    assert client.get(f"/profiles/{request_id}", headers={"X-Profile": "wrong"}).status_code == 404
+
+    admin = {"X-Profile": "s3cret"}
+    replay = client.get("/budgets", headers={**headers, "X-Profile": "s3cret", "X-Request-Id": request_id})
+    assert replay.headers["X-Request-Id"] != request_id
+    # Waiting for the sampler's last pass happens on the default executor, not the event loop
+    assert len(joined_on) == 2 and all(name.startswith("asyncio_") for name in joined_on)
+    profile = client.get(f"/profiles/{request_id}", headers=admin).json()
+    assert (profile["route"], profile["status"], profile["trigger"]) == ("/analytics/personality", 200, "header")
+    assert profile["samples"] > 0 and profile["top"]
+    # The analytics ran on the ML threads and is in the profile, rooted at the thread name
+    assert any(stack.startswith("ml") and "analyze_spending_personality" in stack for stack in profile["stacks"])
+    folded = client.get(f"/profiles/{request_id}", params={"format": "folded"}, headers=admin).text
+    assert folded.splitlines()[0].rsplit(" ", 1)[1].isdigit()
+    listed = client.get("/profiles", headers=admin).json()
+    assert [p["request_id"] for p in listed] == [replay.headers["X-Request-Id"], request_id]
+
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    sampled = client.get("/budgets", headers=headers).headers["X-Request-Id"]
+    assert profiling.load(sampled)["trigger"] == "sampled"
+
+def test_benchmark_suite_times_cases_and_flags_regressions(tmp_path):
+    from benchmarks import bench_suite  # fails to import if an MLService method has no case
+    results = bench_suite.run_size(300, str(tmp_path), repeat=1, cases=["parse_csv", "detect_subscriptions"])
+    assert set(results) == {"parse_csv@300", "ml.detect_subscriptions@300"}
+    assert all(r["rows"] == 300 and r["seconds"] > 0 for r in results.values())
+
+    # parse_csv takes well over NOISE_FLOOR_SECONDS, so 10x slower than its baseline is flagged
+    faster = {key: {**r, "seconds": r["seconds"] / 10} for key, r in results.items()}
+    regressions = bench_suite.compare({"results": results}, {"results": faster}, tolerance=0.25)
+    assert "parse_csv@300" in {r["case"] for r in regressions}
+    assert bench_suite.compare({"results": results}, {"results": results}, tolerance=0.25) == []
+
+def test_upload_fails_cleanly_when_the_session_cannot_be_opened(client, monkeypatch):
+    from backend.app import database, jobs
+    headers = auth_headers(client)
+    manager = jobs.UploadJobManager(max_workers=1, max_pending=0)
+    monkeypatch.setattr(jobs, "upload_jobs", manager)
+    monkeypatch.setattr("backend.app.main.upload_jobs", manager)
+
+    def unavailable(user_id):
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(database, "user_session", unavailable)
+    for _ in range(2):  # the only slot is released again after each failure
+        job = upload(client, headers, "Date,Description,Amount\n2023-01-01,Grocery,-50.00")
+        assert job["status"] == "failed" and "database is locked" in job["errors"][0]
+
+def test_anomaly_stats_increments_do_not_lose_concurrent_updates(client):
+    from backend.app import anomaly
+    first, second = database.SessionLocal(), database.SessionLocal()
+    try:
+        anomaly.apply(first, 7, added=anomaly.summarize([("Food", -10.0)]))
+        first.commit()
+        # Both writers have read the stats before either writes
+        held = first.get(models.AnomalyStatsDB, (7, "Food"))
+        second.get(models.AnomalyStatsDB, (7, "Food"))
+        anomaly.apply(second, 7, added=anomaly.summarize([("Food", -20.0)]))
+        second.commit()
+        anomaly.apply(first, 7, added=anomaly.summarize([("Food", -30.0)]))
+        assert held.count == 3
+        first.commit()
+
+        anomaly.apply(first, 7, removed=anomaly.summarize([("Food", -10.0), ("Food", -20.0), ("Food", -30.0)]))
+        first.commit()
+        assert anomaly.load_stats(first, 7) == {"Food": (0, 0.0, 0.0), "*": (0, 0.0, 0.0)}
+    finally:
+        first.close()
+        second.close()
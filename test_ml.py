@@ -0,0 +1,119 @@
+import pytest
+import numpy as np
+from scipy import sparse
+from sklearn.ensemble import GradientBoostingClassifier, IsolationForest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import LabelEncoder
+from backend.app.ml import MLService
+
+DESCRIPTIONS = ["NETFLIX", "SPOTIFY", "UBER", "LYFT", "WALMART", "KROGER", "SALARY", "PAYROLL"] * 5
+CATEGORIES = ["Entertainment", "Entertainment", "Transport", "Transport",
+              "Groceries", "Groceries", "Income", "Income"] * 5
+AMOUNTS = [-15.99, -9.99, -23.0, -18.5, -80.0, -64.2, 4200.0, 3900.0] * 5
+
+@pytest.fixture
+def service():
+    svc = MLService(model_dir="does-not-exist")
+    svc.tfidf = TfidfVectorizer()
+    X = sparse.hstack((svc.tfidf.fit_transform(DESCRIPTIONS), sparse.csr_matrix(np.array(AMOUNTS).reshape(-1, 1))), format='csr')
+    svc.label_encoder = LabelEncoder()
+    y = svc.label_encoder.fit_transform(CATEGORIES)
+    svc.classifier = GradientBoostingClassifier(n_estimators=10, random_state=42).fit(X, y)
+    svc.anomaly_detector = IsolationForest(contamination=0.05, random_state=42).fit(np.array(AMOUNTS).reshape(-1, 1))
+    return svc
+
+def test_predict_category_batch_matches_single(service):
+    descriptions = ["NETFLIX", "UBER", "KROGER", "PAYROLL", "UNSEEN MERCHANT"]
+    amounts = [-15.99, -20.0, -70.0, 4000.0, -5.0]
+    expected = [service.predict_category(d, a) for d, a in zip(descriptions, amounts)]
+    assert service.predict_category_batch(descriptions, amounts) == expected
+
+def test_detect_anomaly_batch_matches_single(service):
+    amounts = [-15.99, -20.0, 4000.0, -25000.0, 99999.0]
+    expected = [service.detect_anomaly(a) for a in amounts]
+    assert service.detect_anomaly_batch(amounts) == expected
+
+def test_batch_apis_without_models():
+    svc = MLService(model_dir="does-not-exist")
+    assert svc.predict_category_batch(["X", "Y"], [1.0, 2.0]) == ["Uncategorized", "Uncategorized"]
+    assert svc.detect_anomaly_batch([1.0]) == [False]
+    assert svc.predict_category_batch([], []) == []
+
+def test_category_cache_hits_and_invalidation(service):
+    first = service.predict_category("POS PURCHASE Netflix", -15.99)
+    # Same normalized merchant and amount bucket -> served from the cache
+    assert service.predict_category("netflix", -16.20) == first
+    assert service.predict_category_batch(["NETFLIX", "NETFLIX"], [-15.5, -15.7]) == [first, first]
+    stats = service.category_cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 2
+
+    service.load_models()  # model dir doesn't exist, but a reload always drops cached predictions
+    assert len(service.category_cache) == 0
+
+def test_uncached_predictions_match_the_uncached_model(service):
+    import csv
+    with open("ml_service/data/synthetic_transactions.csv") as f:
+        rows = [(row["description"], float(row["amount"])) for row in csv.DictReader(f)][:300]
+
+    def baseline(description, amount):
+        # The pre-cache predict_category: raw text and exact amount
+        features = np.hstack((service.tfidf.transform([description]).toarray(), [[amount]]))
+        return service.label_encoder.inverse_transform(service.classifier.predict(features))[0]
+    expected = [baseline(d, a) for d, a in rows]
+
+    for (description, amount), category in zip(rows, expected):
+        service.category_cache.clear()
+        assert service.predict_category(description, amount) == category
+    service.category_cache.clear()
+    # Each key is classified from the first row that has it, so a cold batch agrees on those rows
+    batch = service.predict_category_batch([d for d, _ in rows], [a for _, a in rows])
+    first = {}
+    for i, (description, amount) in enumerate(rows):
+        first.setdefault(service._category_key(description, amount), i)
+    assert all(batch[i] == expected[i] for i in first.values())
+
+def test_models_load_lazily_and_report_status(tmp_path):
+    import pickle
+    with open(tmp_path / "label_encoder.pkl", "wb") as f:
+        pickle.dump(LabelEncoder().fit(CATEGORIES), f)
+    svc = MLService(model_dir=str(tmp_path))
+    assert svc.model_status["label_encoder"]["state"] == "unloaded"
+
+    assert list(svc.label_encoder.classes_) == sorted(set(CATEGORIES))
+    assert svc.model_status["label_encoder"]["state"] == "loaded"
+    assert svc.classifier is None
+    assert svc.model_status["classifier"]["state"] == "failed"
+    assert svc.model_status["forecaster"]["state"] == "unloaded"
+    assert svc.readiness()["ready"] is False
+
+def test_registry_hot_swaps_only_verified_versions(service, tmp_path):
+    import os
+    import pickle
+    from ml_service import registry
+    for name, model in [("tfidf.pkl", service.tfidf), ("label_encoder.pkl", service.label_encoder),
+                        ("classifier_model.pkl", service.classifier), ("anomaly_model.pkl", service.anomaly_detector)]:
+        with open(tmp_path / name, "wb") as f:
+            pickle.dump(model, f)
+    v1 = registry.publish_version(str(tmp_path), ["tfidf.pkl", "label_encoder.pkl", "classifier_model.pkl", "anomaly_model.pkl"])
+
+    svc = MLService(model_dir=str(tmp_path))
+    svc.load_models()
+    assert svc.model_version == v1
+    assert svc.readiness()["ready"]
+    assert svc.reload_if_changed() is False
+
+    # Retrain one artifact: the others are carried over with their original checksums
+    v2 = registry.publish_version(str(tmp_path), ["anomaly_model.pkl"])
+    manifest = registry.load_manifest(str(tmp_path), v2)
+    assert manifest["parent"] == v1
+    assert manifest["artifacts"]["tfidf.pkl"] == registry.load_manifest(str(tmp_path), v1)["artifacts"]["tfidf.pkl"]
+    assert svc.reload_if_changed() is True
+    assert svc.model_version == v2
+
+    # A corrupted artifact fails its checksum and the worker keeps serving v2
+    v3 = registry.publish_version(str(tmp_path), ["classifier_model.pkl"])
+    with open(os.path.join(registry.version_dir(str(tmp_path), v3), "classifier_model.pkl"), "ab") as f:
+        f.write(b"corrupt")
+    assert svc.reload_if_changed() is False
+    assert svc.model_version == v2
@@ -84,3 +84,33 @@ def test_format_d_time_merchant_withdrawal_deposit(parser, tmp_path):
     assert txns[0].amount == -5.50
     assert txns[1].amount == 5.50
     assert txns[0].description == "STARBUCKS"
+
+@pytest.mark.parametrize("csv", [
+    "Date,Description,Amount,Category\n2023-01-01,Grocery,-50.00,Food\n2023-01-02,Salary,2000.00,Income",
+    "Posted Date,Transaction Details,Value,Type\n01/01/2023,Uber,-15.50,Transport\n02/01/2023,Refund,10.00,Other",
+    "Date,Description,Debit,Credit,Balance\n2023-05-01,Rent,1000.00,,5000\n2023-05-02,Salary,,3000.00,8000",
+    "Date,Desc,Amount\n2023-01-01,Coffee,$5.00\n2023-01-02,Dinner,-€20.00\n2023-01-03,Tip,1e-05\n2023-01-04,Odd,1.2.3",
+    "Process Date,User Name,Details,Value\n31/12/2023,User1,Spotify,-£9.99\n01/01/2024,User1,Interest,+£0.50",
+    "Time,Merchant,Withdrawal,Deposit\n2023-07-01 10:00:00,Starbucks,5.50,\n2023-07-01 12:00:00,Refund,,5.50",
+    "Date,Description,Amount,Category\n2023-01-05,  pos purchase   Netflix ,-9.99, Fun \n,Blank date,-1,\nnot a date,Bad,-2,\n2023-01-06,,0.001,\n2023-01-07,,-3,",
+])
+def test_vectorized_matches_row_engine(parser, tmp_path, csv):
+    path = create_csv(tmp_path, csv)
+    assert parser.parse_csv(path, vectorized=True) == parser.parse_csv(path, vectorized=False)
+
+def test_missing_date_rows_are_skipped(parser, tmp_path):
+    csv = "Date,Description,Amount\n2023-01-01,Coffee,-5.00\n,Ghost,-3.00"
+    path = create_csv(tmp_path, csv)
+    for vectorized in (True, False):
+        txns = parser.parse_csv(path, vectorized=vectorized)
+        assert [t.description for t in txns] == ["COFFEE"]
+
+def test_iter_csv_streams_same_transactions(parser, tmp_path):
+    csv = "Date,Description,Debit,Credit\n" + "\n".join(
+        f"2023-05-{day:02d},Shop {day},{day}.25," if day % 2 else f"2023-05-{day:02d},Pay {day},,{day}.50"
+        for day in range(1, 29)
+    )
+    path = create_csv(tmp_path, csv)
+    chunks = list(parser.iter_csv_chunks(path, chunksize=5))
+    assert len(chunks) == 6
+    assert list(parser.iter_csv(path, chunksize=5)) == parser.parse_csv(path)